@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+'''
+Compare the time per `Xrandr.get_screen()` call of the `xrandr` (subprocess)
+and `native` (libXrandr) backends against a private Xvfb server.
+
+    $ python benchmarks/bench_backends.py [--number 50] [--display :98]
+'''
+import os
+import sys
+import time
+import subprocess
+
+from argparse import ArgumentParser
+from timeit import Timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from xprofile.randr import RandrConnection
+from xprofile.xrandr import Xrandr
+
+
+def start_xvfb(display):
+    xvfb = subprocess.Popen(['Xvfb', display, '+extension', 'RANDR'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    for _ in range(50):
+        try:
+            RandrConnection(display).close()
+            return xvfb
+        except RuntimeError:
+            time.sleep(0.1)
+    xvfb.terminate()
+    raise RuntimeError('Xvfb did not start on {0}'.format(display))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--number', default=50, type=int, help='calls per backend')
+    parser.add_argument('--display', default=':98', help='display for Xvfb')
+    args = parser.parse_args()
+
+    xvfb = start_xvfb(args.display)
+
+    try:
+        for backend in ('xrandr', 'native'):
+            xrandr = Xrandr(display=args.display, backend=backend)
+            best = min(Timer(xrandr.get_screen).repeat(3, args.number)) / args.number
+            print('{0:8} {1:10.3f} ms/get_screen()'.format(backend, best * 1000))
+    finally:
+        xvfb.terminate()
+        xvfb.wait()
+
+
+if '__main__' == __name__:
+    main()
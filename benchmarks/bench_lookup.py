@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+'''
+Compare the linear search through all profiles with the EdidIndex, and
+parsing the rc with loading the compiled cache, on a config with many
+synthetic profiles.
+
+    $ python benchmarks/bench_lookup.py [--profiles 10000]
+'''
+import os
+import sys
+import shutil
+import tempfile
+
+from argparse import ArgumentParser
+from hashlib import md5
+from timeit import Timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from xprofile.profiles import EdidIndex, load_config
+
+try:
+    from ConfigParser import ConfigParser
+except ImportError:
+    from configparser import ConfigParser
+
+
+def synthetic_rc(profiles):
+    '''
+    Generate an rc file with the given number of profiles
+    '''
+    sections = ['[DEFAULT]\ndisplay = :0\nargs = --auto\n']
+
+    for index in range(profiles):
+        sections.append('[dock-{0}]\nname = dock number {0}\nedid = {1}\n'
+                        'args = --output DP{2} --mode 1920x1080 --pos 0x0 --primary\n'.format(
+                            index, md5(str(index).encode()).hexdigest(), index % 4))
+
+    return '\n'.join(sections)
+
+
+def linear_search(edid, config):
+    '''
+    The lookup as it was before EdidIndex
+    '''
+    for profile in config.sections():
+        if config.get(profile, 'edid') == edid:
+            return profile
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--profiles', default=10000, type=int, help='number of profiles')
+    parser.add_argument('--number', default=5, type=int, help='runs per measurement')
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.xprofilerc', delete=False) as file:
+        file.write(synthetic_rc(args.profiles))
+
+    cache_dir = tempfile.mkdtemp()
+
+    try:
+        parser = ConfigParser()
+        parser.read(file.name)
+        config = load_config(file.name, cache_dir)
+
+        last = md5(str(args.profiles - 1).encode()).hexdigest()
+
+        results = [
+            ('read config', lambda: ConfigParser().read(file.name)),
+            ('load compiled config', lambda: load_config(file.name, cache_dir)),
+            ('linear search (worst case)', lambda: linear_search(last, parser)),
+            ('build index', lambda: EdidIndex(parser)),
+            ('index lookup', lambda: config.find_profile(last)),
+        ]
+
+        print('{0} profiles'.format(args.profiles))
+        for label, func in results:
+            best = min(Timer(func).repeat(3, args.number)) / args.number
+            print('    {0:28} {1:10.3f} ms'.format(label, best * 1000))
+    finally:
+        os.remove(file.name)
+        shutil.rmtree(cache_dir)
+
+
+if '__main__' == __name__:
+    main()
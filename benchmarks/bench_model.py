@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+Compare the memory use and the cost of comparing snapshots of the slotted
+Screen/Display model against the former dict based model, on the
+`test/*.txt` fixtures and on synthetic `xrandr --verbose` output.
+
+    $ python benchmarks/bench_model.py [--number 200] [--snapshots 100]
+'''
+import os
+import sys
+import tracemalloc
+
+from argparse import ArgumentParser
+from io import BytesIO
+from timeit import Timer
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_parser import legacy_parse
+from xprofile.synthetic import generate
+from xprofile.xrandr import parse_screen
+
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+def allocated(func, snapshots):
+    '''
+    Return the bytes still allocated after keeping `snapshots` results of
+    `func` alive
+    '''
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [func() for _ in range(snapshots)]
+        return (tracemalloc.get_traced_memory()[0] - before) // len(kept)
+    finally:
+        tracemalloc.stop()
+
+
+def bench(name, stdout, number, snapshots):
+    models = [
+        ('dict', lambda: legacy_parse(stdout)),
+        ('slotted', lambda: parse_screen(BytesIO(stdout))),
+    ]
+
+    print('{0} ({1} bytes)'.format(name, len(stdout)))
+    for label, func in models:
+        first, second = func(), func()
+        size = allocated(func, snapshots)
+        equal = min(Timer(lambda: first == second).repeat(3, number)) / number
+
+        print('    {0:8} {1:10} bytes/snapshot {2:10.3f} us/compare'.format(
+            label, size, equal * 1000000))
+
+    screen = parse_screen(BytesIO(stdout))
+    best = min(Timer(lambda: hash(screen)).repeat(3, number)) / number
+    print('    {0:8} {1:10.3f} us/hash'.format('slotted', best * 1000000))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--number', default=200, type=int, help='comparisons per measurement')
+    parser.add_argument('--snapshots', default=100, type=int, help='snapshots to measure memory on')
+    args = parser.parse_args()
+
+    for fixture in ('docked.txt', 'laptop.txt'):
+        with open(os.path.join(ROOT, 'test', fixture), 'rb') as file:
+            bench(fixture, file.read(), args.number, args.snapshots)
+
+    for outputs, modes in ((4, 20), (24, 100)):
+        bench('synthetic {0} outputs x {1} modes'.format(outputs, modes),
+              generate(outputs, modes=modes), args.number, args.snapshots)
+
+
+if '__main__' == __name__:
+    main()
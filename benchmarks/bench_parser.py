@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+'''
+Compare the single pass `parse_screen` parser against the previous parser,
+which matched every regex against every line, on the `test/*.txt` fixtures
+and on synthetic `xrandr --verbose` output.
+
+    $ python benchmarks/bench_parser.py [--number 20]
+'''
+import os
+import sys
+
+from argparse import ArgumentParser
+from io import BytesIO
+from timeit import Timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from xprofile.synthetic import generate
+from xprofile.xrandr import parse_screen, RE_EDID, RE_XRANDR_DISPLAY, RE_DISPLAY_MODE
+
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+def legacy_parse(stdout):
+    '''
+    The parser as it was before `parse_screen`, building the dict based
+    model of that time
+    '''
+    screen = {'displays': []}
+
+    for line in stdout.decode().split('\n'):
+        parts = RE_XRANDR_DISPLAY.match(line)
+        if parts:
+            display = {'edid': [], 'modes': {}, 'geometry': None}
+            display['name'] = parts.group('name')
+            display['status'] = parts.group('status')
+            display['connected'] = parts.group('status') == 'connected'
+            display['primary'] = parts.group('primary') == 'primary'
+            display['mode'] = parts.group('mode')
+            display['rotation'] = parts.group('rotation')
+            if parts.group('geometry'):
+                display['geometry'] = {
+                    'dimension': '%sx%s' % (parts.group('width'), parts.group('height')),
+                    'offset':    '%sx%s' % (parts.group('x'), parts.group('y'))
+                }
+            display['active'] = isinstance(display['geometry'], dict)
+            screen['displays'].append(display)
+            continue
+
+        parts = RE_EDID.match(line)
+        if parts:
+            screen['displays'][-1]['edid'].append(line.strip().encode())
+            continue
+
+        parts = RE_DISPLAY_MODE.match(line)
+        if parts:
+            screen['displays'][-1]['modes'][parts.group('modeid')] = {
+                'id': parts.group('modeid'),
+                'dimension': parts.group('dimension'),
+                'current': parts.group('current') != None,
+                'preferred': parts.group('preferred') != None,
+            }
+
+    return screen
+
+
+def bench(name, stdout, number):
+    results = [
+        ('legacy', lambda: legacy_parse(stdout)),
+        ('single-pass', lambda: parse_screen(BytesIO(stdout))),
+        ('edid-only', lambda: parse_screen(BytesIO(stdout), fields=('edid',))),
+    ]
+
+    print('{0} ({1} bytes)'.format(name, len(stdout)))
+    for label, func in results:
+        best = min(Timer(func).repeat(3, number)) / number
+        print('    {0:12} {1:10.3f} ms'.format(label, best * 1000))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--number', default=20, type=int, help='parses per measurement')
+    args = parser.parse_args()
+
+    for fixture in ('docked.txt', 'laptop.txt', 'multi_screen.txt'):
+        with open(os.path.join(ROOT, 'test', fixture), 'rb') as file:
+            bench(fixture, file.read(), args.number)
+
+    for outputs, modes in ((4, 20), (24, 100), (48, 400)):
+        bench('synthetic {0} outputs x {1} modes'.format(outputs, modes),
+              generate(outputs, modes=modes), args.number)
+
+
+if '__main__' == __name__:
+    main()
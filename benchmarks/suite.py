@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+'''
+Run the benchmark suite and store the results as JSON so runs on different
+commits can be compared.
+
+Measures parsing of the `test/*.txt` fixtures and of synthetic output,
+profile lookup against rc files with many profiles, planning the xrandr
+arguments of an activation, and `main(['list'])` against a fake xrandr,
+both in process and as a cold start of the `xprofile` entry point, with
+and without a running server.
+
+    $ python benchmarks/suite.py [--quick] [--output results.json]
+    $ python benchmarks/suite.py --compare before.json [--output after.json]
+'''
+import os
+import sys
+import json
+import time
+import stat
+import shutil
+import platform
+import tempfile
+import subprocess
+
+from argparse import ArgumentParser
+from hashlib import md5
+from io import BytesIO, StringIO
+from timeit import Timer
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_lookup import synthetic_rc
+from xprofile import profiles
+from xprofile.synthetic import generate
+from xprofile.__main__ import main as xprofile_main, _get_profile_with_edid
+from xprofile.xrandr import parse_screen
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+FAKE_XRANDR = '''#!/bin/sh
+exec cat {fixture}
+'''
+
+
+def measure(func, number, repeat=5):
+    '''
+    Return the best and median time of a single call to func in seconds
+    '''
+    times = sorted(Timer(func).repeat(repeat, number))
+    return {
+        'best': times[0] / number,
+        'median': times[len(times) // 2] / number,
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def bench_parse(results, quick):
+    sizes = ((4, 20), (24, 100)) if quick else ((4, 20), (24, 100), (48, 400))
+    dumps = []
+
+    for fixture in ('docked.txt', 'laptop.txt', 'multi_screen.txt'):
+        with open(os.path.join(ROOT, 'test', fixture), 'rb') as file:
+            dumps.append((fixture[:-4], file.read()))
+
+    for outputs, modes in sizes:
+        dumps.append(('synthetic-{0}x{1}'.format(outputs, modes), generate(outputs, modes=modes)))
+
+    for name, stdout in dumps:
+        number = max(1, 200000 // len(stdout))
+
+        for fields in (('edid', 'modes'), ('edid',)):
+            result = measure(lambda: parse_screen(BytesIO(stdout), fields), number)
+            result['bytes'] = len(stdout)
+            result['mb_per_s'] = len(stdout) / result['best'] / 1e6
+            results['parse.{0}.{1}'.format(name, '+'.join(fields))] = result
+
+
+def bench_lookup(results, quick, tmp):
+    sizes = (10, 1000) if quick else (10, 100, 1000, 10000, 100000)
+    cache_dir = os.path.join(tmp, 'cache')
+
+    for size in sizes:
+        path = os.path.join(tmp, 'xprofilerc-{0}'.format(size))
+        with open(path, 'w') as file:
+            file.write(synthetic_rc(size))
+
+        number = max(1, 10000 // size)
+        edid = md5(str(size - 1).encode()).hexdigest()
+
+        results['lookup.{0}.parse'.format(size)] = measure(
+            lambda: profiles.load_config(path), max(1, number // 10), 3)
+
+        profiles.load_config(path, cache_dir)
+        results['lookup.{0}.load-compiled'.format(size)] = measure(
+            lambda: profiles.load_config(path, cache_dir), number, 3)
+
+        config = profiles.load_config(path, cache_dir)
+        results['lookup.{0}.find'.format(size)] = measure(
+            lambda: _get_profile_with_edid(edid, config), 10000)
+
+
+def bench_plan(results):
+    with open(os.path.join(ROOT, 'test', 'docked.txt'), 'rb') as file:
+        screen = parse_screen(BytesIO(file.read()))
+
+    cases = [
+        ('active', screen.get_xrandr_options()),
+        ('changed', ['--output', 'LVDS1', '--mode', '1920x1080', '--pos', '0x0', '--primary',
+                     '--output', 'DP2', '--off', '--output', 'HDMI3', '--off']),
+    ]
+
+    for name, args in cases:
+        results['plan.docked.{0}'.format(name)] = measure(lambda: screen.get_changes(args), 2000)
+
+    screen = parse_screen(BytesIO(generate(24, modes=100)))
+    args = screen.get_xrandr_options()
+    results['plan.synthetic-24x100.active'] = measure(lambda: screen.get_changes(args), 200)
+
+
+def bench_cli(results, tmp):
+    bin_dir = os.path.join(tmp, 'bin')
+    os.mkdir(bin_dir)
+
+    xrandr_bin = os.path.join(bin_dir, 'xrandr')
+    with open(xrandr_bin, 'w') as file:
+        file.write(FAKE_XRANDR.format(fixture=os.path.join(ROOT, 'test', 'docked.txt')))
+    os.chmod(xrandr_bin, stat.S_IRWXU)
+
+    env = dict(os.environ, PATH=bin_dir + os.pathsep + os.environ.get('PATH', ''),
+               XDG_CACHE_HOME=os.path.join(tmp, 'cache'), PYTHONPATH=ROOT)
+    env.pop('XDG_RUNTIME_DIR', None)
+
+    argv = ['--config', os.path.join(ROOT, 'test', 'xprofilerc_both_example'), 'list']
+
+    saved = dict(os.environ)
+    stdout = sys.stdout
+    os.environ.clear()
+    os.environ.update(env)
+
+    try:
+        from xprofile import xrandr
+        xrandr._executables.clear()
+        sys.stdout = StringIO()
+        results['cli.list.in-process'] = measure(lambda: xprofile_main(argv), 20)
+    finally:
+        sys.stdout = stdout
+        os.environ.clear()
+        os.environ.update(saved)
+        xrandr._executables.clear()
+
+    # What the installed `xprofile` entry point runs
+    command = [sys.executable, '-c', 'import sys; from xprofile.client import main; sys.exit(main())']
+
+    def cold_start(env=env):
+        subprocess.check_call(command + argv, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    results['cli.list.cold-start'] = measure(cold_start, 1, 10)
+
+    # The same, forwarded to a running `xprofile server`
+    runtime_dir = os.path.join(tmp, 'runtime')
+    os.mkdir(runtime_dir, 0o700)
+    served = dict(env, XDG_RUNTIME_DIR=runtime_dir, DISPLAY=':99')
+
+    with open(os.devnull, 'wb') as devnull:
+        server = subprocess.Popen(command + ['server'], env=served, stdout=devnull, stderr=devnull)
+
+    try:
+        path = os.path.join(runtime_dir, 'xprofile', 'server-%3a99.sock')
+
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            time.sleep(0.1)
+        else:
+            raise RuntimeError('The xprofile server did not start')
+
+        results['cli.list.forwarded'] = measure(lambda: cold_start(served), 1, 10)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def get_meta():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         cwd=ROOT, stderr=subprocess.PIPE).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+    }
+
+
+def compare(base, results):
+    '''
+    Print the best times of a previous run next to the current ones
+    '''
+    print('{0:40} {1:>12} {2:>12} {3:>8}'.format('benchmark', 'base', 'current', 'ratio'))
+
+    for name in sorted(results):
+        if name not in base['results']:
+            continue
+        before, after = base['results'][name]['best'], results[name]['best']
+        print('{0:40} {1:10.3f}ms {2:10.3f}ms {3:7.2f}x'.format(
+            name, before * 1000, after * 1000, after / before))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--quick', action='store_true', help='run fewer and smaller cases')
+    parser.add_argument('--only', action='append', choices=['parse', 'lookup', 'plan', 'cli'],
+                        help='only run this group of benchmarks (can be repeated)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='compare with the results in this JSON file')
+    args = parser.parse_args()
+
+    groups = args.only or ['parse', 'lookup', 'plan', 'cli']
+    results = {}
+    tmp = tempfile.mkdtemp()
+
+    try:
+        if 'parse' in groups:
+            bench_parse(results, args.quick)
+        if 'lookup' in groups:
+            bench_lookup(results, args.quick, tmp)
+        if 'plan' in groups:
+            bench_plan(results)
+        if 'cli' in groups:
+            bench_cli(results, tmp)
+    finally:
+        shutil.rmtree(tmp)
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), results)
+    else:
+        for name in sorted(results):
+            print('{0:40} {1:10.3f} ms'.format(name, results[name]['best'] * 1000))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'meta': get_meta(), 'results': results}, file, indent=2, sort_keys=True)
+
+
+if '__main__' == __name__:
+    main()
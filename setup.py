@@ -41,7 +41,8 @@ setup(
     ],
     entry_points = {
         'console_scripts': [
-            'xprofile = xprofile.__main__:main'
+            'xprofile = xprofile.client:main',
+            'xprofile-fake-xrandr = xprofile.fakexrandr:main',
         ]
     },
     classifiers = [
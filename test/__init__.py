@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from io import BytesIO
+from mock import Mock
+
+
+def fake_process(stdout=b'', stderr=b'', status=0):
+    '''
+    Stand in for the Popen instance of an xrandr call that wrote stdout and
+    stderr and exited with status
+    '''
+    process = Mock()
+    process.stdout = BytesIO(stdout)
+    process.stderr = BytesIO(stderr)
+    process.wait.return_value = status
+    return process
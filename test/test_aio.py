@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import stat
+import shutil
+import tempfile
+
+from mock import patch
+from unittest import TestCase, skipIf
+
+if sys.version_info >= (3, 7):
+    import asyncio
+    from xprofile.aio import AsyncXrandr, get_screens
+
+
+FAKE_XRANDR = '''#!/bin/sh
+case "$DISPLAY" in
+    :1) [ "$1" = --screen ] && sed "s/^Screen 0:/Screen $2:/" {root}/test/docked.txt || cat {root}/test/docked.txt ;;
+    :2) cat {root}/test/laptop.txt ;;
+    :slow) exec sleep 10 ;;
+    *) echo "Can't open display $DISPLAY" >&2; exit 1 ;;
+esac
+'''
+
+
+@skipIf(sys.version_info < (3, 7), 'asyncio.run requires python 3.7')
+class AsyncXrandrTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        self.xrandr_bin = os.path.join(self.tmp, 'xrandr')
+        with open(self.xrandr_bin, 'w') as file:
+            file.write(FAKE_XRANDR.format(root=os.getcwd()))
+        os.chmod(self.xrandr_bin, stat.S_IRWXU)
+
+    def test_get_screen(self):
+        xrandr = AsyncXrandr(xrandr_bin=self.xrandr_bin, display=':1')
+        screen = asyncio.run(xrandr.get_screen())
+
+        assert screen.get_edid() == 'c2989146488f57fa9dc5f7efc263b0fd'
+        assert len(screen['displays']) == 8
+
+    def test_call_xrandr_failure(self):
+        xrandr = AsyncXrandr(xrandr_bin=self.xrandr_bin, display=':9')
+
+        try:
+            asyncio.run(xrandr.call_xrandr(['--verbose']))
+        except RuntimeError as err:
+            assert str(err) == "xrandr error: Can't open display :9"
+        else:
+            assert False, 'Failed to raise RuntimeError'
+
+    def test_get_screens_concurrently(self):
+        screens = asyncio.run(get_screens([':1', ':2', ':9'], xrandr_bin=self.xrandr_bin))
+
+        assert screens[':1'].get_edid() == 'c2989146488f57fa9dc5f7efc263b0fd'
+        assert screens[':2'].get_edid() == 'cfdee1377d86e245f2d187082f7a504a'
+        assert isinstance(screens[':9'], RuntimeError)
+
+    def test_cancel_kills_xrandr(self):
+        xrandr = AsyncXrandr(xrandr_bin=self.xrandr_bin, display=':slow')
+
+        async def cancel_slow_call():
+            task = asyncio.ensure_future(xrandr.get_screen())
+            await asyncio.sleep(0.2)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+
+        start = time.time()
+        assert asyncio.run(cancel_slow_call())
+        assert time.time() - start < 5
+
+    @patch('xprofile.xrandr.Xrandr.get_screen_count', return_value=3)
+    def test_get_screens_of_display(self, get_screen_count):
+        xrandr = AsyncXrandr(xrandr_bin=self.xrandr_bin, display=':1')
+        screens = asyncio.run(xrandr.get_screens(jobs=2))
+
+        assert [screen.number for screen in screens] == [0, 1, 2]
+        assert screens[2].get_edid() == 'c2989146488f57fa9dc5f7efc263b0fd'
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tarfile
+import tempfile
+
+from io import StringIO
+from mock import patch
+from unittest import TestCase
+
+from xprofile import batch
+from xprofile.__main__ import main
+from xprofile.profiles import load_config
+from xprofile.synthetic import generate
+
+
+class BatchTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        with open('test/docked.txt', 'rb') as file:
+            docked = file.read()
+        with open('test/laptop.txt', 'rb') as file:
+            laptop = file.read()
+
+        self.dumps = os.path.join(self.tmp, 'dumps')
+        self.write('desk-1/docked.txt', docked)
+        self.write('desk-1/laptop.txt', laptop)
+        self.write('desk-2/docked.txt', docked)
+        self.write('desk-3/docked.txt', docked.replace(b'1080x1920+1930+0', b'1080x1920+1920+0'))
+        self.write('desk-3/synthetic.txt', generate(seed=3))
+        self.write('desk-3/notes.txt', b'not an xrandr dump\n')
+
+    def write(self, path, data):
+        path = os.path.join(self.dumps, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as file:
+            file.write(data)
+
+    def test_merge_profiles(self):
+        results = batch.parse_dumps(self.dumps, jobs=2)
+
+        assert results == batch.parse_dumps(self.dumps, jobs=1)
+
+        profiles, errors, collisions = batch.merge_profiles(results)
+
+        assert [profile['profile'] for profile in profiles] == [
+            'desk-1-docked', 'desk-1-laptop', 'desk-3-synthetic']
+        assert profiles[0]['edid'] == 'c2989146488f57fa9dc5f7efc263b0fd'
+        assert profiles[0]['args'].startswith('--output LVDS1 --off --output HDMI3')
+        assert errors == ['desk-3/notes.txt: no outputs found']
+        assert collisions == ['desk-3/docked.txt: edid c2989146488f57fa9dc5f7efc263b0fd '
+                              'of desk-1/docked.txt with other args, skipped']
+
+    def test_tarball(self):
+        path = os.path.join(self.tmp, 'dumps.tar.gz')
+        with tarfile.open(path, 'w:gz') as archive:
+            archive.add(self.dumps, 'dumps')
+
+        results = batch.parse_dumps(path, jobs=1)
+
+        assert [result[0] for result in results][:2] == ['dumps/desk-1/docked.txt', 'dumps/desk-1/laptop.txt']
+        assert len(batch.merge_profiles(results)[0]) == 3
+
+        self.assertRaises(RuntimeError, list, batch.iter_dumps('test/docked.txt'))
+
+    def test_profile_name(self):
+        assert batch.profile_name('desk 1/docked.txt') == 'desk-1-docked'
+        assert batch.profile_name('.txt') == 'dump'
+
+    def test_generate_from_dumps(self):
+        config = os.path.join(self.tmp, 'xprofilerc')
+        with open(config, 'w') as file:
+            file.write('[DEFAULT]\n')
+
+        argv = ['--no-server', '--no-cache', '--config', config, '--jobs', '2', 'generate', '--from', self.dumps]
+
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            assert main(argv) == 1
+
+        assert stdout.getvalue().startswith('[desk-1-docked]\nname = desk-1-docked\'s xrandr profile\n')
+
+        database = os.path.join(self.tmp, 'profiles.db')
+
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            assert main(argv + ['--database', database]) == 1
+
+        assert stdout.getvalue() == ''
+
+        profiles = load_config(database)
+
+        assert profiles.sections() == ['desk-1-docked', 'desk-1-laptop', 'desk-3-synthetic']
+        assert profiles.find_profile('c2989146488f57fa9dc5f7efc263b0fd') == 'desk-1-docked'
+        assert profiles.get_args('desk-1-laptop') == ['--output', 'LVDS1', '--mode', '1920x1080', '--pos', '0x0']
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 from distutils.spawn import find_executable
+from io import StringIO
 from mock import patch
 from os import remove
+from shutil import rmtree
+from tempfile import mkdtemp
 from unittest import TestCase
+from test import fake_process
 from xprofile.__main__ import main
 
 
@@ -23,6 +27,21 @@ class XprofileTestCase(TestCase):
         self.xrandr = patcher.start()
         self.edid = patcher2.start()
 
+        # Keep snapshots and locks of a running X session out of the tests
+        self.cache_dir = mkdtemp()
+        patcher3 = patch.dict('os.environ', {'XDG_CACHE_HOME': self.cache_dir,
+                                             'XDG_RUNTIME_DIR': self.cache_dir})
+        patcher3.start()
+        patcher4 = patch('xprofile.xrandr.Xrandr.get_timestamps', return_value=None)
+        patcher4.start()
+
+        if 'addCleanup' in dir(self):
+            self.addCleanup(patcher4.stop)
+            self.addCleanup(patcher3.stop)
+            self.addCleanup(rmtree, self.cache_dir)
+        else:
+            self.tearDownPatcher += [patcher3, patcher4]
+
     def tearDown(self):
         if 'tearDownPatcher' in dir(self):
             for patcher in self.tearDownPatcher:
@@ -32,8 +51,7 @@ class XprofileTestCase(TestCase):
         with open(xrandr_output, 'rb') as file:
             xrandr_stdout = file.read()
 
-        self.xrandr.return_value.communicate.return_value = (xrandr_stdout, None)
-        self.xrandr.return_value.wait.return_value = 0
+        self.xrandr.side_effect = lambda *args, **kwargs: fake_process(xrandr_stdout)
 
         if edid:
             self.edid.return_value = edid
@@ -70,7 +88,27 @@ class XprofileTestCase(TestCase):
         retval = main(['--config', 'test/xprofilerc_both_example', 'current'])
 
         assert retval == 0
-        assert self.xrandr.called
+        assert self.xrandr.call_count == 1
+        assert self.xrandr.call_args[0][0] == [self.xrandr_bin, '--current', '--verbose']
+
+    def test_current_profile_monitors(self):
+        self.set_xrandr_mock('test/docked.txt', 'c2989146488f57fa9dc5f7efc263b0fd1')
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            retval = main(['--config', 'test/xprofilerc_both_example', 'current', '--monitors'])
+
+        assert retval == 0
+        assert stdout.getvalue().startswith(
+            '# LVDS1: LGD 032c 344x194mm 1920x1080@60.15\n'
+            '# HDMI3: DEL DELL P2311H 509x286mm 1920x1080@60.00\n'
+            '# DP2: DEL DELL P2414H 527x297mm 1920x1080@60.00\n'
+            '[docked]\n')
+
+    def test_current_profile_probe_always(self):
+        self.set_xrandr_mock('test/docked.txt', 'c2989146488f57fa9dc5f7efc263b0fd1')
+        retval = main(['--config', 'test/xprofilerc_both_example', '--probe', 'always', 'current'])
+
+        assert retval == 0
+        assert self.xrandr.call_count == 1
         assert self.xrandr.call_args[0][0] == [self.xrandr_bin, '--verbose']
 
     def test_current_profile_does_not_exist(self):
@@ -78,7 +116,8 @@ class XprofileTestCase(TestCase):
         retval = main(['--config', 'test/xprofilerc_both_example', 'current'])
 
         assert retval == 1
-        assert self.xrandr.called
+        assert self.xrandr.call_count == 2
+        assert self.xrandr.call_args_list[0][0][0] == [self.xrandr_bin, '--current', '--verbose']
         assert self.xrandr.call_args[0][0] == [self.xrandr_bin, '--verbose']
 
     def test_generate_profile(self):
@@ -87,12 +126,105 @@ class XprofileTestCase(TestCase):
 
         assert retval == 0
         assert self.xrandr.called
-        assert self.xrandr.call_args[0][0] == [self.xrandr_bin, '--verbose']
+        assert self.xrandr.call_args[0][0] == [self.xrandr_bin, '--current', '--verbose']
 
     def test_activate_profile_auto_select_and_existing(self):
         self.set_xrandr_mock('test/docked.txt', 'c2989146488f57fa9dc5f7efc263b0fd1')
         retval = main(['--config', 'test/xprofilerc_both_example', 'activate'])
 
+        assert retval == 0
+        assert self.xrandr.call_count == 1
+        assert self.xrandr.call_args[0][0] == [self.xrandr_bin, '--verbose']
+
+    def test_activate_profile_auto_select_and_changed(self):
+        self.set_xrandr_mock('test/docked.txt', 'c2989146488f57fa9dc5f7efc263b0fd1')
+        retval = main(['--config', 'test/xprofilerc_docked_changed_example', 'activate'])
+
+        assert retval == 0
+        assert self.xrandr.call_count == 2
+        assert self.xrandr.call_args[0][0] == [
+            self.xrandr_bin,
+            '--output', 'HDMI3', '--mode', '1920x1080', '--rotate', 'normal', '--pos', '1930x0'
+        ]
+
+    def test_activate_profile_on_other_screen(self):
+        self.set_xrandr_mock('test/docked.txt')
+        with open(self.cache_dir + '/xprofilerc', 'w') as config:
+            config.write(open('test/xprofilerc_both_example').read().replace('[docked]', '[docked]\nscreen = 1', 1))
+        retval = main(['--config', self.cache_dir + '/xprofilerc', 'activate', 'docked'])
+
+        assert retval == 0
+        assert self.xrandr.call_args_list[0][0][0] == [self.xrandr_bin, '--screen', '1', '--verbose']
+        assert self.xrandr.call_args_list[1][0][0][:3] == [self.xrandr_bin, '--screen', '1']
+
+    def test_generate_profile_for_screen(self):
+        self.set_xrandr_mock('test/docked.txt')
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            retval = main(['--config', 'test/xprofilerc_both_example', '--screen', '1', 'generate'])
+
+        assert retval == 0
+        assert self.xrandr.call_args[0][0] == [self.xrandr_bin, '--screen', '1', '--current', '--verbose']
+        assert stdout.getvalue().endswith('\nscreen = 1\n')
+
+    def set_multi_screen_mock(self):
+        # The laptop panel on screen 0 and the desk monitors on screen 1
+        with open('test/laptop.txt', 'rb') as file:
+            laptop = file.read()
+        with open('test/docked.txt', 'rb') as file:
+            docked = file.read().replace(b'Screen 0:', b'Screen 1:', 1)
+
+        self.xrandr.side_effect = lambda args, **kwargs: fake_process(docked if '--screen' in args and args[args.index('--screen') + 1] == '1' else laptop)
+
+        return patch('xprofile.xrandr.Screen.get_edid',
+                     new=lambda screen: 'c2989146488f57fa9dc5f7efc263b0fd1' if screen.number == 1 else 'laptop-edid')
+
+    @patch('xprofile.xrandr.Xrandr.get_screen_count', return_value=2)
+    def test_activate_profile_found_on_other_screen(self, get_screen_count):
+        with self.set_multi_screen_mock():
+            retval = main(['--config', 'test/xprofilerc_docked_changed_example', 'activate'])
+
+        assert retval == 0
+        assert self.xrandr.call_args_list[0][0][0] == [self.xrandr_bin, '--verbose']
+        assert self.xrandr.call_args[0][0] == [
+            self.xrandr_bin, '--screen', '1',
+            '--output', 'HDMI3', '--mode', '1920x1080', '--rotate', 'normal', '--pos', '1930x0'
+        ]
+
+    @patch('xprofile.xrandr.Xrandr.get_screen_count', return_value=2)
+    def test_list_and_current_profile_found_on_other_screen(self, get_screen_count):
+        with self.set_multi_screen_mock():
+            with patch('sys.stdout', new_callable=StringIO) as stdout:
+                assert main(['--config', 'test/xprofilerc_both_example', 'list']) == 0
+                assert main(['--config', 'test/xprofilerc_both_example', 'current']) == 0
+
+        assert '* docked' in stdout.getvalue()
+        assert '\n[docked]\n' in stdout.getvalue()
+
+    @patch('xprofile.xrandr.Xrandr.get_screen_count', return_value=1)
+    def test_list_screens(self, get_screen_count):
+        self.set_xrandr_mock('test/docked.txt')
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            retval = main(['--config', 'test/xprofilerc_both_example', 'screens'])
+
+        assert retval == 0
+        assert stdout.getvalue() == (
+            'Screen 0: current 3010x1920, minimum 320x200, maximum 8192x8192\n'
+            '    LVDS1 off\n'
+            '    HDMI3 1080x1920+1930+0\n'
+            '    DP2 1920x1080+0+500\n')
+
+    def test_activate_profile_by_name_already_active(self):
+        self.set_xrandr_mock('test/docked.txt')
+        retval = main(['--config', 'test/xprofilerc_both_example', 'activate', 'docked'])
+
+        assert retval == 0
+        assert self.xrandr.call_count == 1
+        assert self.xrandr.call_args[0][0] == [self.xrandr_bin, '--verbose']
+
+    def test_activate_profile_auto_select_and_force(self):
+        self.set_xrandr_mock('test/docked.txt', 'c2989146488f57fa9dc5f7efc263b0fd1')
+        retval = main(['--config', 'test/xprofilerc_both_example', 'activate', '--force'])
+
         assert retval == 0
         assert self.xrandr.called
         assert self.xrandr.call_args[0][0] == [
@@ -102,6 +234,25 @@ class XprofileTestCase(TestCase):
             '--output', 'HDMI3', '--mode', '1920x1080', '--rotate', 'left', '--pos', '1930x0'
         ]
 
+    def test_activate_profile_matching_most_displays(self):
+        self.set_xrandr_mock('test/docked.txt')
+        retval = main(['--config', 'test/xprofilerc_fingerprints_example', 'activate'])
+
+        assert retval == 0
+        assert self.xrandr.call_args[0][0] == [
+            self.xrandr_bin,
+            '--output', 'HDMI3', '--mode', '1920x1080', '--rotate', 'normal', '--pos', '1930x0'
+        ]
+
+    def test_list_and_current_only_match_exactly(self):
+        self.set_xrandr_mock('test/docked.txt')
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            assert main(['--config', 'test/xprofilerc_fingerprints_example', 'list']) == 0
+            assert main(['--config', 'test/xprofilerc_fingerprints_example', 'current']) == 1
+
+        assert '*' not in stdout.getvalue()
+        assert 'edids' not in stdout.getvalue()
+
     def test_activate_profile_auto_select_and_non_existing(self):
         self.set_xrandr_mock('test/docked.txt', 'non-existing-edid')
         retval = main(['--config', 'test/xprofilerc_both_example', 'activate'])
@@ -110,9 +261,54 @@ class XprofileTestCase(TestCase):
         assert self.xrandr.called
         assert self.xrandr.call_args[0][0] == [self.xrandr_bin, '--auto']
 
+    def test_activate_profile_auto_select_and_extended_layout(self):
+        self.set_xrandr_mock('test/docked.txt', 'non-existing-edid')
+        with open(self.cache_dir + '/xprofilerc', 'w') as config:
+            config.write(open('test/xprofilerc_both_example').read().replace('[DEFAULT]', '[DEFAULT]\nlayout = extend', 1))
+        retval = main(['--config', self.cache_dir + '/xprofilerc', 'activate'])
+
+        assert retval == 0
+        assert self.xrandr.call_args[0][0] == [
+            self.xrandr_bin,
+            '--output', 'DP2', '--primary', '--mode', '1920x1080', '--rate', '60.00', '--pos', '0x0', '--rotate', 'normal',
+            '--output', 'HDMI3', '--mode', '1920x1080', '--rate', '60.00', '--pos', '1920x0', '--rotate', 'normal',
+            '--output', 'LVDS1', '--mode', '1920x1080', '--rate', '60.15', '--pos', '3840x0', '--rotate', 'normal'
+        ]
+
+    @patch('xprofile.daemon.Daemon')
+    def test_daemon_extends_layout_of_unknown_screens(self, Daemon):
+        from xprofile.xrandr import parse_screen
+
+        self.set_xrandr_mock('test/docked.txt', 'non-existing-edid')
+        with open(self.cache_dir + '/xprofilerc', 'w') as config:
+            config.write(open('test/xprofilerc_both_example').read().replace('[DEFAULT]', '[DEFAULT]\nlayout = extend', 1))
+        retval = main(['--config', self.cache_dir + '/xprofilerc', 'daemon'])
+
+        with open('test/docked.txt', 'rb') as file:
+            Daemon.call_args[0][0](parse_screen(file), 'non-existing-edid')
+
+        assert retval == 0
+        assert self.xrandr.call_args[0][0][-10:] == [
+            '--output', 'LVDS1', '--mode', '1920x1080', '--rate', '60.15', '--pos', '3840x0', '--rotate', 'normal'
+        ]
+
     def test_activate_profile(self):
         pass
 
+    @patch('xprofile.xrandr.threading.Timer')
+    def test_timeout_from_command_line_and_config(self, Timer):
+        self.set_xrandr_mock('test/docked.txt')
+        main(['--config', 'test/xprofilerc_both_example', '--timeout', '2.5', 'current'])
+
+        assert Timer.call_args[0][0] == 2.5
+
+        self.set_xrandr_mock('test/docked.txt')
+        with open(self.cache_dir + '/xprofilerc', 'w') as config:
+            config.write(open('test/xprofilerc_both_example').read().replace('[DEFAULT]', '[DEFAULT]\ntimeout = 4', 1))
+        main(['--config', self.cache_dir + '/xprofilerc', 'current'])
+
+        assert Timer.call_args[0][0] == 4.0
+
     def test_activate_profile_non_existing(self):
         self.set_xrandr_mock('test/docked.txt')
         retval = main(['--config', 'test/xprofilerc_both_example', 'activate', 'non-existing-profile'])
@@ -126,3 +322,27 @@ class XprofileTestCase(TestCase):
 
         assert retval == 0
         assert self.xrandr.called
+
+    def test_timings(self):
+        import json
+
+        timings_file = self.cache_dir + '/timings.jsonl'
+
+        self.set_xrandr_mock('test/docked.txt', 'c2989146488f57fa9dc5f7efc263b0fd1')
+        main(['--config', 'test/xprofilerc_both_example', '--timings-file', timings_file, 'activate', '--force'])
+
+        with patch.dict('os.environ', {'XPROFILE_TIMINGS': timings_file}):
+            main(['--config', 'test/xprofilerc_both_example', 'list'])
+
+        with patch.dict('os.environ', {'XPROFILE_TIMINGS': '0'}):
+            main(['--config', 'test/xprofilerc_both_example', 'list'])
+
+        with open(timings_file) as file:
+            lines = [json.loads(line) for line in file]
+
+        assert [line['command'] for line in lines] == ['activate', 'list']
+        assert lines[0]['status'] == 0
+        assert set(['config', 'probe', 'parse', 'edid', 'lookup', 'apply']) <= set(lines[0]['phases'])
+        assert set(['query', 'parse']) <= set(lines[1]['phases'])
+        assert 'apply' not in lines[1]['phases']
+        assert lines[0]['total'] >= sum(lines[0]['phases'].values())
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import threading
+import subprocess
+
+from distutils.spawn import find_executable
+from mock import Mock
+from unittest import TestCase, skipUnless
+
+from xprofile import randr
+from xprofile.daemon import Daemon
+from xprofile.xrandr import Screen
+
+
+class FakeConnection(object):
+    '''
+    Stands in for a RandrConnection, backed by a pipe
+    '''
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+        self.closed = False
+
+    def fileno(self):
+        return self.read_fd
+
+    def emit(self, event='output'):
+        os.write(self.write_fd, event.encode() + b'\n')
+
+    def read_events(self):
+        import select
+        events = []
+        while select.select([self.read_fd], [], [], 0)[0]:
+            events += os.read(self.read_fd, 1024).decode().split()
+        return events
+
+    def select_changes(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def make_screen(edid):
+    screen = Mock(spec=Screen)
+    screen.get_edid.return_value = edid
+    return screen
+
+
+def test_refresh_calls_handler_only_on_edid_change():
+    handler = Mock()
+    xrandr = Mock()
+    xrandr.get_screen.side_effect = [make_screen('a'), make_screen('a'), make_screen('b')]
+
+    daemon = Daemon(handler, xrandr=xrandr)
+
+    assert daemon.refresh() == True
+    assert daemon.refresh() == False
+    assert daemon.refresh() == True
+
+    assert handler.call_count == 2
+    assert handler.call_args[0][1] == 'b'
+    assert daemon.edid == 'b'
+
+
+def test_wait_for_changes_coalesces_events():
+    connection = FakeConnection()
+    daemon = Daemon(Mock(), xrandr=Mock(), settle=0.05)
+
+    assert daemon.wait_for_changes(connection, timeout=0) == []
+
+    connection.emit('screen')
+    connection.emit('output')
+    connection.emit('output')
+
+    assert daemon.wait_for_changes(connection, timeout=0) == ['screen', 'output', 'output']
+
+
+def test_run_handles_events_until_stopped():
+    connection = FakeConnection()
+    handler = Mock()
+    xrandr = Mock()
+    xrandr.get_screen.side_effect = [make_screen('a'), make_screen('b')]
+
+    daemon = Daemon(handler, xrandr=xrandr, settle=0.01)
+
+    def on_change(screen, edid):
+        if edid == 'b':
+            daemon.stop()
+
+    handler.side_effect = on_change
+
+    thread = threading.Thread(target=daemon.run, args=(connection,))
+    thread.start()
+    connection.emit('output')
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert connection.closed
+    assert [c[0][1] for c in handler.call_args_list] == ['a', 'b']
+
+
+class XvfbTestCase(TestCase):
+    display = ':97'
+
+    @skipUnless(find_executable('Xvfb') and find_executable('xrandr') and randr.is_available(),
+                'Xvfb, xrandr and libXrandr are required')
+    def test_screen_change_notification(self):
+        xvfb = subprocess.Popen(['Xvfb', self.display, '+extension', 'RANDR'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.addCleanup(xvfb.wait)
+        self.addCleanup(xvfb.terminate)
+
+        for _ in range(50):
+            try:
+                connection = randr.RandrConnection(self.display)
+                break
+            except RuntimeError:
+                time.sleep(0.1)
+        else:
+            self.fail('Xvfb did not start')
+
+        connection.select_changes()
+        env = dict(os.environ, DISPLAY=self.display)
+        subprocess.check_call(['xrandr', '--fb', '800x600'], env=env)
+
+        daemon = Daemon(Mock(), display=self.display, settle=0.1)
+        events = daemon.wait_for_changes(connection, timeout=5)
+        connection.close()
+
+        assert 'screen' in events
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import binascii
+import shutil
+import tempfile
+
+from mock import patch
+
+from xprofile import edid
+from xprofile.synthetic import make_edid
+from xprofile.xrandr import Display, parse_screen
+
+
+def docked():
+    with open('test/docked.txt', 'rb') as file:
+        return parse_screen(file)
+
+
+def test_decode_edid():
+    hdmi3 = docked().displays[5]
+    record = edid.decode_edid(edid.edid_bytes(hdmi3.edid))
+
+    assert record['manufacturer'] == 'DEL'
+    assert record['name'] == 'DELL P2311H'
+    assert record['serial_text'] == 'PT0PV13F1T3S'
+    assert (record['week'], record['year'], record['version']) == (12, 2011, '1.3')
+    assert record['size'] == [509, 286]
+    assert record['native'] == {'width': 1920, 'height': 1080, 'clock': 148.5, 'refresh': 60.0,
+                                'interlaced': False, 'size': [509, 286]}
+    assert edid.describe(record) == 'DEL DELL P2311H 509x286mm 1920x1080@60.00'
+
+
+def test_decode_synthetic_edid():
+    record = edid.decode_edid(make_edid(5, seed=1))
+
+    assert (record['manufacturer'], record['product'], record['name']) == ('XPF', 5, 'XPF 5')
+    assert record['serial_text'] == '{0:08X}'.format(record['serial'])
+
+    try:
+        edid.decode_edid(make_edid(5)[8:])
+    except RuntimeError:
+        pass
+    else:
+        assert False, 'decode_edid accepted data without EDID header'
+
+
+def test_decode_malformed_timing():
+    data = bytearray(make_edid(5, seed=1))
+    # A pixel clock without any active or blanking pixels
+    data[56:62] = bytearray(6)
+    data[127] = -sum(data[:127]) & 0xff
+
+    record = edid.decode_edid(bytes(data))
+
+    assert record['native']['refresh'] is None
+    assert edid.describe(record).endswith(' 0x0')
+
+    display = Display('DP1', 'connected', edid=[binascii.hexlify(bytes(data[i:i + 16])) for i in range(0, 128, 16)])
+
+    with patch.dict('xprofile.edid._decoded', clear=True):
+        assert edid.get_edid_info(display)['native']['width'] == 0
+
+
+def test_decode_cea_extension():
+    block = bytearray(128)
+    block[0:4] = bytearray([0x02, 3, 4 + 4 + 6, 0xc1])
+    # Video data block with VIC 16 (native) and 4, HDMI vendor specific block
+    block[4:8] = bytearray([2 << 5 | 3, 0x80 | 16, 4, 97])
+    block[8:14] = bytearray([3 << 5 | 5, 0x03, 0x0c, 0x00, 0x10, 0x00])
+    block[14:32] = bytearray.fromhex('011d007251d01e206e285500c48e2100001e')
+
+    base = bytearray(make_edid(1))
+    base[126] = 1
+    base[127] = -sum(base[:127]) & 0xff
+
+    record = edid.decode_edid(bytes(base + block))
+    extension, = record['extensions']
+
+    assert (extension['type'], extension['revision']) == ('CEA-861', 3)
+    assert extension['underscan'] and extension['audio'] and extension['hdmi']
+    assert extension['vics'] == [16, 4, 97]
+    assert [(timing['width'], timing['height']) for timing in extension['timings']] == [(1280, 720)]
+
+
+def test_get_edid_info_is_cached_per_fingerprint():
+    cache_dir = tempfile.mkdtemp()
+    display = docked().displays[0]
+
+    try:
+        with patch.dict('xprofile.edid._decoded', clear=True):
+            record = edid.get_edid_info(display, cache_dir)
+
+        assert record['manufacturer'] == 'LGD'
+
+        with patch.dict('xprofile.edid._decoded', clear=True):
+            with patch('xprofile.edid.decode_edid') as decode_edid:
+                assert edid.get_edid_info(display, cache_dir) == record
+                assert edid.get_edid_info(display, cache_dir) == record
+
+        assert not decode_edid.called
+        assert edid.get_edid_info(Display('VGA1', 'disconnected')) is None
+    finally:
+        shutil.rmtree(cache_dir)
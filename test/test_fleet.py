@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+from io import StringIO
+from mock import patch
+from unittest import TestCase
+
+from test import fake_process
+from xprofile import fleet
+from xprofile.__main__ import main
+
+
+FIXTURES = {
+    ':1': 'test/docked.txt',
+    ':2': 'test/laptop.txt',
+}
+
+
+def fake_popen(argv, env=None, **kwargs):
+    '''
+    Stand in for xrandr: serve a fixture per DISPLAY and fail for unknown ones
+    '''
+    display = env['DISPLAY']
+
+    if display in FIXTURES:
+        with open(FIXTURES[display], 'rb') as file:
+            return fake_process(file.read())
+
+    return fake_process(stderr=b"Can't open display " + display.encode(), status=1)
+
+
+class FleetTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        for patcher in (patch('xprofile.xrandr.Popen', side_effect=fake_popen),
+                        patch('sys.stdout', new_callable=StringIO),
+                        patch('xprofile.xrandr.Xrandr.get_timestamps', return_value=None),
+                        patch.dict('os.environ', {'XDG_CACHE_HOME': self.tmp, 'XDG_RUNTIME_DIR': self.tmp})):
+            self.addCleanup(patcher.stop)
+            patcher.start()
+
+        self.popen = __import__('xprofile.xrandr').xrandr.Popen
+        self.stdout = __import__('sys').stdout
+
+    def test_expand_displays(self):
+        for name in ('X0', 'X1', 'X10', 'X2', 'other'):
+            open(os.path.join(self.tmp, name), 'w').close()
+
+        with patch('xprofile.fleet.X11_SOCKET_DIR', self.tmp):
+            assert fleet.list_local_displays() == [':0', ':1', ':2', ':10']
+            assert fleet.expand_displays([':*']) == [':0', ':1', ':2', ':10']
+            assert fleet.expand_displays([':1', ':1?', ':5']) == [':1', ':10', ':5']
+            assert fleet.expand_displays([':[3-9]']) == []
+
+    def test_list_on_multiple_displays(self):
+        retval = main(['--config', 'test/xprofilerc_duplicates_example',
+                       '--display', ':1', '--display', ':2', 'list'])
+
+        lines = self.stdout.getvalue().splitlines()
+
+        assert retval == 0
+        assert self.popen.call_count == 2
+        assert sorted(c[1]['env']['DISPLAY'] for c in self.popen.call_args_list) == [':1', ':2']
+        assert lines[0].startswith(':1:  ')
+        assert lines[1].startswith(':1: * docked ')
+        assert lines[4].startswith(':2: * laptop ')
+        assert len(lines) == 8
+
+    def test_failing_display_is_isolated(self):
+        retval = main(['--config', 'test/xprofilerc_duplicates_example',
+                       '--display', ':1', '--display', ':3', '--display', ':2', 'current'])
+
+        output = self.stdout.getvalue()
+
+        assert retval == 1
+        assert ':1: [docked]' in output
+        assert ':2: [laptop]' in output
+        assert ':3:' not in output
+
+    def test_hooks_run_on_their_display(self):
+        from xprofile import hooks
+
+        rc = os.path.join(self.tmp, 'xprofilerc')
+        with open('test/xprofilerc_duplicates_example') as file:
+            config = file.read().replace('args = --auto', 'args = --auto\nexec_post = sh -c "echo $DISPLAY >> {0}/displays"'.format(self.tmp), 1)
+        with open(rc, 'w') as file:
+            file.write(config)
+
+        with patch.dict('os.environ', {'DISPLAY': ':0'}):
+            retval = main(['--config', rc, '--display', ':1', '--display', ':2', 'activate', '--force'])
+            hooks.wait()
+
+        with open(os.path.join(self.tmp, 'displays')) as file:
+            assert sorted(file.read().split()) == [':1', ':2']
+
+        assert retval == 0
+
+    def test_glob_on_single_display_subcommand(self):
+        try:
+            main(['--config', 'test/xprofilerc_duplicates_example', '--display', ':*', 'generate'])
+        except SystemExit as err:
+            assert err.code == 2
+        else:
+            assert False, 'Failed to reject multiple displays'
+
+    def test_single_display(self):
+        retval = main(['--config', 'test/xprofilerc_duplicates_example', '--display', ':2', 'current'])
+
+        assert retval == 0
+        assert self.popen.call_args[1]['env']['DISPLAY'] == ':2'
+        assert self.stdout.getvalue().startswith('[laptop]')
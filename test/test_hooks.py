@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import shutil
+import tempfile
+
+from mock import patch
+from unittest import TestCase
+
+from test import fake_process
+from xprofile import hooks
+from xprofile.__main__ import main
+from xprofile.profiles import load_config
+
+
+RC = '''[DEFAULT]
+args = --auto
+exec_post = touch {tmp}/default
+
+[docked]
+edid = c2989146488f57fa9dc5f7efc263b0fd
+args = --auto
+exec_post_timeout = 0.5
+exec_post = sh -c "sleep 0.3; touch {tmp}/first"
+    sh -c "sleep 0.3; touch {tmp}/second"
+    sleep 10
+    sh -c "sleep 0.3; touch {tmp}/detached" &
+
+[laptop]
+edid = cfdee1377d86e245f2d187082f7a504a
+args = --auto
+
+[off]
+args = --auto
+exec_post =
+'''
+
+
+def test_parse_hooks():
+    assert hooks.parse_hooks('notify-send "docked"\n\n  nitrogen --restore &\n') == [
+        (['notify-send', 'docked'], False),
+        (['nitrogen', '--restore'], True),
+    ]
+
+
+class HooksTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        self.rc = os.path.join(self.tmp, 'xprofilerc')
+        with open(self.rc, 'w') as file:
+            file.write(RC.format(tmp=self.tmp))
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.tmp, name))
+
+    def test_default_and_profile_hooks(self):
+        config = load_config(self.rc)
+
+        assert [argv[0] for argv, detach in config.get_hooks('docked')] == ['sh', 'sh', 'sleep', 'sh']
+        assert [detach for argv, detach in config.get_hooks('docked')] == [False] * 3 + [True]
+        assert config.get_hooks('DEFAULT') == [(['touch', self.tmp + '/default'], False)]
+        assert config.get_hooks('laptop') == config.get_hooks('DEFAULT')
+        assert config.get_hooks('off') == []
+
+        from xprofile.store import SqliteStore
+
+        store = SqliteStore(os.path.join(self.tmp, 'profiles.db'))
+        store.import_config(config)
+
+        for profile in ('DEFAULT', 'docked', 'laptop', 'off'):
+            assert store.get_hooks(profile) == config.get_hooks(profile)
+
+        store.close()
+
+    def test_hooks_run_concurrently_with_timeout(self):
+        start = time.time()
+        runs = hooks.run_hooks(load_config(self.rc).get_hooks('docked'), timeout=0.5)
+
+        assert time.time() - start < 0.2
+
+        hooks.wait()
+
+        assert time.time() - start < 1.5
+        assert [run.status for run in runs[:3]] == [0, 0, None]
+        assert runs[2].timed_out
+        assert self.exists('first') and self.exists('second')
+
+        runs[3].wait()
+        assert self.exists('detached')
+
+    def test_activate_does_not_wait_for_hooks(self):
+        with patch('xprofile.xrandr.Popen') as popen, \
+                patch('xprofile.xrandr.Xrandr.get_timestamps', return_value=None), \
+                patch.dict('os.environ', {'XDG_CACHE_HOME': self.tmp, 'XDG_RUNTIME_DIR': self.tmp}):
+            stdout = open('test/docked.txt', 'rb').read()
+            popen.side_effect = lambda *args, **kwargs: fake_process(stdout)
+
+            with patch('xprofile.hooks.wait') as wait:
+                start = time.time()
+                assert main(['--config', self.rc, 'activate', '--force']) == 0
+                assert time.time() - start < 0.3
+                assert wait.called
+
+        hooks.wait()
+        assert self.exists('first') and not self.exists('default')
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+
+from mock import patch
+
+from xprofile import layout
+from xprofile.xrandr import Screen, parse_screen
+
+
+def docked():
+    with open('test/docked.txt', 'rb') as file:
+        return parse_screen(file)
+
+
+def undocked():
+    # The laptop right after undocking: the monitors are gone but their
+    # outputs still hold a CRTC
+    with open('test/laptop.txt', 'rb') as file:
+        lines = file.read()
+
+    lines = lines.replace(b'HDMI3 disconnected (', b'HDMI3 disconnected 1080x1920+1930+0 (0x48) left (')
+    lines = lines.replace(b'DP2 disconnected (', b'DP2 disconnected 1920x1080+0+500 (0x48) normal (')
+
+    return parse_screen(lines.splitlines(True))
+
+
+def test_compute_layout():
+    # DP2 and HDMI3 are enabled in that order from left to right, LVDS1 is
+    # connected but disabled
+    assert layout.compute_layout(docked()) == [
+        '--output', 'DP2', '--primary', '--mode', '1920x1080', '--rate', '60.00', '--pos', '0x0', '--rotate', 'normal',
+        '--output', 'HDMI3', '--mode', '1920x1080', '--rate', '60.00', '--pos', '1920x0', '--rotate', 'normal',
+        '--output', 'LVDS1', '--mode', '1920x1080', '--rate', '60.15', '--pos', '3840x0', '--rotate', 'normal',
+    ]
+
+    assert layout.compute_layout(Screen()) == []
+
+
+def test_compute_layout_after_undocking():
+    assert layout.compute_layout(undocked()) == [
+        '--output', 'LVDS1', '--primary', '--mode', '1920x1080', '--rate', '60.15', '--pos', '0x0', '--rotate', 'normal',
+        '--output', 'HDMI3', '--off',
+        '--output', 'DP2', '--off',
+    ]
+
+    changes, descriptions = undocked().get_changes(layout.compute_layout(undocked()))
+    assert changes[-6:] == ['--output', 'HDMI3', '--off', '--output', 'DP2', '--off']
+    assert descriptions[-2:] == ['HDMI3: off', 'DP2: off']
+
+
+def test_layout_cache():
+    cache_dir = tempfile.mkdtemp()
+
+    try:
+        screen = docked()
+        args = layout.get_layout(screen, 'c2989146488f57fa9dc5f7efc263b0fd', cache_dir)
+
+        with patch('xprofile.layout.compute_layout', return_value=args) as compute_layout:
+            assert layout.get_layout(screen, 'c2989146488f57fa9dc5f7efc263b0fd', cache_dir) == args
+            assert not compute_layout.called
+
+            # Same displays connected to other outputs
+            screen.displays[0].name = 'eDP1'
+            layout.get_layout(screen, 'c2989146488f57fa9dc5f7efc263b0fd', cache_dir)
+            assert compute_layout.called
+
+        # The same laptop panel, with and without outputs left enabled
+        args = layout.get_layout(undocked(), 'cfdee1377d86e245f2d187082f7a504a', cache_dir)
+
+        with open('test/laptop.txt', 'rb') as file:
+            laptop = parse_screen(file)
+
+        assert '--off' not in layout.get_layout(laptop, 'cfdee1377d86e245f2d187082f7a504a', cache_dir)
+        assert layout.get_layout(undocked(), 'cfdee1377d86e245f2d187082f7a504a', cache_dir) == args
+    finally:
+        shutil.rmtree(cache_dir)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import stat
+import shutil
+import tempfile
+import threading
+
+from io import BytesIO
+from subprocess import Popen
+from unittest import TestCase
+
+from xprofile.lock import SingleFlight
+from xprofile.synthetic import generate
+from xprofile.xrandr import parse_screen
+
+
+FAKE_XRANDR = '''#!/bin/sh
+PYTHONPATH={root} exec {python} -m xprofile.fakexrandr "$@"
+'''
+
+CONFIG = '''[DEFAULT]
+debounce = {debounce}
+
+[synthetic]
+name = Synthetic
+edid = {edid}
+args = --output DP-0 --mode 1280x1024 --pos 0x0 --primary
+'''
+
+
+class SingleFlightTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_runs_alone(self):
+        single_flight = SingleFlight('activate-:0', self.tmp)
+
+        assert single_flight.run(lambda: 3) == 3
+        assert single_flight.run(lambda: 4, debounce=0.01) == 4
+        # Served requests don't keep growing the requests file
+        assert single_flight.get_generation() == 0
+        assert sorted(os.listdir(self.tmp)) == ['activate-_0.lock', 'activate-_0.requests']
+
+    def test_requests_while_running_are_folded_into_another_run(self):
+        started, proceed = threading.Event(), threading.Event()
+        runs = []
+
+        def func():
+            runs.append(len(runs))
+            if len(runs) == 1:
+                started.set()
+                proceed.wait(5)
+            return len(runs)
+
+        result = []
+        thread = threading.Thread(target=lambda: result.append(SingleFlight('a', self.tmp).run(func)))
+        thread.start()
+        started.wait(5)
+
+        # Each SingleFlight opens its own lock file, like another process
+        assert SingleFlight('a', self.tmp).run(func) is None
+        assert SingleFlight('a', self.tmp).run(func) is None
+        assert SingleFlight('b', self.tmp).run(lambda: 'b') == 'b'
+
+        proceed.set()
+        thread.join(5)
+
+        assert runs == [0, 1]
+        assert result == [2]
+        assert SingleFlight('a', self.tmp).get_generation() == 0
+
+
+class ParallelActivationTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        with open(os.path.join(self.tmp, 'xrandr'), 'w') as file:
+            file.write(FAKE_XRANDR.format(root=os.getcwd(), python=sys.executable))
+        os.chmod(os.path.join(self.tmp, 'xrandr'), stat.S_IRWXU)
+
+        self.log = os.path.join(self.tmp, 'calls.log')
+
+    def activate(self, processes, debounce):
+        config = os.path.join(self.tmp, 'xprofilerc')
+        edid = parse_screen(BytesIO(generate())).get_edid()
+        with open(config, 'w') as file:
+            file.write(CONFIG.format(debounce=debounce, edid=edid))
+
+        env = dict(os.environ, PATH=self.tmp + os.pathsep + os.environ.get('PATH', ''),
+                   PYTHONPATH=os.getcwd(), DISPLAY=':7', XDG_RUNTIME_DIR=self.tmp,
+                   XDG_CACHE_HOME=self.tmp, XPROFILE_FAKE_LOG=self.log,
+                   XPROFILE_FAKE_LATENCY='0.2')
+
+        invocations = [
+            Popen([sys.executable, '-m', 'xprofile', '--config', config, 'activate'], env=env)
+            for _ in range(processes)
+        ]
+
+        assert [process.wait() for process in invocations] == [0] * processes
+
+        with open(self.log) as file:
+            calls = [json.loads(line)['argv'] for line in file]
+
+        return [argv for argv in calls if '--output' in argv]
+
+    def test_closely_spaced_activations_run_once(self):
+        applied = self.activate(6, debounce=2)
+
+        assert applied == [['--output', 'DP-0', '--mode', '1280x1024', '--pos', '0x0', '--primary']]
+
+    def test_concurrent_activations_without_debounce(self):
+        applied = self.activate(6, debounce=0)
+
+        # The first invocation runs, the others are folded into at most
+        # one more run once it is done
+        assert 1 <= len(applied) <= 2
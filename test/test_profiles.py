@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+from mock import patch
+from unittest import TestCase
+from xprofile.profiles import EdidIndex, CompiledConfig, load_config, cache_path
+
+
+def test_edid_index():
+    config = load_config('test/xprofilerc_both_example')
+
+    assert len(config.edid_index) == 2
+    assert config.find_profile('cfdee1377d86e245f2d187082f7a504a') == 'laptop'
+    assert config.find_profile('c2989146488f57fa9dc5f7efc263b0fd1') == 'docked'
+    assert config.find_profile('unknown') == None
+    assert config.edid_index.duplicates == {}
+
+
+def test_edid_index_duplicates_and_missing_edid():
+    config = load_config('test/xprofilerc_duplicates_example')
+    index = config.edid_index
+
+    assert len(index) == 2
+    assert 'c2989146488f57fa9dc5f7efc263b0fd' in index
+    assert index.get('c2989146488f57fa9dc5f7efc263b0fd') == 'docked'
+    assert index.duplicates == {
+        'c2989146488f57fa9dc5f7efc263b0fd': ['docked', 'docked-copy']
+    }
+
+
+def test_edid_index_from_plain_config():
+    try:
+        from ConfigParser import ConfigParser
+    except ImportError:
+        from configparser import ConfigParser
+
+    config = ConfigParser()
+    config.read('test/xprofilerc_both_example')
+
+    assert EdidIndex(config).get('cfdee1377d86e245f2d187082f7a504a') == 'laptop'
+
+
+def test_edid_index_ranks_display_fingerprints():
+    laptop = 'cfdee1377d86e245f2d187082f7a504a'
+    hdmi, dp = 'ea5d405a5beff06696f1ab491b903c2a', '0394049786504997112f705379d6c6d6'
+
+    for cache_dir in (None, tempfile.mkdtemp()):
+        config = load_config('test/xprofilerc_fingerprints_example', cache_dir)
+        config = load_config('test/xprofilerc_fingerprints_example', cache_dir)
+        index = config.edid_index
+
+        assert index.fingerprints[laptop] == ['laptop', 'docked']
+        assert index.rank([dp, laptop, hdmi]) == [(0.5, 'docked'), (1.0 / 3, 'laptop')]
+        assert config.match_profile([laptop, hdmi, dp]) == 'docked'
+        assert config.match_profile([laptop]) == 'laptop'
+        assert config.match_profile([dp]) == None
+        assert index.match([laptop, dp], threshold=0.3) == 'laptop'
+
+        if cache_dir:
+            shutil.rmtree(cache_dir)
+
+
+def test_compiled_config_interface():
+    config = load_config('test/xprofilerc_both_example')
+
+    assert config.sections() == ['laptop', 'docked']
+    assert config.has_section('docked')
+    assert not config.has_section('DEFAULT')
+    assert config.has_option('docked', 'display')
+    assert not config.has_option('docked', 'exec_post')
+    assert config.get('docked', 'name') == 'my desk'
+    assert config.get('DEFAULT', 'args') == '--auto'
+    assert config.get_args('DEFAULT') == ['--auto']
+    assert config.get_args('docked')[:4] == ['--output', 'LVDS1', '--off', '--output']
+    assert config.get_hooks('docked') == []
+
+    for exception, section, option in ((Exception, 'nope', 'args'), (Exception, 'docked', 'nope')):
+        try:
+            config.get(section, option)
+        except exception as err:
+            assert type(err).__name__ in ('NoSectionError', 'NoOptionError')
+        else:
+            assert False, 'Failed to raise an exception'
+
+
+class CompiledCacheTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        self.rc = os.path.join(self.tmp, 'xprofilerc')
+        self.cache_dir = os.path.join(self.tmp, 'cache')
+        shutil.copy('test/xprofilerc_both_example', self.rc)
+
+    def test_cache_is_written_and_reused(self):
+        config = load_config(self.rc, self.cache_dir)
+
+        assert os.path.exists(cache_path(self.rc, self.cache_dir))
+
+        with patch('xprofile.profiles._configparser') as configparser:
+            cached = load_config(self.rc, self.cache_dir)
+
+        assert not configparser.return_value.ConfigParser.called
+        assert cached.data == config.data
+        assert cached.find_profile('cfdee1377d86e245f2d187082f7a504a') == 'laptop'
+
+    def test_cache_is_rebuilt_when_rc_changes(self):
+        load_config(self.rc, self.cache_dir)
+
+        with open(self.rc, 'a') as file:
+            file.write('\n[office]\nname = office\nedid = 0123\nargs = --auto\n')
+
+        config = load_config(self.rc, self.cache_dir)
+
+        assert config.find_profile('0123') == 'office'
+        assert CompiledConfig.loads(open(cache_path(self.rc, self.cache_dir), 'rb').read()).has_section('office')
+
+    def test_corrupt_cache_is_ignored(self):
+        load_config(self.rc, self.cache_dir)
+
+        with open(cache_path(self.rc, self.cache_dir), 'wb') as file:
+            file.write(b'garbage')
+
+        config = load_config(self.rc, self.cache_dir)
+
+        assert config.find_profile('cfdee1377d86e245f2d187082f7a504a') == 'laptop'
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import shutil
+import socket
+import tempfile
+import threading
+
+from io import StringIO
+from mock import patch
+from unittest import TestCase
+
+from test import fake_process
+from xprofile import client, hooks
+from xprofile.__main__ import load_config, main
+from xprofile.server import Server
+
+
+class ServerTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        patchers = [
+            patch('xprofile.xrandr.Popen'),
+            patch('xprofile.xrandr.Screen.get_edid'),
+            patch.dict('os.environ', {'XDG_CACHE_HOME': self.tmp, 'XDG_RUNTIME_DIR': self.tmp,
+                                      'DISPLAY': ':3'}),
+        ]
+
+        self.xrandr, self.edid, _ = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+        with open('test/docked.txt', 'rb') as file:
+            stdout = file.read()
+        self.xrandr.side_effect = lambda *args, **kwargs: fake_process(stdout)
+        self.edid.return_value = 'c2989146488f57fa9dc5f7efc263b0fd1'
+
+        self.path = client.socket_path()
+        self.server = Server(self.path)
+        self.server.bind()
+
+        thread = threading.Thread(target=self.server.run)
+        thread.start()
+
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.stop)
+
+    def forward(self, argv):
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            with patch('sys.stderr', new_callable=StringIO) as stderr:
+                status = client.forward(argv)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_socket_path(self):
+        assert self.path == os.path.join(self.tmp, 'xprofile', 'server-%3a3.sock')
+
+    def test_forwards_commands(self):
+        argv = ['--config', 'test/xprofilerc_both_example', 'current']
+
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            assert main(argv) == 0
+        local = stdout.getvalue()
+
+        with patch('xprofile.__main__.load_config', wraps=load_config) as loads:
+            assert self.forward(argv) == (0, local, '')
+            assert self.forward(argv) == (0, local, '')
+
+        assert loads.call_count == 1
+        assert '[docked]' in local
+
+    def test_forwards_errors(self):
+        status, stdout, stderr = self.forward(['--config', 'test/xprofilerc_both_example', 'activate', 'unknown'])
+
+        assert status == 1
+        assert stderr == 'ERROR: No known profile found with name: unknown\n'
+
+        status, stdout, stderr = self.forward(['--bogus'])
+
+        assert status == 2
+        assert 'usage:' in stderr
+
+    def test_falls_back(self):
+        assert self.forward(['server']) == (None, '', '')
+        assert self.forward(['--no-server', 'list']) == (None, '', '')
+        assert client.forward(['list'], os.path.join(self.tmp, 'missing.sock')) is None
+
+    def test_refuses_second_server(self):
+        self.assertRaises(RuntimeError, Server(self.path).bind)
+
+        stale = os.path.join(self.tmp, 'stale.sock')
+        Server(stale).bind()
+        server = Server(stale)
+        server.bind()
+        server.close()
+
+        assert not os.path.exists(stale)
+
+    def test_does_not_wait_for_hooks(self):
+        rc = os.path.join(self.tmp, 'xprofilerc')
+        with open(rc, 'w') as file:
+            file.write(open('test/xprofilerc_both_example').read().replace(
+                '[docked]', '[docked]\nexec_post = sleep 2', 1))
+
+        started = time.time()
+        status, stdout, stderr = self.forward(['--config', rc, 'activate', '--force', 'docked'])
+
+        assert status == 0
+        assert time.time() - started < 1.5
+
+        hooks.wait()
+
+    def test_falls_back_when_server_hangs(self):
+        path = os.path.join(self.tmp, 'hanging.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(1)
+        self.addCleanup(listener.close)
+
+        with patch('xprofile.client.TIMEOUT', 0.2), patch('sys.stderr', new_callable=StringIO) as stderr:
+            assert client.forward(['list'], path) is None
+
+        assert 'did not take the command within 0.2s' in stderr.getvalue()
+
+    def test_reports_error_when_server_stalls(self):
+        path = os.path.join(self.tmp, 'stalling.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(1)
+        self.addCleanup(listener.close)
+
+        received, done = [], threading.Event()
+
+        def stall():
+            connection, _ = listener.accept()
+            connection.sendall(client.GREETING)
+            received.append(connection.recv(65536))
+            done.wait(5)
+            connection.close()
+
+        thread = threading.Thread(target=stall)
+        thread.start()
+
+        try:
+            with patch('xprofile.client.TIMEOUT', 0.2), patch('sys.stderr', new_callable=StringIO) as stderr:
+                assert client.forward(['activate'], path) == 1
+        finally:
+            done.set()
+            thread.join()
+
+        assert b'"activate"' in received[0]
+        assert 'did not answer within 0.2s' in stderr.getvalue()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+from mock import patch
+from unittest import TestCase
+
+from test import fake_process
+from xprofile import snapshots
+from xprofile.__main__ import main
+from xprofile.xrandr import Xrandr, Rotation
+
+
+class SnapshotTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        with open('test/docked.txt', 'rb') as file:
+            stdout = file.read()
+
+        patchers = [
+            patch('xprofile.xrandr.Popen'),
+            patch('xprofile.xrandr.Xrandr.get_timestamps', return_value=(100, 50)),
+            patch.dict('os.environ', {'XDG_CACHE_HOME': self.tmp, 'XDG_RUNTIME_DIR': self.tmp}),
+        ]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+        self.popen = patchers[0].start()
+        self.popen.side_effect = lambda *args, **kwargs: fake_process(stdout)
+        self.timestamps = patchers[1].start()
+        patchers[2].start()
+
+        self.xrandr = Xrandr(display=':1')
+
+    def test_snapshot_is_reused_until_timestamps_change(self):
+        screen, edid = snapshots.get_screen(self.xrandr, ('edid',), False, self.tmp)
+        cached, cached_edid = snapshots.get_screen(self.xrandr, ('edid',), False, self.tmp)
+
+        assert self.popen.call_count == 1
+        assert os.path.exists(snapshots.snapshot_path(':1', self.tmp))
+        assert cached == screen
+        assert cached_edid == edid == 'c2989146488f57fa9dc5f7efc263b0fd'
+        assert cached.displays[5].rotation is Rotation.LEFT
+
+        self.timestamps.return_value = (101, 50)
+        snapshots.get_screen(self.xrandr, ('edid',), False, self.tmp)
+
+        assert self.popen.call_count == 2
+
+    def test_snapshot_must_cover_fields_and_probe(self):
+        snapshots.get_screen(self.xrandr, ('edid',), False, self.tmp)
+        snapshots.get_screen(self.xrandr, ('edid', 'modes'), False, self.tmp)
+        snapshots.get_screen(self.xrandr, ('edid',), True, self.tmp)
+        snapshots.get_screen(self.xrandr, ('edid',), False, self.tmp)
+        # A probe is never answered from a snapshot, not even a probed one
+        snapshots.get_screen(self.xrandr, ('edid',), True, self.tmp)
+
+        assert [call[0][0][1:] for call in self.popen.call_args_list] == [
+            ['--current', '--verbose'],
+            ['--current', '--verbose'],
+            ['--verbose'],
+            ['--verbose'],
+        ]
+
+    def test_snapshot_not_stored_when_screen_changed_while_querying(self):
+        self.timestamps.side_effect = [(100, 50), (100, 51)]
+        snapshots.get_screen(self.xrandr, ('edid',), True, self.tmp)
+
+        assert not os.path.exists(snapshots.snapshot_path(':1', self.tmp))
+
+    def test_snapshot_display_is_checked(self):
+        snapshots.get_screen(self.xrandr, ('edid',), True, self.tmp)
+        path = snapshots.snapshot_path(':1', self.tmp)
+
+        assert snapshots.load_snapshot(path, ':2') == None
+        assert snapshots.snapshot_path('host:10.0', self.tmp).endswith(
+            'screen-host%3a10.0-py{0}{1}.pickle'.format(*__import__('sys').version_info[:2]))
+
+    def test_cli_commands_share_snapshot(self):
+        for argv in (['list'], ['activate'], ['activate'], ['current'], ['--no-cache', 'current']):
+            main(['--config', 'test/xprofilerc_duplicates_example', '--display', ':1'] + argv)
+
+        # activate always probes, current reuses the probed screen
+        assert [call[0][0][1:] for call in self.popen.call_args_list] == [
+            ['--current', '--verbose'],
+            ['--verbose'],
+            ['--verbose'],
+            ['--current', '--verbose'],
+        ]
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import subprocess
+
+from unittest import TestCase, skipIf
+
+
+# Cumulative import time of xprofile.__main__ in microseconds. The check
+# takes the best of a few runs; override on slow machines.
+IMPORT_BUDGET = int(os.environ.get('XPROFILE_IMPORT_BUDGET', 100000))
+
+# Modules that must only be imported by the subcommands needing them
+DEFERRED_MODULES = [
+    'distutils',
+    'hashlib',
+    'shlex',
+    'subprocess',
+    'tempfile',
+    'configparser',
+    'xprofile.xrandr',
+    'xprofile.randr',
+    'xprofile.daemon',
+    'xprofile.snapshots',
+    'xprofile.lock',
+    'xprofile.server',
+    'xprofile.store',
+    'xprofile.layout',
+    'xprofile.edid',
+]
+
+
+def import_times(module):
+    '''
+    Import a module in a fresh interpreter with `-X importtime` and return a
+    dict of module name to cumulative import time in microseconds
+    '''
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    env.pop('PYTHONIMPORTTIME', None)
+
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    stdout, stderr = process.communicate()
+    assert process.returncode == 0, stderr
+
+    times = {}
+    for line in stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@skipIf(sys.version_info < (3, 7), '-X importtime requires python 3.7')
+class StartupTestCase(TestCase):
+    def test_deferred_modules_are_not_imported(self):
+        times = import_times('xprofile.__main__')
+
+        for module in DEFERRED_MODULES:
+            assert module not in times, '{0} is imported at startup'.format(module)
+
+    def test_import_time_budget(self):
+        best = min(import_times('xprofile.__main__')['xprofile.__main__'] for _ in range(3))
+
+        assert best < IMPORT_BUDGET, \
+            'importing xprofile.__main__ took {0}us, budget is {1}us'.format(best, IMPORT_BUDGET)
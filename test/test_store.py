@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+
+from io import StringIO
+from mock import patch
+from unittest import TestCase
+
+from xprofile.__main__ import main
+from xprofile.profiles import load_config
+from xprofile.store import SqliteStore
+
+
+RC = '''[DEFAULT]
+display = :0
+args = --auto
+exec_post = notify-send xprofile
+
+[laptop]
+name = on the go
+edid = cfdee1377d86e245f2d187082f7a504a
+edids = cfdee1377d86e245f2d187082f7a504a
+
+[docked]
+name = 100% my desk
+edid = c2989146488f57fa9dc5f7efc263b0fd
+edids = cfdee1377d86e245f2d187082f7a504a ea5d405a5beff06696f1ab491b903c2a
+args = --output LVDS1 --off --output DP2 --mode 1920x1080
+exec_post = dock-keyboard
+    nm-online &
+'''
+
+
+class SqliteStoreTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        self.rc = os.path.join(self.tmp, 'xprofilerc')
+        with open(self.rc, 'w') as file:
+            file.write(RC.replace('100%', '100%%'))
+
+        self.path = os.path.join(self.tmp, 'profiles.sqlite')
+        self.store = SqliteStore(self.path)
+        self.addCleanup(self.store.close)
+        self.store.import_config(load_config(self.rc))
+
+    def test_same_answers_as_rc(self):
+        config = load_config(self.rc)
+        store = load_config(self.path)
+
+        assert isinstance(store, SqliteStore)
+        assert store.sections() == config.sections() == ['laptop', 'docked']
+        assert store.defaults() == config.defaults()
+
+        for section in ['DEFAULT', 'laptop', 'docked']:
+            for option in ['name', 'edid', 'args', 'display', 'exec_post']:
+                assert store.has_option(section, option) == config.has_option(section, option)
+                if config.has_option(section, option):
+                    assert store.get(section, option) == config.get(section, option)
+            assert store.get_args(section) == config.get_args(section)
+            assert store.get_hooks(section) == config.get_hooks(section)
+
+        assert store.get('docked', 'name') == '100% my desk'
+        assert store.find_profile('c2989146488f57fa9dc5f7efc263b0fd') == 'docked'
+        assert store.find_profile('unknown') is None
+        assert store.rank(['cfdee1377d86e245f2d187082f7a504a']) == \
+            config.edid_index.rank(['cfdee1377d86e245f2d187082f7a504a']) == [(1.0, 'laptop'), (0.5, 'docked')]
+        assert store.match_profile(['ea5d405a5beff06696f1ab491b903c2a', 'other']) is None
+        assert store.match_profile(['ea5d405a5beff06696f1ab491b903c2a']) == 'docked'
+        assert not store.has_section('office')
+
+    def test_export_round_trips(self):
+        exported = os.path.join(self.tmp, 'exported')
+        with open(exported, 'w') as file:
+            file.write(self.store.export())
+
+        config, again = load_config(self.rc), load_config(exported)
+
+        assert again.sections() == config.sections()
+        for section in ['DEFAULT'] + config.sections():
+            assert again.own_options(section) == config.own_options(section)
+
+    def test_put_replaces_profiles_and_reports_duplicates(self):
+        with patch('xprofile.store.log') as log:
+            self.store.put({}, [('laptop', {'edid': 'c2989146488f57fa9dc5f7efc263b0fd'}),
+                                ('office', {'edid': 'c2989146488f57fa9dc5f7efc263b0fd'})])
+
+        assert self.store.sections() == ['laptop', 'docked', 'office']
+        assert self.store.find_profile('c2989146488f57fa9dc5f7efc263b0fd') == 'laptop'
+        assert self.store.match_profile(['cfdee1377d86e245f2d187082f7a504a']) == 'docked'
+        assert self.store.get_duplicates() == {
+            'c2989146488f57fa9dc5f7efc263b0fd': ['laptop', 'docked', 'office']}
+        assert log.warn.call_count == 1
+
+        self.store.remove('docked')
+
+        assert self.store.query('SELECT count(*) FROM fingerprints') == [(0,)]
+
+    def test_concurrent_writers(self):
+        def write(thread):
+            store = SqliteStore(self.path)
+            for number in range(20):
+                name = 'profile-{0}-{1}'.format(thread, number)
+                store.put({}, [(name, {'edid': name})])
+            store.close()
+
+        threads = [threading.Thread(target=write, args=(thread,)) for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sections = self.store.sections()
+
+        assert len(sections) == 82
+        assert self.store.query('PRAGMA journal_mode') == [('wal',)]
+        assert len(set(position for position, in self.store.query('SELECT position FROM profiles'))) == 82
+
+    def test_import_and_export_commands(self):
+        path = os.path.join(self.tmp, 'new.sqlite')
+
+        assert main(['--no-server', '--config', path, 'import', self.rc]) == 0
+
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            assert main(['--no-server', '--config', path, 'export']) == 0
+
+        assert stdout.getvalue() == self.store.export()
+        assert main(['--no-server', '--config', self.rc, 'import', self.rc]) == 1
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import stat
+import shutil
+import tempfile
+
+from io import BytesIO
+from mock import patch
+from unittest import TestCase
+
+from xprofile.synthetic import generate, make_edid
+from xprofile.xrandr import Xrandr, XrandrTimeout, parse_screen
+
+
+FAKE_XRANDR = '''#!/bin/sh
+PYTHONPATH={root} exec {python} -m xprofile.fakexrandr "$@"
+'''
+
+
+def test_generate():
+    screen = parse_screen(BytesIO(generate(outputs=6, connected=3, active=2, modes=30)))
+
+    assert len(screen.displays) == 6
+    assert [display.connected for display in screen.displays] == [True] * 3 + [False] * 3
+    assert [display.active for display in screen.displays] == [True] * 2 + [False] * 4
+    assert [len(display.modes) for display in screen.displays] == [30] * 3 + [0] * 3
+    assert [len(display.edid) for display in screen.displays] == [8] * 3 + [0] * 3
+    assert len(set(screen.get_fingerprints())) == 3
+    assert screen.get_xrandr_options()[:7] == [
+        '--output', 'DP-0', '--primary', '--mode', '1920x1080', '--pos', '0x0']
+
+    assert generate(seed=1) == generate(seed=1)
+    assert generate(seed=1) != generate(seed=2)
+
+
+def test_make_edid():
+    edid = bytearray(make_edid(3))
+
+    assert len(edid) == 128
+    assert edid[:8] == bytearray.fromhex('00ffffffffffff00')
+    assert sum(edid) % 256 == 0
+
+
+class FakeXrandrTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        self.xrandr_bin = os.path.join(self.tmp, 'xrandr')
+        with open(self.xrandr_bin, 'w') as file:
+            file.write(FAKE_XRANDR.format(root=os.getcwd(), python=sys.executable))
+        os.chmod(self.xrandr_bin, stat.S_IRWXU)
+
+        self.log = os.path.join(self.tmp, 'calls.log')
+
+    def fake(self, **settings):
+        env = dict(('XPROFILE_FAKE_' + key.upper(), str(value)) for key, value in settings.items())
+        env['XPROFILE_FAKE_LOG'] = self.log
+
+        patcher = patch.dict('os.environ', env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return Xrandr(xrandr_bin=self.xrandr_bin, display=':7')
+
+    def calls(self):
+        with open(self.log) as file:
+            return [json.loads(line) for line in file]
+
+    def test_serves_synthetic_output_and_logs_calls(self):
+        xrandr = self.fake(outputs=5, connected=2, modes=10)
+        screen = xrandr.get_screen(probe=False)
+        xrandr.apply(['--output', 'DP-1', '--off'])
+
+        assert len(screen.displays) == 5
+        assert [call['argv'] for call in self.calls()] == [
+            ['--current', '--verbose'],
+            ['--output', 'DP-1', '--off'],
+        ]
+        assert self.calls()[0]['display'] == ':7'
+
+    def test_serves_dump(self):
+        screen = self.fake(dump='test/docked.txt').get_screen()
+
+        assert screen.get_edid() == 'c2989146488f57fa9dc5f7efc263b0fd'
+
+    def test_failure_and_latency(self):
+        try:
+            self.fake(failure_rate=1).get_screen()
+        except RuntimeError as err:
+            assert "Can't open display :7" in str(err)
+        else:
+            assert False, 'Failed to raise RuntimeError'
+
+        xrandr = self.fake(failure_rate=0, latency=5)
+        xrandr.timeout = 0.5
+
+        self.assertRaises(XrandrTimeout, xrandr.get_screen)
+        assert len(xrandr.get_screen(probe=False).displays) == 4
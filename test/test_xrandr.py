@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
+import time
+import subprocess
+
+from io import BytesIO
 from mock import patch
-from xprofile.xrandr import Xrandr
+from unittest import skipUnless
+from test import fake_process
+from xprofile import randr
+from xprofile.xrandr import Display, Mode, Xrandr, parse_screen, parse_screens, parse_xrandr_options
 from distutils.spawn import find_executable
 
 xrandr_bin = find_executable('xrandr')
 
 @patch('xprofile.xrandr.Popen')
 def test_call_xrandr_failure(Popen):
-    Popen.return_value.communicate.return_value = (None, 'An unknown error occurred.')
-    Popen.return_value.wait.return_value = 1
+    Popen.side_effect = lambda *args, **kwargs: fake_process(stderr=b'An unknown error occurred.\n', status=1)
 
     try:
         edid = Xrandr().get_screen()
@@ -23,8 +29,7 @@ def test_call_xrandr_failure(Popen):
 
 @patch('xprofile.xrandr.Popen')
 def test_call_xrandr_set_display(Popen):
-    Popen.return_value.communicate.return_value = (b'', None)
-    Popen.return_value.wait.return_value = 0
+    Popen.side_effect = lambda *args, **kwargs: fake_process()
 
     Xrandr(display=':1').call_xrandr()
 
@@ -37,8 +42,7 @@ def test_xrandr_get_screen_multiple(Popen):
     with open('test/multi_screen.txt', 'rb') as file:
         xrandr_stdout = file.read()
 
-    Popen.return_value.communicate.return_value = (xrandr_stdout, None)
-    Popen.return_value.wait.return_value = 0
+    Popen.side_effect = lambda *args, **kwargs: fake_process(xrandr_stdout)
 
     screen = Xrandr().get_screen()
 
@@ -88,8 +92,7 @@ def test_xrandr_get_screen_docked(Popen):
     with open('test/docked.txt', 'rb') as file:
         xrandr_stdout = file.read()
 
-    Popen.return_value.communicate.return_value = (xrandr_stdout, None)
-    Popen.return_value.wait.return_value = 0
+    Popen.side_effect = lambda *args, **kwargs: fake_process(xrandr_stdout)
 
     screen = Xrandr().get_screen()
 
@@ -144,8 +147,7 @@ def test_xrandr_get_screen_laptop(Popen):
     with open('test/laptop.txt', 'rb') as file:
         xrandr_stdout = file.read()
 
-    Popen.return_value.communicate.return_value = (xrandr_stdout, None)
-    Popen.return_value.wait.return_value = 0
+    Popen.side_effect = lambda *args, **kwargs: fake_process(xrandr_stdout)
 
     screen = Xrandr().get_screen()
 
@@ -181,3 +183,366 @@ def test_xrandr_get_screen_laptop(Popen):
     ]
 
     assert screen.get_edid() == 'cfdee1377d86e245f2d187082f7a504a'
+
+
+@patch('xprofile.randr.get_libraries')
+@patch('xprofile.xrandr.Popen')
+def test_xrandr_backend_auto_falls_back(Popen, get_libraries):
+    with open('test/laptop.txt', 'rb') as file:
+        xrandr_stdout = file.read()
+
+    get_libraries.side_effect = RuntimeError('libXrandr not found')
+    Popen.side_effect = lambda *args, **kwargs: fake_process(xrandr_stdout)
+
+    screen = Xrandr(backend='auto').get_screen()
+
+    assert get_libraries.called
+    assert Popen.called
+    assert screen.get_edid() == 'cfdee1377d86e245f2d187082f7a504a'
+
+
+@patch('xprofile.randr.get_libraries')
+@patch('xprofile.xrandr.Popen')
+def test_xrandr_backend_native_does_not_fall_back(Popen, get_libraries):
+    get_libraries.side_effect = RuntimeError('libXrandr not found')
+
+    try:
+        Xrandr(backend='native').get_screen()
+    except RuntimeError as err:
+        assert str(err) == 'libXrandr not found'
+    else:
+        assert False, 'Failed to raise RuntimeError'
+
+    assert not Popen.called
+
+
+def test_xrandr_unknown_backend():
+    try:
+        Xrandr(backend='xcb')
+    except ValueError:
+        pass
+    else:
+        assert False, 'Failed to raise ValueError'
+
+
+@skipUnless(find_executable('Xvfb') and xrandr_bin and randr.is_available(),
+            'Xvfb, xrandr and libXrandr are required')
+def test_xrandr_backends_agree_on_xvfb():
+    display = ':96'
+    xvfb = subprocess.Popen(['Xvfb', display, '+extension', 'RANDR'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for _ in range(50):
+            try:
+                randr.RandrConnection(display).close()
+                break
+            except RuntimeError:
+                time.sleep(0.1)
+
+        native = Xrandr(display=display, backend='native').get_screen()
+        parsed = Xrandr(display=display, backend='xrandr').get_screen()
+
+        assert native.get_edid() == parsed.get_edid()
+        assert native.get_xrandr_options() == parsed.get_xrandr_options()
+        assert [d['name'] for d in native['displays']] == [d['name'] for d in parsed['displays']]
+    finally:
+        xvfb.terminate()
+        xvfb.wait()
+
+
+def test_parse_screen_edid_only():
+    with open('test/docked.txt', 'rb') as file:
+        full = parse_screen(file)
+        file.seek(0)
+        edid_only = parse_screen(file, fields=('edid',))
+
+    assert edid_only.get_edid() == full.get_edid() == 'c2989146488f57fa9dc5f7efc263b0fd'
+    assert [d['name'] for d in edid_only['displays']] == [d['name'] for d in full['displays']]
+    assert edid_only['displays'][5]['geometry'] == full['displays'][5]['geometry']
+    assert full['displays'][5]['modes'] != {}
+    assert all(d['modes'] == {} for d in edid_only['displays'])
+
+
+def test_parse_screen_ignores_hex_outside_edid_block():
+    screen = parse_screen([
+        b'HDMI1 connected 1920x1080+0+0 (0x48) normal (normal left inverted right x axis y axis) 0mm x 0mm\n',
+        b'\tEDID: \n',
+        b'\t\t00ffffffffffff0010ac674053335431\n',
+        b'\tGUID: \n',
+        b'\t\t0123456789abcdef0123456789abcdef\n',
+        b'  1920x1080 (0x48) 148.500MHz +HSync +VSync *current +preferred\n',
+        b'        h: width  1920 start 2008 end 2052 total 2200 skew    0 clock  67.50KHz\n',
+    ])
+
+    assert screen['displays'][0]['edid'] == [b'00ffffffffffff0010ac674053335431']
+    assert screen['displays'][0]['modes']['(0x48)']['current'] == True
+    assert screen['displays'][0]['modes']['(0x48)']['preferred'] == True
+
+
+def test_parse_xrandr_options():
+    assert parse_xrandr_options(['--output', 'LVDS1', '--off', '--output', 'DP2', '--mode', '1920x1080', '--primary']) == [
+        ('LVDS1', {'off': True}, ['--output', 'LVDS1', '--off']),
+        ('DP2', {'mode': '1920x1080', 'primary': True}, ['--output', 'DP2', '--mode', '1920x1080', '--primary']),
+    ]
+    assert parse_xrandr_options(['--auto']) == None
+    assert parse_xrandr_options(['--output', 'DP2', '--right-of', 'LVDS1']) == None
+    assert parse_xrandr_options(['--output', 'DP2', '--mode']) == None
+
+
+def test_screen_get_changes():
+    with open('test/docked.txt', 'rb') as file:
+        screen = parse_screen(file)
+
+    assert screen.get_changes(screen.get_xrandr_options()) == ([], [])
+    assert screen.get_changes(['--output', 'LVDS1', '--mode', '1920x1080', '--pos', '0x0']) == (
+        ['--output', 'LVDS1', '--mode', '1920x1080', '--pos', '0x0'], ['LVDS1: on'])
+    assert screen.get_changes(['--output', 'HDMI3', '--off', '--output', 'DP2', '--pos', '0x0', '--primary']) == (
+        ['--output', 'HDMI3', '--off', '--output', 'DP2', '--pos', '0x0', '--primary'],
+        ['HDMI3: off', 'DP2: pos 0x500 -> 0x0'])
+    assert screen.get_changes(['--output', 'HDMI3', '--primary']) == (
+        ['--output', 'HDMI3', '--primary'], ['HDMI3: primary'])
+    assert screen.get_changes(['--output', 'DP9', '--off']) == None
+    assert screen.get_changes(['--auto']) == None
+    assert screen.get_changes(['--output', 'DP2', '--rate', '60.00']) == ([], [])
+    assert screen.get_changes(['--output', 'DP2', '--rate', '30.00']) == (
+        ['--output', 'DP2', '--rate', '30.00'], ['DP2: rate 60.00 -> 30.00'])
+
+
+SLOW_XRANDR = '''#!/bin/sh
+# Sleep on the first {slow} calls, then behave like xrandr
+count=$(cat {counter} 2>/dev/null || echo 0)
+echo $((count + 1)) > {counter}
+[ "$count" -lt {slow} ] && {sleep}
+cat test/laptop.txt
+'''
+
+
+def slow_xrandr(tmp, slow, sleep='exec sleep 10'):
+    import os
+    import stat
+
+    path = os.path.join(tmp, 'xrandr')
+    with open(path, 'w') as file:
+        file.write(SLOW_XRANDR.format(slow=slow, sleep=sleep, counter=os.path.join(tmp, 'counter')))
+    os.chmod(path, stat.S_IRWXU)
+
+    return path
+
+
+def test_xrandr_timeout_kills_and_raises():
+    import shutil
+    import tempfile
+    from xprofile.xrandr import XrandrTimeout
+
+    tmp = tempfile.mkdtemp()
+    xrandr = Xrandr(xrandr_bin=slow_xrandr(tmp, 5), timeout=0.2, retries=1, backoff=0.01)
+
+    start = time.time()
+    try:
+        xrandr.get_screen()
+    except XrandrTimeout as err:
+        assert 'of 0.2s each' in str(err)
+        assert '2 attempt(s)' in str(err)
+    else:
+        assert False, 'Failed to raise XrandrTimeout'
+    finally:
+        shutil.rmtree(tmp)
+
+    assert time.time() - start < 5
+
+
+def test_xrandr_timeout_kills_wrapped_xrandr():
+    import shutil
+    import tempfile
+    from xprofile.xrandr import XrandrTimeout
+
+    # A wrapper that doesn't exec keeps the stdout of its child open
+    tmp = tempfile.mkdtemp()
+    xrandr = Xrandr(xrandr_bin=slow_xrandr(tmp, 5, 'sleep 10; exit'), timeout=0.3, retries=1, backoff=0.01)
+
+    start = time.time()
+    try:
+        xrandr.get_screen()
+    except XrandrTimeout:
+        pass
+    else:
+        assert False, 'Failed to raise XrandrTimeout'
+    finally:
+        shutil.rmtree(tmp)
+
+    assert time.time() - start < 5
+
+
+def test_xrandr_timeout_retry_succeeds():
+    import shutil
+    import tempfile
+
+    tmp = tempfile.mkdtemp()
+    try:
+        screen = Xrandr(xrandr_bin=slow_xrandr(tmp, 1), timeout=0.5, retries=1,
+                        backoff=0.01).get_screen()
+    finally:
+        shutil.rmtree(tmp)
+
+    assert screen.get_edid() == 'cfdee1377d86e245f2d187082f7a504a'
+
+
+STREAMING_XRANDR = '''#!/bin/sh
+head -n 5 test/laptop.txt
+sleep 0.5
+tail -n +6 test/laptop.txt
+'''
+
+
+def test_xrandr_output_is_parsed_while_written():
+    import os
+    import stat
+    import shutil
+    import tempfile
+
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'xrandr')
+    with open(path, 'w') as file:
+        file.write(STREAMING_XRANDR)
+    os.chmod(path, stat.S_IRWXU)
+
+    received = []
+
+    def consume(stdout):
+        for line in stdout:
+            received.append(time.time())
+        return len(received)
+
+    try:
+        xrandr = Xrandr(xrandr_bin=path)
+        assert xrandr.stream_xrandr([], consume) == len(open('test/laptop.txt', 'rb').readlines())
+        assert received[-1] - received[0] > 0.3
+        assert xrandr.get_screen().get_edid() == 'cfdee1377d86e245f2d187082f7a504a'
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_screen_model():
+    from xprofile.xrandr import Rotation, Geometry
+
+    with open('test/docked.txt', 'rb') as file:
+        stdout = file.read()
+
+    screen = parse_screen(BytesIO(stdout))
+    other = parse_screen(BytesIO(stdout))
+    rotated = screen.displays[5]
+
+    assert screen == other
+    assert hash(screen) == hash(other)
+    assert len(set([screen, other])) == 1
+
+    assert rotated.rotation is Rotation.LEFT
+    assert rotated.rotation == 'left'
+    assert rotated.geometry == Geometry(1080, 1920, 1930, 0)
+    assert rotated.geometry['offset'] == '1930x0'
+    assert rotated.modes['(0xc9)'].current
+    assert screen.displays[6].rotation is Rotation.NORMAL
+    assert screen.displays[6]['rotation'] == None
+    assert dict((key, rotated[key]) for key in rotated)['active'] == True
+
+    other.displays[5].rotation = Rotation.get('right')
+    assert screen != other
+
+    try:
+        Rotation.get('sideways')
+    except ValueError:
+        pass
+    else:
+        assert False, 'Failed to raise ValueError'
+
+
+def test_screen_fingerprints():
+    with open('test/docked.txt', 'rb') as file:
+        screen = parse_screen(BytesIO(file.read()), fields=('edid',))
+
+    assert screen.displays[0].get_fingerprint() == 'cfdee1377d86e245f2d187082f7a504a'
+    assert screen.displays[1].get_fingerprint() == None
+    assert screen.get_fingerprints() == [
+        '0394049786504997112f705379d6c6d6',
+        'cfdee1377d86e245f2d187082f7a504a',
+        'ea5d405a5beff06696f1ab491b903c2a',
+    ]
+
+
+def test_modes_have_clock_and_refresh():
+    with open('test/docked.txt', 'rb') as file:
+        lvds = parse_screen(file).displays[0]
+
+    assert lvds.modes['(0x4b)'] == Mode('(0x4b)', '1920x1080', False, True, 139.0, 60.15)
+    assert lvds.modes['(0x4c)'].refresh == 40.06
+    assert lvds.modes['(0x4b)'].rate == '60.15'
+    assert Mode('(0x4b)', '1920x1080').rate is None
+    assert [mode.id for mode in lvds.get_modes_by_dimension()['1920x1080']] == ['(0x4b)', '(0x4c)']
+
+    # Modes without timing lines are kept without a refresh rate
+    lines = [line for line in open('test/docked.txt', 'rb') if not line.startswith(b'        ')]
+    modes = parse_screen(lines).displays[0].modes
+
+    assert sorted(modes) == sorted(lvds.modes)
+    assert modes['(0x4b)'] == Mode('(0x4b)', '1920x1080', False, True, 139.0)
+
+
+def test_best_mode():
+    display = Display(name='DP-1', status='connected', modes={
+        '(0x40)': Mode('(0x40)', '2560x1440', False, True, 241.5, 59.95),
+        '(0x41)': Mode('(0x41)', '2560x1440', False, False, 586.6, 143.91),
+        '(0x42)': Mode('(0x42)', '3840x2160', False, False, 297.0, 30.0),
+    })
+
+    assert display.get_best_mode().id == '(0x41)'
+
+    display.modes['(0x40)'] = display.modes['(0x40)']._replace(preferred=False)
+    assert display.get_best_mode().id == '(0x42)'
+
+    assert Display(name='DP-2', status='connected').get_best_mode() is None
+
+
+def test_parse_screens():
+    with open('test/laptop.txt', 'rb') as file:
+        laptop = file.read()
+    with open('test/docked.txt', 'rb') as file:
+        docked = file.read().replace(b'Screen 0:', b'Screen 1:', 1)
+
+    screens = [parse_screen(BytesIO(laptop)), parse_screen(BytesIO(docked))]
+    both = parse_screens(BytesIO(laptop + docked))
+
+    assert both == screens
+    assert [screen.number for screen in both] == [0, 1]
+    assert (both[1].minimum, both[1].current, both[1].maximum) == ('320x200', '3010x1920', '8192x8192')
+    assert parse_screen(BytesIO(laptop + docked)) == screens[0]
+
+    with open('test/multi_screen.txt', 'rb') as file:
+        lines = file.read().split(b'\n', 1)[1]
+
+    # Outputs without a screen header
+    screen, = parse_screens(BytesIO(lines))
+    assert screen.number is None and len(screen.displays) == 3
+
+
+@patch('xprofile.xrandr.Popen')
+@patch('xprofile.xrandr.Xrandr.get_screen_count', return_value=2)
+def test_xrandr_get_screens_per_screen(get_screen_count, Popen):
+    with open('test/laptop.txt', 'rb') as file:
+        laptop = file.read()
+
+    def popen(args, **kwargs):
+        number = args[args.index('--screen') + 1].encode()
+        return fake_process(laptop.replace(b'Screen 0:', b'Screen ' + number + b':'))
+
+    Popen.side_effect = popen
+
+    screens = Xrandr().get_screens(jobs=2)
+
+    assert [screen.number for screen in screens] == [0, 1]
+    assert sorted(call[0][0][1:] for call in Popen.call_args_list) == [
+        ['--screen', '0', '--verbose'], ['--screen', '1', '--verbose']]
+
+    Popen.side_effect = lambda *args, **kwargs: fake_process()
+    Xrandr(screen=1).apply(['--output', 'LVDS1', '--off'])
+
+    assert Popen.call_args[0][0] == [xrandr_bin, '--screen', '1', '--output', 'LVDS1', '--off']
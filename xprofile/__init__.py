@@ -6,4 +6,5 @@ DEFAULT_SECTION = '''\
 [DEFAULT]
 display = {display}
 args = --auto
+layout = extend
 '''
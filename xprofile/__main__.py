@@ -1,35 +1,68 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+from __future__ import print_function
 
 import sys
 import os
 import logging
 
 from argparse import ArgumentParser
-from shlex import split
-from subprocess import Popen
 
 from xprofile import __version__, DEFAULT_SECTION
-from xprofile.xrandr import Xrandr
+from xprofile import hooks, profiles, timings
+from xprofile.cache import user_cache_dir, user_runtime_dir
 
-
-try:
-    from ConfigParser import ConfigParser
-except ImportError:
-    from configparser import ConfigParser
+# Modules only some subcommands need (xprofile.xrandr, subprocess, ...) are
+# imported inside the functions using them to keep startup fast
 
 
 PROFILE_STRING = '''[{profile}]
 name = {name}
 edid = {edid}
+edids = {edids}
 args = {args}'''
 
 
 log = logging.getLogger(__name__)
 
-def _get_current_screen_and_edid():
-    screen = Xrandr().get_screen()
-    current_edid = screen.get_edid()
+def _get_xrandr(args, config, section='DEFAULT', display=None):
+    '''
+    Create an Xrandr instance for the selected display, X screen and
+    backend. The screen, timeout and retries given on the command line take
+    precedence over those in the given section of the config.
+    '''
+    from xprofile.xrandr import Xrandr
+
+    timeout, retries, screen = args.timeout, args.retries, args.screen
+
+    if screen is None and config.has_option(section, 'screen'):
+        screen = int(config.get(section, 'screen'))
+
+    if timeout is None and config.has_option(section, 'timeout'):
+        timeout = float(config.get(section, 'timeout'))
+
+    if retries is None:
+        retries = int(config.get(section, 'retries')) if config.has_option(section, 'retries') else 0
+
+    return Xrandr(display=display or args.display, backend=args.backend,
+                  timeout=timeout, retries=retries, screen=screen)
+
+
+
+def _get_current_screen_and_edid(args, config, fields=None, probe=None, section='DEFAULT'):
+    from xprofile.xrandr import FIELDS
+
+    if fields is None:
+        fields = FIELDS
+
+    if probe is None:
+        probe = args.probe == 'always'
+
+    from xprofile import snapshots
+
+    runtime_dir = None if args.no_cache else user_runtime_dir()
+    screen, current_edid = snapshots.get_screen(_get_xrandr(args, config, section), fields, probe,
+                                                runtime_dir, getattr(args, 'screens', None))
 
     log.debug('Edid of your current screen is: {0}'.format(current_edid))
 
@@ -37,14 +70,77 @@ def _get_current_screen_and_edid():
 
 
 
-def _get_profile_with_edid(edid, config):
-    profile_name = None
+def _get_current_profile(args, config, fields=('edid',), fuzzy=False, current=None):
+    '''
+    Find the profile matching the current screen, or the (screen, edid)
+    given as `current`. When the server's cached state does not match any
+    profile the displays are probed again.
+
+    With `fuzzy` a profile sharing most displays with the screen is
+    selected when no edid matches exactly, which is only meant for
+    activation: such a profile is not the current one.
+    '''
+    if current is None:
+        screen, current_edid = _get_current_screen_and_edid(args, config, fields=fields)
+    else:
+        screen, current_edid = current
+
+    profile_name = _get_profile_with_edid(current_edid, config)
+
+    if not profile_name and args.probe != 'always':
+        log.debug('No profile matches the cached screen state, probing displays')
+        screen, current_edid = _get_current_screen_and_edid(args, config, fields=fields, probe=True)
+        profile_name = _get_profile_with_edid(current_edid, config)
+
+    if not profile_name:
+        found = _get_profile_on_other_screens(args, config, fields, screen)
+
+        if found:
+            screen, current_edid, profile_name = found
+            # Compare the profile with, and apply it to, the screen it was found on
+            args.screen = screen.number
+
+    if not profile_name and fuzzy:
+        profile_name = _get_profile_with_fingerprints(screen.get_fingerprints(), config)
+
+    return (screen, current_edid, profile_name)
+
+
 
+def _get_profile_on_other_screens(args, config, fields, current):
+    '''
+    Look for a profile on the other X screens of the display when no screen
+    is selected on the command line or in the config. Returns the screen,
+    its edid and the profile found on it, or None.
+    '''
+    xrandr = _get_xrandr(args, config)
+
+    if xrandr.screen is not None or xrandr.get_screen_count() == 1:
+        return None
+
+    for probe in ([True] if args.probe == 'always' else [False, True]):
+        for screen in xrandr.get_screens(fields, probe, args.jobs):
+            if screen.number == current.number:
+                continue
+
+            edid = screen.get_edid()
+            profile_name = _get_profile_with_edid(edid, config)
+
+            if profile_name:
+                log.debug('Profile `{0}` found on screen {1}'.format(profile_name, screen.number))
+                return (screen, edid, profile_name)
+
+    return None
+
+
+
+def _get_profile_with_edid(edid, config):
     log.debug('Search through known profiles...')
-    for profile in config.sections():
-        if config.get(profile, 'edid') == edid:
-            profile_name = profile
-            break
+
+    find_profile = getattr(config, 'find_profile', None) or profiles.EdidIndex(config).get
+
+    with timings.phase('lookup'):
+        profile_name = find_profile(edid)
 
     if not profile_name:
         log.debug('No known profile found with edid: {0}'.format(edid))
@@ -55,6 +151,37 @@ def _get_profile_with_edid(edid, config):
 
 
 
+def _get_profile_with_fingerprints(fingerprints, config):
+    match_profile = getattr(config, 'match_profile', None) or profiles.EdidIndex(config).match
+
+    with timings.phase('lookup'):
+        profile_name = match_profile(fingerprints)
+
+    if profile_name:
+        log.info('Profile `{0}` matches most of the connected displays'.format(profile_name))
+
+    return profile_name
+
+
+
+def _describe_monitors(args, screen):
+    '''
+    Return a line per display with an EDID naming the monitor connected to it
+    '''
+    from xprofile import edid
+
+    cache_dir = None if args.no_cache else user_cache_dir()
+    lines = []
+
+    for display in screen.displays:
+        record = edid.get_edid_info(display, cache_dir)
+
+        if record is not None:
+            lines.append('{0}: {1}'.format(display.name, edid.describe(record)))
+
+    return lines
+
+
 def list_all_profiles(args, config):
     '''
     List all known profiles from ~/.xprofilerc
@@ -67,19 +194,22 @@ def list_all_profiles(args, config):
         log.warn('No profiles found')
         return 0
 
-    screen, current_edid = _get_current_screen_and_edid()
-    current_profile_name = _get_profile_with_edid(current_edid, config)
+    screen, current_edid, current_profile_name = _get_current_profile(args, config)
     padding = max([len(p) for p in known_profiles])
 
     for profile in known_profiles:
         vars = {
             'active': '*' if profile == current_profile_name else ' ',
             'name':    profile,
-            'edid':    config.get(profile, 'edid'),
+            'edid':    config.get(profile, 'edid') if config.has_option(profile, 'edid') else '',
             'padding': padding
         }
 
-        print('{active} {name:{padding}}\t{edid}'.format(**vars))
+        print('{active} {name:{padding}}\t{edid}'.format(**vars), file=args.stdout)
+
+        if args.monitors and profile == current_profile_name:
+            for line in _describe_monitors(args, screen):
+                print('    {0}'.format(line), file=args.stdout)
 
     return 0
 
@@ -89,20 +219,24 @@ def get_current_profile(args, config):
     '''
     Show the details of the current active profile
     '''
-    screen, current_edid = _get_current_screen_and_edid()
-    current_profile_name = _get_profile_with_edid(current_edid, config)
+    screen, current_edid, current_profile_name = _get_current_profile(args, config)
 
     if not current_profile_name:
         log.error('Currently no known profile is applied. '
                   'Use the `generate` subcommand to generate one.')
         return 1
 
+    if args.monitors:
+        for line in _describe_monitors(args, screen):
+            print('# {0}'.format(line), file=args.stdout)
+
     print(PROFILE_STRING.format(
         profile=current_profile_name,
         name=config.get(current_profile_name, 'name'),
-        edid=config.get(current_profile_name, 'edid'),
+        edid=config.get(current_profile_name, 'edid') if config.has_option(current_profile_name, 'edid') else current_edid,
+        edids=' '.join(screen.get_fingerprints()),
         args=config.get(current_profile_name, 'args')
-    ))
+    ), file=args.stdout)
 
     return 0
 
@@ -112,7 +246,10 @@ def generate_profile(args, config):
     '''
     Generate configuration for the current EDID and print to stdout.
     '''
-    screen, current_edid = _get_current_screen_and_edid()
+    if args.dumps:
+        return _generate_profiles(args, config)
+
+    screen, current_edid = _get_current_screen_and_edid(args, config)
 
     profile_name = args.profile or 'my-screen-setup'
     name = args.description or '{0}\'s xrandr profile'.format(profile_name)
@@ -121,22 +258,194 @@ def generate_profile(args, config):
     print(PROFILE_STRING.format(profile=profile_name,
                                 name=name,
                                 edid=current_edid,
-                                args=xrandr_args))
+                                edids=' '.join(screen.get_fingerprints()),
+                                args=xrandr_args), file=args.stdout)
+
+    if args.screen is not None:
+        print('screen = {0}'.format(args.screen), file=args.stdout)
+
+    return 0
+
+
+
+def list_screens(args, config):
+    '''
+    Show every X screen of the display with its sizes and the outputs that
+    are connected to it
+    '''
+    screens = _get_xrandr(args, config).get_screens((), probe=args.probe == 'always', jobs=args.jobs)
+
+    for screen in screens:
+        print('Screen {0}: current {1}, minimum {2}, maximum {3}'.format(
+            screen.number, screen.current, screen.minimum, screen.maximum), file=args.stdout)
+
+        for display in screen.displays:
+            if not display.connected:
+                continue
+
+            if display.active:
+                geometry = display.geometry
+                state = '{0}+{1}+{2}'.format(geometry.dimension, geometry.x, geometry.y)
+            else:
+                state = 'off'
+
+            print('    {0} {1}'.format(display.name, state), file=args.stdout)
+
+    return 0
+
+
+
+def _generate_profiles(args, config):
+    '''
+    Generate a profile for each distinct screen in a directory or tarball of
+    `xrandr --verbose` dumps. Prints them as one rc, or stores them as a
+    compiled profile database with --database.
+    '''
+    from xprofile import batch
+
+    try:
+        results = batch.parse_dumps(args.dumps, args.jobs)
+    except (IOError, OSError, RuntimeError) as err:
+        log.error('Cannot read dumps: {0}'.format(err))
+        return 1
+
+    found, errors, collisions = batch.merge_profiles(results)
+
+    for error in errors:
+        log.error(error)
+
+    for collision in collisions:
+        log.warn(collision)
+
+    rc = '\n\n'.join(PROFILE_STRING.format(**profile) for profile in found)
+
+    if args.database:
+        profiles.write_database(args.database, rc)
+    elif rc:
+        print(rc, file=args.stdout)
+
+    log.info('Generated {0} profiles from {1} dumps, {2} collisions'.format(
+        len(found), len(results), len(collisions)))
+
+    return 1 if errors else 0
+
+
+
+def _apply_profile(xrandr, profile, config, dry_run=False, screen=None, xrandr_args=None):
+    '''
+    Pass the args of the given profile, or the given xrandr_args, to xrandr
+    and start the exec_post hooks of the profile, without waiting for them.
+
+    When the current screen is given only the outputs that differ from the
+    profile are passed to xrandr, and nothing is done at all when the
+    profile is already active.
+    '''
+    log.debug('Activating profile {0}...'.format(profile))
+
+    if xrandr_args is None:
+        xrandr_args = config.get_args(profile)
+
+    changes = screen.get_changes(xrandr_args) if screen is not None else None
+
+    if changes is not None:
+        xrandr_args, descriptions = changes
+
+        if not xrandr_args:
+            log.info('Profile {0} is already active'.format(profile))
+            return 0
+
+        for description in descriptions:
+            log.info('Changing {0}'.format(description))
+
+    elif screen is not None:
+        log.debug('Cannot compare profile {0} with the current screen'.format(profile))
+
+    if dry_run:
+        log.debug('Calling xrandr: {0}'.format(' '.join(xrandr_args)))
+        log.warn('Not calling xrandr because --dry-run option detected')
+
+        return 0
+
+    xrandr.apply(xrandr_args)
+
+    hooks_to_run = config.get_hooks(profile)
+
+    if hooks_to_run:
+        timeout = None
+        if config.has_option(profile, 'exec_post_timeout'):
+            timeout = float(config.get(profile, 'exec_post_timeout'))
+
+        hooks.run_hooks(hooks_to_run, timeout, xrandr.display)
+
     return 0
 
 
 
+def _get_single_flight(args, config, display=None):
+    '''
+    Return the SingleFlight guarding activations on the display, or None
+    when no lock directory can be used
+    '''
+    from xprofile import lock
+
+    display = display or args.display or os.environ.get('DISPLAY') or config.defaults().get('display', '')
+
+    try:
+        return lock.SingleFlight('activate-' + display, lock.get_lock_dir())
+    except (IOError, OSError) as err:
+        log.warn('Cannot lock activations, running without lock: {0}'.format(err))
+        return None
+
+
+
 def activate_profile(args, config):
     '''
     Either activate the given profile, or if no profile is given
     automatically select a known profile by comparing the hashes of
-    EDID's
+    EDID's.
+
+    Only one activation runs per display at a time. Automatic selections
+    requested while one runs, or within the debounce window, are folded
+    into a single run against the settled screen.
+    '''
+    from copy import copy
+
+    debounce = args.debounce
+    if debounce is None:
+        debounce = float(config.get('DEFAULT', 'debounce')) if config.has_option('DEFAULT', 'debounce') else 0.0
+
+    single_flight = _get_single_flight(args, config)
+
+    if single_flight is None:
+        return _activate_profile(args, config)
+
+    if args.profile:
+        return single_flight.run_exclusive(lambda: _activate_profile(args, config))
+
+    status = single_flight.run(lambda: _activate_profile(copy(args), config), debounce)
+
+    return 0 if status is None else status
+
+
+
+def _activate_profile(args, config, current=None):
     '''
-    xrandr = Xrandr()
+    Activate the named profile or select one for the current screen, or the
+    (screen, edid) given as `current`: the profile matching its edid, else
+    the one matching most of its displays, else the extended layout when
+    `layout = extend`, else DEFAULT
+    '''
+    from xprofile.xrandr import FIELDS
+
+    screen = None
 
     if not args.profile:
-        screen, current_edid = _get_current_screen_and_edid()
-        args.profile = _get_profile_with_edid(current_edid, config)
+        screen, current_edid, args.profile = _get_current_profile(
+            args, config, ('edid',) if args.force else FIELDS, fuzzy=True, current=current)
+
+        if not args.profile and config.has_option('DEFAULT', 'layout') \
+                and config.get('DEFAULT', 'layout') == 'extend':
+            return _activate_layout(args, config, screen, current_edid)
 
         if not args.profile:
             log.error('No known profile found, falling back to DEFAULT')
@@ -146,29 +455,179 @@ def activate_profile(args, config):
         log.error('No known profile found with name: {0}'.format(args.profile))
         return 1
 
-    log.debug('Activating profile {0}...'.format(args.profile))
-    xrandr_args = split(config.get(args.profile, 'args'))
+    elif not args.force:
+        screen, current_edid = _get_current_screen_and_edid(args, config, section=args.profile)
 
-    log.debug('Calling xrandr: {0}'.format(' '.join(xrandr_args)))
+    xrandr = _get_xrandr(args, config, args.profile)
 
-    if args.dry_run:
-        log.warn('Not calling xrandr because --dry-run option detected')
+    # A profile for another X screen than the one it was selected on can't
+    # be compared with the current screen
+    if screen is not None and xrandr.screen is not None and screen.number not in (None, xrandr.screen):
+        screen = None
 
-        return 0
+    return _apply_profile(xrandr, args.profile, config, args.dry_run,
+                          None if args.force else screen)
+
+
+
+def _activate_layout(args, config, screen, current_edid):
+    '''
+    Place all connected displays side by side at their best modes, for a
+    screen no profile matches
+    '''
+    from xprofile import layout
+    from xprofile.xrandr import FIELDS
+
+    if not any(display.modes for display in screen.displays):
+        screen, current_edid = _get_current_screen_and_edid(args, config, FIELDS)
+
+    cache_dir = None if args.no_cache else user_cache_dir()
+    layout_args = layout.get_layout(screen, current_edid, cache_dir)
+
+    if not layout_args:
+        log.error('No known profile found and no layout possible, falling back to DEFAULT')
+        layout_args = None
+    else:
+        log.info('No known profile found, extending the screen over all connected displays')
+
+    return _apply_profile(_get_xrandr(args, config), 'DEFAULT', config, args.dry_run,
+                          None if args.force else screen, layout_args)
+
+
+
+def import_profiles(args, config):
+    '''
+    Add the profiles of an rc file to the SQLite profile store given as
+    --config, replacing profiles with the same name
+    '''
+    from xprofile.store import SqliteStore
+
+    if not isinstance(config, SqliteStore):
+        log.error('Profiles can only be imported into a SQLite profile store, '
+                  'use --config to select one or a new file to create')
+        return 1
+
+    imported = profiles.load_config(os.path.abspath(args.rc))
+    config.import_config(imported)
+
+    log.info('Imported {0} profiles into {1}'.format(len(imported.sections()), args.config))
+
+    return 0
+
+
+
+def export_profiles(args, config):
+    '''
+    Print the profiles in the format of ~/.xprofilerc
+    '''
+    args.stdout.write(config.export())
+
+    return 0
+
+
+
+def run_daemon(args, config):
+    '''
+    Stay resident and automatically activate the matching profile each time
+    RandR reports that displays were connected or disconnected
+    '''
+    from copy import copy
+    from xprofile.daemon import Daemon
+
+    state = {'config': config, 'mtime': _get_mtime(args.config)}
+    display = args.display or os.environ.get('DISPLAY') or config.defaults().get('display')
+    xrandr = _get_xrandr(args, config, display=display)
+    single_flight = _get_single_flight(args, config, display)
+
+    def on_change(screen, edid):
+        mtime = _get_mtime(args.config)
+        if mtime != state['mtime']:
+            log.info('Reloading changed config file: {0}'.format(args.config))
+            state['config'], state['mtime'] = load_config(args.config, not args.no_cache), mtime
+
+        change = copy(args)
+        change.display, change.profile, change.force = display, None, False
+        activate = lambda: _activate_profile(change, state['config'], (screen, edid))
+
+        if single_flight is None:
+            activate()
+        else:
+            single_flight.run_exclusive(activate)
 
-    xrandr.call_xrandr(xrandr_args)
+        timings.write(command='daemon', display=display, profile=change.profile or 'DEFAULT')
 
-    if config.has_option(args.profile, 'exec_post'):
-        exec_post = config.get(args.profile, 'exec_post')
+    daemon = Daemon(on_change, display=display, settle=args.settle, xrandr=xrandr)
 
-        log.debug('Calling exec_post: {0}'.format(exec_post))
-        proc = Popen(split(exec_post), stdout=sys.stdout, stderr=sys.stderr)
-        proc.communicate()
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
 
     return 0
 
 
 
+def run_server(args, config):
+    '''
+    Stay resident and run the list, current, generate and activate
+    subcommands forwarded by `xprofile` over a UNIX socket
+    '''
+    import signal
+
+    from xprofile.client import socket_path
+    from xprofile.server import Server
+
+    display = args.display or os.environ.get('DISPLAY')
+    path = socket_path(display)
+
+    if not path:
+        log.error('The server needs $XDG_RUNTIME_DIR and $DISPLAY to be set')
+        return 1
+
+    server = Server(path)
+
+    try:
+        server.bind()
+    except RuntimeError as err:
+        log.error(str(err))
+        return 1
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        server.stop()
+
+    return 0
+
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+
+def load_config(path, cache=True):
+    '''
+    Read the profile configuration file, through the compiled cache in
+    $XDG_CACHE_HOME unless `cache` is False
+    '''
+    config = profiles.load_config(path, user_cache_dir() if cache else None)
+
+    log.debug('Read xrandr profile information from: {0}'.format(path))
+
+    if log.isEnabledFor(logging.DEBUG):
+        sections = config.sections()
+        log.debug('Found {0} known profiles: {1}'.format(len(sections), sections))
+
+    return config
+
+
+
 def parse_commandline_arguments(args=None):
     '''
     Add several subcommands, each with their own options and arguments.
@@ -177,28 +636,63 @@ def parse_commandline_arguments(args=None):
 
     parser.add_argument('--verbose', action='store_true', help='output more verbosely')
     parser.add_argument('--config',  default='~/.xprofilerc', help='config file to read profiles from')
+    parser.add_argument('--backend', default='xrandr', choices=['xrandr', 'native', 'auto'], help='how to query the X server (default: xrandr)')
+    parser.add_argument('--probe', default=None, choices=['auto', 'always'], help='re-probe all displays always or only when the cached state matches no profile (default: auto for list, current and generate)')
+    parser.add_argument('--display', action='append', default=None, help='X display to use instead of $DISPLAY, may be a glob like \':*\' and given multiple times for list, current and activate')
+    parser.add_argument('--screen', default=None, type=int, help='number of the X screen to use instead of the default screen of the display')
+    parser.add_argument('--jobs', default=8, type=int, help='number of displays to handle concurrently (default: 8)')
+    parser.add_argument('--timeout', default=None, type=float, help='kill xrandr calls running longer than this many seconds')
+    parser.add_argument('--retries', default=None, type=int, help='number of times to retry an xrandr call that timed out')
+    parser.add_argument('--timings', action='store_true', help='write the duration of each phase as a JSON line to stderr')
+    parser.add_argument('--timings-file', default=None, help='append the timings to this file instead of writing them to stderr')
+    parser.add_argument('--no-cache', action='store_true', help='don\'t read or write cached data')
+    parser.add_argument('--no-server', action='store_true', help='don\'t forward the command to a running xprofile server')
     parser.add_argument('--version', action='version', version='%(prog)s ' + __version__)
 
     subparsers = parser.add_subparsers(description='The following commands are available', dest='subcommand')
     subparsers.required = True
 
     parser_a = subparsers.add_parser('list', help="list all available xrandr profiles")
-    parser_a.set_defaults(func=list_all_profiles)
+    parser_a.add_argument('--monitors', action='store_true', help='show the monitors connected to the current profile, decoded from their EDID')
+    parser_a.set_defaults(func=list_all_profiles, default_probe='auto', fleet=True, serve=True)
 
     parser_b = subparsers.add_parser('current', help="get information about the current active profile")
-    parser_b.set_defaults(func=get_current_profile)
+    parser_b.add_argument('--monitors', action='store_true', help='show the connected monitors, decoded from their EDID, as comments')
+    parser_b.set_defaults(func=get_current_profile, default_probe='auto', fleet=True, serve=True)
 
     parser_c = subparsers.add_parser('generate', help="generate a new profile and print to stdout")
     parser_c.add_argument('--description', default=None, help='the description for the new profile')
     parser_c.add_argument('--profile', default=None, help='the name for the new profile')
-    parser_c.set_defaults(func=generate_profile)
+    parser_c.add_argument('--from', dest='dumps', default=None, help='generate a profile for each distinct screen in this directory or tarball of `xrandr --verbose` dumps, parsed on --jobs processes')
+    parser_c.add_argument('--database', default=None, help='with --from, store the profiles in this compiled profile database instead of printing them')
+    parser_c.set_defaults(func=generate_profile, default_probe='auto', serve=True)
 
     parser_d = subparsers.add_parser('activate', help="activate the given profile or automatically select one")
     parser_d.add_argument('--dry-run', action='store_true', help='don\'t activate the profile')
+    parser_d.add_argument('--force', action='store_true', help='pass all arguments of the profile to xrandr, even if it is already active')
+    parser_d.add_argument('--debounce', default=None, type=float, help='seconds without new activations to wait for before selecting a profile (default: 0)')
     parser_d.add_argument('profile', default=None, nargs='?', help='the profile to select')
-    parser_d.set_defaults(func=activate_profile)
+    parser_d.set_defaults(func=activate_profile, default_probe='always', fleet=True, serve=True)
+
+    parser_e = subparsers.add_parser('daemon', help="wait for display changes and activate the matching profile")
+    parser_e.add_argument('--dry-run', action='store_true', help='don\'t activate profiles')
+    parser_e.add_argument('--settle', default=0.5, type=float, help='seconds to wait for more events before acting')
+    parser_e.set_defaults(func=run_daemon, default_probe='always')
 
-    if args:
+    parser_f = subparsers.add_parser('server', help="serve the other subcommands from a resident process")
+    parser_f.set_defaults(func=run_server, default_probe='always')
+
+    parser_g = subparsers.add_parser('import', help="add the profiles of an rc file to the SQLite profile store given as --config")
+    parser_g.add_argument('rc', help='the rc file to import')
+    parser_g.set_defaults(func=import_profiles, default_probe='auto', create_store=True)
+
+    parser_h = subparsers.add_parser('export', help="print the profiles in the format of ~/.xprofilerc")
+    parser_h.set_defaults(func=export_profiles, default_probe='auto', serve=True)
+
+    parser_i = subparsers.add_parser('screens', help="list the X screens of the display and their connected outputs")
+    parser_i.set_defaults(func=list_screens, default_probe='auto', fleet=True)
+
+    if args is not None:
         parsed_args = parser.parse_args(args)
     else:
         parsed_args = parser.parse_args()
@@ -211,28 +705,85 @@ def main(args=None):
     '''
     Main entrypoint for this application
     '''
+    started = timings.clock()
+
     # Parse command line arguments
     args, parser = parse_commandline_arguments(args)
     args.config = os.path.abspath(os.path.expanduser(args.config))
+    args.probe = args.probe or args.default_probe
+
+    # Record the duration of each phase
+    timings_output = args.timings_file or ('-' if args.timings else timings.get_output())
+    if timings_output:
+        timings.enable(timings_output, started)
+
+    status = None
+
+    try:
+        status = _run(args, parser)
+        return status
+    finally:
+        # Hooks run concurrently and are only waited for before exiting
+        hooks.wait()
+        timings.write(command=args.subcommand, display=args.display, status=status)
+        timings.disable()
+
+
+
+def _run(args, parser):
 
     # Setup logging
     logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
                         format='%(levelname)s: %(message)s')
 
+    config = _load_config(args)
+
+    return _dispatch(args, parser, config)
+
+
+
+def _load_config(args):
+
     # Create a configuration file if it does not exist
-    if not os.path.exists(args.config):
+    if not os.path.exists(args.config) and getattr(args, 'create_store', False):
+        from xprofile.store import SqliteStore
+
+        log.warn('Creating profile store because it does not exist: {0}'.format(args.config))
+        SqliteStore(args.config).close()
+
+    elif not os.path.exists(args.config):
         log.warn('Creating config file because it does not exist: {0}'.format(args.config))
         with open(args.config, 'w') as file:
             file.write(DEFAULT_SECTION.format(display=os.environ.get('DISPLAY', ':0')))
 
     # Read profile configuration
-    config = ConfigParser()
-    config.read(args.config)
+    with timings.phase('config'):
+        config = load_config(args.config, cache=not args.no_cache)
+
+    return config
+
+
+
+def _dispatch(args, parser, config):
+    '''
+    Run the subcommand on one display or, if supported, on many
+    '''
+    args.stdout = sys.stdout
+    displays = args.display or []
+
+    if len(displays) <= 1 and not any(char in ''.join(displays) for char in '*?['):
+        args.display = displays[0] if displays else None
+        return args.func(args, config=config)
+
+    if not getattr(args, 'fleet', False):
+        parser.error('the {0} subcommand supports a single display only'.format(args.subcommand))
+
+    from xprofile import fleet
+
+    displays = fleet.expand_displays(displays)
+    results = fleet.run_on_displays(args.func, args, config, displays, args.jobs)
 
-    log.debug('Read xrandr profile information from: {0}'.format(args.config))
-    log.debug('Found {0} known profiles: {1}'.format(len(config.sections()),
-                                                   config.sections()))
-    return args.func(args, config=config)
+    return fleet.print_results(results, args.stdout)
 
 
 
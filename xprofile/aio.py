@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+'''
+An asyncio version of the Xrandr API (requires python 3.5 or newer)
+'''
+import asyncio
+import logging
+
+from io import BytesIO
+
+from xprofile.xrandr import Xrandr, XrandrTimeout, FIELDS, kill_process_group, parse_screen
+
+
+log = logging.getLogger(__name__)
+
+
+class AsyncXrandr(Xrandr):
+    '''
+    Same interface as Xrandr but `get_screen`, `get_screens`,
+    `get_screen_count`, `call_xrandr`, `run_xrandr` and `apply` are
+    coroutines. xrandr runs through
+    `asyncio.create_subprocess_exec` so many displays can be queried
+    concurrently on one event loop. When a call is cancelled or runs past
+    its timeout the xrandr process is killed.
+
+    The native backend is a blocking library call; it is run in the loop's
+    default executor.
+    '''
+    async def get_screen(self, fields=FIELDS, probe=True):
+        if self.backend == 'native':
+            return await self.get_screen_native(fields, probe)
+
+        if self.backend == 'auto':
+            try:
+                return await self.get_screen_native(fields, probe)
+            except (RuntimeError, OSError) as err:
+                log.debug('Native RandR backend failed, falling back to xrandr: {0}'.format(err))
+
+        return await self.get_screen_xrandr(fields, probe)
+
+    async def get_screen_count(self):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, Xrandr.get_screen_count, self)
+
+    async def get_screens(self, fields=FIELDS, probe=True, jobs=8):
+        '''
+        Query every X screen of the display, at most `jobs` of them at once
+        '''
+        from copy import copy
+
+        count = await self.get_screen_count()
+
+        if count == 1:
+            return [await self.get_screen(fields, probe)]
+
+        if self.backend != 'xrandr':
+            loop = asyncio.get_event_loop()
+            try:
+                return await loop.run_in_executor(None, Xrandr.get_screens_native, self, count, fields, probe)
+            except (RuntimeError, OSError) as err:
+                if self.backend == 'native':
+                    raise
+                log.debug('Native RandR backend failed, falling back to xrandr: {0}'.format(err))
+
+        semaphore = asyncio.Semaphore(max(1, jobs))
+
+        async def query(number):
+            xrandr = copy(self)
+            xrandr.backend, xrandr.screen = 'xrandr', number
+            async with semaphore:
+                return await xrandr.get_screen_xrandr(fields, probe)
+
+        return list(await asyncio.gather(*[query(number) for number in range(count)]))
+
+    async def get_screen_native(self, fields=FIELDS, probe=True):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, Xrandr.get_screen_native, self, fields, probe)
+
+    async def get_screen_xrandr(self, fields=FIELDS, probe=True):
+        args = ['--verbose'] if probe else ['--current', '--verbose']
+
+        return parse_screen(BytesIO(await self.run_xrandr(args)), fields)
+
+    async def apply(self, args):
+        log.debug('Calling xrandr: {0}'.format(' '.join(args)))
+        await self.call_xrandr(args)
+
+    async def call_xrandr(self, args=[]):
+        return (await self.run_xrandr(args)).decode().split('\n')
+
+    async def run_xrandr(self, args=[]):
+        attempts = self.retries + 1
+
+        for attempt in range(1, attempts + 1):
+            process = await asyncio.create_subprocess_exec(
+                *self.get_command(args), env=self.get_env(),
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                start_new_session=True)
+
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+                break
+            except asyncio.TimeoutError:
+                await self._kill(process)
+            except asyncio.CancelledError:
+                await self._kill(process)
+                raise
+
+            log.warn('xrandr did not finish within {0}s (attempt {1} of {2})'.format(
+                self.timeout, attempt, attempts))
+
+            if attempt == attempts:
+                message = 'xrandr timed out: {0}'.format(self.get_deadline_policy())
+                log.error(message)
+                raise XrandrTimeout(message)
+
+            await asyncio.sleep(self.get_backoff(attempt))
+
+        if process.returncode != 0:
+            message = 'xrandr error: {0}'.format(stderr.decode('utf-8', 'replace').strip())
+            log.error(message)
+            raise RuntimeError(message)
+
+        return stdout
+
+    async def _kill(self, process):
+        kill_process_group(process)
+        await process.wait()
+
+
+async def get_screens(displays, **kwargs):
+    '''
+    Query the screens of many displays concurrently. Returns a dict of
+    display name to either a Screen or the exception raised for it.
+    Keyword arguments are passed to AsyncXrandr.
+    '''
+    screens = await asyncio.gather(
+        *[AsyncXrandr(display=display, **kwargs).get_screen() for display in displays],
+        return_exceptions=True)
+
+    return dict(zip(displays, screens))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+'''
+Generate profiles from a directory or tarball of captured
+`xrandr --verbose` dumps, parsing them on a pool of worker processes
+'''
+import os
+import re
+import logging
+
+
+log = logging.getLogger(__name__)
+
+
+RE_UNSAFE = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def profile_name(path):
+    '''
+    Derive a profile name from the relative path of a dump
+    '''
+    stem = path[:-len('.txt')] if path.endswith('.txt') else path
+    return RE_UNSAFE.sub('-', stem.replace(os.sep, '-').replace('/', '-')).strip('-') or 'dump'
+
+
+def iter_dumps(path):
+    '''
+    Yield (relative path, contents) for each file in a directory, walked in
+    sorted order, or for each file member of a tarball
+    '''
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.startswith('.'):
+                    continue
+                with open(os.path.join(root, name), 'rb') as file:
+                    yield (os.path.relpath(os.path.join(root, name), path), file.read())
+        return
+
+    import tarfile
+
+    if not tarfile.is_tarfile(path):
+        raise RuntimeError('Not a directory or tarball of xrandr dumps: {0}'.format(path))
+
+    with tarfile.open(path) as archive:
+        for member in archive:
+            if member.isfile() and not os.path.basename(member.name).startswith('.'):
+                yield (member.name, archive.extractfile(member).read())
+
+
+def parse_dump(item):
+    '''
+    Parse one dump. Returns a tuple of the relative path, the edid hash,
+    the display fingerprints and the xrandr arguments, or of the path and
+    an error message when the dump holds no xrandr output. Only plain data
+    is returned, which is cheap to send back from a worker process.
+    '''
+    from io import BytesIO
+    from xprofile.xrandr import parse_screen
+
+    path, data = item
+
+    try:
+        screen = parse_screen(BytesIO(data))
+    except Exception as err:
+        return (path, 'cannot parse dump: {0}'.format(err))
+
+    if not screen.displays:
+        return (path, 'no outputs found')
+
+    return (path, screen.get_edid(), screen.get_fingerprints(), screen.get_xrandr_options())
+
+
+def parse_dumps(path, jobs=8):
+    '''
+    Parse all dumps found at path on up to `jobs` processes and return the
+    results of parse_dump, sorted by path
+    '''
+    items = iter_dumps(path)
+
+    if jobs <= 1:
+        return sorted(map(parse_dump, items))
+
+    from multiprocessing import Pool
+
+    pool = Pool(jobs)
+
+    try:
+        return sorted(pool.imap_unordered(parse_dump, items, 16))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def merge_profiles(results):
+    '''
+    Turn parsed dumps into profiles, one per edid. Dumps with the edid and
+    arguments of an earlier dump are dropped as duplicates; dumps with its
+    edid but other arguments are dropped as collisions.
+
+    Returns a tuple of the profiles, dicts with `profile`, `name`, `edid`,
+    `edids` and `args` keys, the errors of dumps that could not be parsed
+    and the collisions.
+    '''
+    profiles = []
+    errors = []
+    collisions = []
+    seen = {}
+    names = set()
+
+    for result in results:
+        if len(result) == 2:
+            errors.append('{0}: {1}'.format(*result))
+            continue
+
+        path, edid, fingerprints, options = result
+        args = ' '.join(options)
+
+        if edid in seen:
+            other = seen[edid]
+            if other['args'] == args:
+                log.debug('{0}: duplicate of {1}'.format(path, other['path']))
+            else:
+                collisions.append('{0}: edid {1} of {2} with other args, skipped'.format(
+                    path, edid, other['path']))
+            continue
+
+        name = profile_name(path)
+        unique, number = name, 1
+        while unique in names:
+            number += 1
+            unique = '{0}-{1}'.format(name, number)
+        names.add(unique)
+
+        seen[edid] = {
+            'path': path,
+            'profile': unique,
+            'name': '{0}\'s xrandr profile'.format(unique),
+            'edid': edid,
+            'edids': ' '.join(fingerprints),
+            'args': args,
+        }
+        profiles.append(seen[edid])
+
+    return (profiles, errors, collisions)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import os
+import logging
+
+
+log = logging.getLogger(__name__)
+
+
+def user_cache_dir(*parts):
+    '''
+    Return the xprofile directory in $XDG_CACHE_HOME (or ~/.cache)
+    '''
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'xprofile', *parts)
+
+
+def user_runtime_dir(*parts):
+    '''
+    Return the xprofile directory in $XDG_RUNTIME_DIR or None if it is not set
+    '''
+    base = os.environ.get('XDG_RUNTIME_DIR')
+
+    if not base:
+        return None
+
+    return os.path.join(base, 'xprofile', *parts)
+
+
+def atomic_write(path, data):
+    '''
+    Write bytes to path through a temporary file in the same directory
+    followed by a rename, so readers never see a partially written file
+    '''
+    import tempfile
+
+    directory = os.path.dirname(path)
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.rename(tmp, path)
+    except:
+        os.remove(tmp)
+        raise
+
+
+def read_file(path):
+    '''
+    Return the contents of path as bytes or None if it cannot be read
+    '''
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except (IOError, OSError):
+        return None
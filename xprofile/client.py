@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+'''
+The `xprofile` command. It forwards the command line to a resident
+`xprofile server` for the display when one is running and runs it in this
+process otherwise. Only what is needed to talk to the server is imported,
+so forwarded commands don't pay for loading xprofile and its config.
+'''
+import os
+import sys
+import json
+import errno
+import socket
+
+
+# Options that only make sense in this process
+LOCAL_OPTIONS = ('--no-server', '--timings', '--timings-file')
+
+# Seconds to wait for the server to take a command, and then for its answer
+TIMEOUT = 30.0
+
+# Sent by the server when it takes a connection, before the client sends
+# its command
+GREETING = b'\n'
+
+
+def socket_path(display=None):
+    '''
+    Return the location of the server socket for the display, or None when
+    $XDG_RUNTIME_DIR or the display is not set
+    '''
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    display = display or os.environ.get('DISPLAY')
+
+    if not runtime_dir or not display:
+        return None
+
+    name = ''.join(char if char.isalnum() or char in '.-' else '%{0:02x}'.format(ord(char))
+                   for char in display)
+
+    return os.path.join(runtime_dir, 'xprofile', 'server-{0}.sock'.format(name))
+
+
+def request(path, argv, timeout=TIMEOUT):
+    '''
+    Send a command line to the server listening on path and return its
+    response as a dict, or None when the server did not take the command:
+    none is listening, it did not greet within `timeout` seconds or the
+    command could not be sent. The command only runs on the server once it
+    has been sent, so from then on failures are raised as RuntimeError, also
+    when the server does not answer within `timeout` seconds.
+    '''
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+
+    try:
+        try:
+            client.connect(path)
+
+            if client.recv(len(GREETING)) != GREETING:
+                return None
+
+            client.sendall(json.dumps({'argv': argv, 'cwd': os.getcwd()}).encode('utf-8') + b'\n')
+            client.shutdown(socket.SHUT_WR)
+        except socket.timeout:
+            sys.stderr.write('WARNING: The xprofile server did not take the command within {0}s, '
+                             'running it without the server\n'.format(timeout))
+            return None
+        except socket.error as err:
+            if err.errno in (errno.ENOENT, errno.ECONNREFUSED, errno.ENOTSOCK,
+                             errno.EPIPE, errno.ECONNRESET):
+                return None
+            raise
+
+        chunks = []
+        while True:
+            try:
+                chunk = client.recv(65536)
+            except socket.timeout:
+                raise RuntimeError('The xprofile server did not answer within {0}s'.format(timeout))
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        client.close()
+
+    if not chunks:
+        raise RuntimeError('The xprofile server closed the connection without a response')
+
+    return json.loads(b''.join(chunks).decode('utf-8'))
+
+
+def forward(argv, path=None):
+    '''
+    Run the command line on the server and write its output. Returns the
+    exit status, or None when it has to run in this process instead.
+    '''
+    if any(arg.split('=', 1)[0] in LOCAL_OPTIONS for arg in argv) \
+            or os.environ.get('XPROFILE_TIMINGS') not in (None, '', '0'):
+        return None
+
+    path = path or socket_path()
+
+    if not path:
+        return None
+
+    try:
+        response = request(path, argv, TIMEOUT)
+    except (socket.error, RuntimeError, ValueError) as err:
+        sys.stderr.write('ERROR: Failed to talk to the xprofile server: {0}\n'.format(err))
+        return 1
+
+    if response is None or response.get('fallback'):
+        return None
+
+    sys.stdout.write(response.get('stdout', ''))
+    sys.stderr.write(response.get('stderr', ''))
+
+    return response.get('status', 1)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    status = forward(argv)
+
+    if status is None:
+        from xprofile.__main__ import main as run
+        status = run(argv)
+
+    return status
+
+
+if '__main__' == __name__:
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from select import select
+
+from xprofile.randr import RandrConnection
+from xprofile.xrandr import Xrandr
+
+
+log = logging.getLogger(__name__)
+
+
+class Daemon(object):
+    '''
+    Wait for RandR screen and output change notifications and call a
+    handler each time the set of connected displays (their EDIDs) changes.
+
+    The last known screen is kept in memory so events caused by our own
+    modesets (which do not change the EDIDs) do not trigger the handler
+    again.
+    '''
+    def __init__(self, handler, display=None, settle=0.5, xrandr=None):
+        self.handler = handler
+        self.display = display
+        self.settle = settle
+        self.xrandr = xrandr or Xrandr(display=display)
+        self.screen = None
+        self.edid = None
+        self.running = False
+
+    def refresh(self, force=False):
+        '''
+        Query the current screen and call the handler if the EDIDs changed.
+        Returns True if the handler was called.
+        '''
+        screen = self.xrandr.get_screen()
+        edid = screen.get_edid()
+
+        if not force and edid == self.edid:
+            log.debug('Connected displays did not change: {0}'.format(edid))
+            self.screen = screen
+            return False
+
+        log.debug('Connected displays changed: {0} -> {1}'.format(self.edid, edid))
+        self.screen, self.edid = screen, edid
+        self.handler(screen, edid)
+
+        return True
+
+    def wait_for_changes(self, connection, timeout=None):
+        '''
+        Block until RandR events arrive, then keep draining them until the
+        connection has been quiet for `settle` seconds. Returns the list of
+        events seen or an empty list on timeout.
+        '''
+        events = connection.read_events()
+
+        while not events:
+            readable, _, _ = select([connection], [], [], timeout)
+            if not readable:
+                return []
+            events = connection.read_events()
+
+        while True:
+            readable, _, _ = select([connection], [], [], self.settle)
+            if not readable:
+                break
+            events += connection.read_events()
+
+        return events
+
+    def run(self, connection=None):
+        '''
+        Run the event loop until `stop()` is called
+        '''
+        connection = connection or RandrConnection(self.display)
+        connection.select_changes()
+
+        self.running = True
+        self.refresh(force=True)
+
+        try:
+            while self.running:
+                events = self.wait_for_changes(connection, timeout=1)
+                if not events:
+                    continue
+
+                log.debug('Received RandR events: {0}'.format(', '.join(events)))
+                try:
+                    self.refresh()
+                except RuntimeError as err:
+                    log.error('Failed to handle screen change: {0}'.format(err))
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.running = False
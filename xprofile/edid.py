@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+'''
+Decode EDID blocks into the monitor they describe, with a cache of decoded
+records per edid fingerprint
+'''
+import os
+import json
+import struct
+import logging
+
+from xprofile.cache import atomic_write, read_file
+
+
+log = logging.getLogger(__name__)
+
+
+# Bump this whenever decode_edid returns different records
+DECODER_VERSION = 1
+
+HEADER = b'\x00\xff\xff\xff\xff\xff\xff\x00'
+BLOCK_SIZE = 128
+
+EXTENSIONS = {
+    0x02: 'CEA-861',
+    0x10: 'VTB',
+    0x40: 'DI',
+    0x50: 'LS',
+    0x60: 'DPVL',
+    0x70: 'DisplayID',
+    0xf0: 'block map',
+    0xff: 'manufacturer',
+}
+
+# IEEE OUIs of the vendor specific data blocks in a CEA-861 extension
+OUI_HDMI = 0x000c03
+OUI_HDMI_FORUM = 0xc45dd8
+
+# The decoded records of this process, by fingerprint
+_decoded = {}
+
+
+def edid_bytes(lines):
+    '''
+    Return the raw EDID of a display from its hex encoded lines
+    '''
+    import binascii
+
+    return binascii.unhexlify(b''.join(lines))
+
+
+def decode_timing(data):
+    '''
+    Decode an 18 byte detailed timing descriptor, None when it is a display
+    descriptor instead. The refresh rate is None when the totals are zero.
+    '''
+    data = bytearray(data)
+    clock = struct.unpack('<H', bytes(data[0:2]))[0]
+
+    if clock == 0:
+        return None
+
+    width = data[2] | (data[4] >> 4) << 8
+    hblank = data[3] | (data[4] & 0x0f) << 8
+    height = data[5] | (data[7] >> 4) << 8
+    vblank = data[6] | (data[7] & 0x0f) << 8
+    interlaced = bool(data[17] & 0x80)
+    total = (width + hblank) * (height + vblank)
+
+    return {
+        'width': width,
+        'height': height,
+        'clock': clock / 100.0,
+        'refresh': round(clock * 10000.0 / total, 2) if total else None,
+        'interlaced': interlaced,
+        'size': [data[12] | (data[14] >> 4) << 8, data[13] | (data[14] & 0x0f) << 8],
+    }
+
+
+def _descriptor_text(data):
+    return bytes(data[5:18]).split(b'\n')[0].decode('ascii', 'replace').strip()
+
+
+def decode_cea(block):
+    '''
+    Decode a CEA-861 extension block: its flags, the video codes of its
+    data block collection and its detailed timings
+    '''
+    block = bytearray(block)
+    offset = block[2]
+    record = {
+        'revision': block[1],
+        'underscan': bool(block[3] & 0x80),
+        'audio': bool(block[3] & 0x40),
+        'vics': [],
+        'hdmi': False,
+        'timings': [],
+    }
+
+    index = 4
+    while index < offset and index < BLOCK_SIZE:
+        tag, length = block[index] >> 5, block[index] & 0x1f
+        payload = block[index + 1:index + 1 + length]
+
+        if tag == 2:
+            record['vics'] += [code & 0x7f if code & 0x7f <= 64 else code for code in payload]
+        elif tag == 3 and length >= 3:
+            oui = payload[0] | payload[1] << 8 | payload[2] << 16
+            if oui in (OUI_HDMI, OUI_HDMI_FORUM):
+                record['hdmi'] = True
+
+        index += 1 + length
+
+    if offset >= 4:
+        for start in range(offset, BLOCK_SIZE - 18, 18):
+            timing = decode_timing(block[start:start + 18])
+            if timing is None:
+                break
+            record['timings'].append(timing)
+
+    return record
+
+
+def decode_edid(data):
+    '''
+    Decode a raw EDID into a dict with the manufacturer id, product code,
+    serial number, manufacture date, physical size in mm, the native (first
+    detailed) timing, the texts of the display descriptors and a list of
+    the extension blocks. CEA-861 extensions are decoded as well, others
+    only by type.
+
+    Raises a RuntimeError when data is no EDID.
+    '''
+    if len(data) < BLOCK_SIZE or data[:8] != HEADER:
+        raise RuntimeError('Not an EDID: {0} bytes without EDID header'.format(len(data)))
+
+    block = bytearray(data[:BLOCK_SIZE])
+
+    if sum(block) & 0xff:
+        log.debug('EDID checksum mismatch, decoding it anyway')
+
+    vendor = struct.unpack('>H', bytes(block[8:10]))[0]
+    product, serial = struct.unpack('<HI', bytes(block[10:16]))
+
+    record = {
+        'manufacturer': ''.join(chr(64 + (vendor >> shift & 0x1f)) for shift in (10, 5, 0)),
+        'product': product,
+        'serial': serial,
+        'week': block[16] if block[16] not in (0, 0xff) else None,
+        'year': 1990 + block[17],
+        'version': '{0}.{1}'.format(block[18], block[19]),
+        'digital': bool(block[20] & 0x80),
+        'size': [block[21] * 10, block[22] * 10],
+        'native': None,
+        'name': None,
+        'serial_text': None,
+        'text': None,
+        'extensions': [],
+    }
+
+    for start in range(54, 126, 18):
+        descriptor = block[start:start + 18]
+        timing = decode_timing(descriptor)
+
+        if timing is not None:
+            if record['native'] is None:
+                record['native'] = timing
+            continue
+
+        tag = descriptor[3]
+        if tag == 0xfc:
+            record['name'] = _descriptor_text(descriptor)
+        elif tag == 0xff:
+            record['serial_text'] = _descriptor_text(descriptor)
+        elif tag == 0xfe:
+            record['text'] = _descriptor_text(descriptor)
+
+    # The detailed timing gives the size in mm, the basic parameters in cm
+    if record['native'] and all(record['native']['size']):
+        record['size'] = record['native']['size']
+
+    for number in range(1, min(block[126], len(data) // BLOCK_SIZE - 1) + 1):
+        extension = bytearray(data[number * BLOCK_SIZE:(number + 1) * BLOCK_SIZE])
+        decoded = {'tag': extension[0], 'type': EXTENSIONS.get(extension[0], 'unknown')}
+
+        if extension[0] == 0x02:
+            decoded.update(decode_cea(extension))
+
+        record['extensions'].append(decoded)
+
+    return record
+
+
+def describe(record):
+    '''
+    Return a one line description of a decoded EDID, like
+    `DEL DELL U2412M 518x324mm 1920x1200@59.95`
+    '''
+    parts = [record['manufacturer'], record['name'] or '{0:04x}'.format(record['product'])]
+
+    if all(record['size']):
+        parts.append('{0}x{1}mm'.format(*record['size']))
+
+    if record['native'] and record['native']['refresh'] is not None:
+        parts.append('{width}x{height}@{refresh:.2f}'.format(**record['native']))
+    elif record['native']:
+        parts.append('{width}x{height}'.format(**record['native']))
+
+    return ' '.join(parts)
+
+
+def cache_path(fingerprint, cache_dir):
+    return os.path.join(cache_dir, 'edid', '{0}.json'.format(fingerprint))
+
+
+def get_edid_info(display, cache_dir=None):
+    '''
+    Return the decoded EDID of a display, None when it has none or it cannot
+    be decoded. Records are kept per fingerprint for the life of the process
+    and, when a cache_dir is given, on disk, so each monitor model is only
+    decoded once.
+    '''
+    fingerprint = display.get_fingerprint()
+
+    if fingerprint is None:
+        return None
+
+    if fingerprint in _decoded:
+        return _decoded[fingerprint]
+
+    path = cache_path(fingerprint, cache_dir) if cache_dir else None
+    payload = read_file(path) if path else None
+
+    if payload:
+        try:
+            cached = json.loads(payload.decode('utf-8'))
+        except ValueError:
+            cached = None
+
+        if cached and cached.get('version') == DECODER_VERSION:
+            _decoded[fingerprint] = cached['record']
+            return cached['record']
+
+    try:
+        record = decode_edid(edid_bytes(display.edid))
+    except (RuntimeError, TypeError, ValueError) as err:
+        log.warn('Cannot decode the EDID of {0}: {1}'.format(display.name, err))
+        return None
+
+    _decoded[fingerprint] = record
+
+    if path:
+        try:
+            atomic_write(path, json.dumps({
+                'version': DECODER_VERSION,
+                'record': record,
+            }, sort_keys=True).encode('utf-8'))
+        except (IOError, OSError) as err:
+            log.warn('Cannot write decoded EDID: {0}'.format(err))
+
+    return record
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+'''
+A stand in for the xrandr binary to test and load test xprofile without an
+X server. It is installed as `xprofile-fake-xrandr` and can be used with
+`Xrandr(xrandr_bin=...)`; the settings are read from the environment:
+
+XPROFILE_FAKE_DUMP
+    file with `xrandr --verbose` output to serve, instead of synthetic output
+XPROFILE_FAKE_OUTPUTS, XPROFILE_FAKE_CONNECTED, XPROFILE_FAKE_ACTIVE,
+XPROFILE_FAKE_MODES, XPROFILE_FAKE_SEED
+    parameters of the synthetic output (see `xprofile.synthetic.generate`)
+XPROFILE_FAKE_LATENCY
+    seconds to sleep before answering a query that probes the displays
+    (without `--current`)
+XPROFILE_FAKE_FAILURE_RATE
+    chance between 0 and 1 that a call fails like xrandr does when it cannot
+    open the display
+XPROFILE_FAKE_LOG
+    file to which every invocation is appended as a JSON line with its
+    argv, the DISPLAY and the time
+'''
+import os
+import sys
+import json
+import time
+import random
+
+
+PREFIX = 'XPROFILE_FAKE_'
+
+
+def _setting(name, default=None, type=str):
+    value = os.environ.get(PREFIX + name)
+    return default if value in (None, '') else type(value)
+
+
+def log_invocation(path, argv):
+    record = {
+        'argv': argv,
+        'display': os.environ.get('DISPLAY'),
+        'time': time.time(),
+        'pid': os.getpid(),
+    }
+
+    # A single write in append mode, so concurrent invocations don't interleave
+    with open(path, 'a') as file:
+        file.write(json.dumps(record) + '\n')
+
+
+def get_output():
+    '''
+    Return the `xrandr --verbose` output to serve as bytes
+    '''
+    dump = _setting('DUMP')
+
+    if dump:
+        with open(dump, 'rb') as file:
+            return file.read()
+
+    from xprofile.synthetic import generate
+
+    return generate(outputs=_setting('OUTPUTS', 4, int),
+                    connected=_setting('CONNECTED', None, int),
+                    active=_setting('ACTIVE', None, int),
+                    modes=_setting('MODES', 20, int),
+                    seed=_setting('SEED', 0, int))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if _setting('LOG'):
+        log_invocation(_setting('LOG'), argv)
+
+    if random.random() < _setting('FAILURE_RATE', 0.0, float):
+        sys.stderr.write("Can't open display {0}\n".format(os.environ.get('DISPLAY', '')))
+        return 1
+
+    if '--output' in argv or '--auto' in argv:
+        return 0
+
+    if '--current' not in argv:
+        time.sleep(_setting('LATENCY', 0.0, float))
+
+    output = get_output()
+    getattr(sys.stdout, 'buffer', sys.stdout).write(output)
+
+    return 0
+
+
+if '__main__' == __name__:
+    sys.exit(main())
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+'''
+Run subcommands against several X displays at once
+'''
+import os
+import copy
+import logging
+
+from fnmatch import fnmatch
+from io import StringIO
+
+
+log = logging.getLogger(__name__)
+
+
+X11_SOCKET_DIR = '/tmp/.X11-unix'
+
+
+def list_local_displays():
+    '''
+    Return the local displays that have a socket in /tmp/.X11-unix
+    '''
+    try:
+        names = os.listdir(X11_SOCKET_DIR)
+    except OSError:
+        return []
+
+    numbers = [name[1:] for name in names if name.startswith('X') and name[1:].isdigit()]
+
+    return [':' + number for number in sorted(numbers, key=int)]
+
+
+def expand_displays(patterns):
+    '''
+    Expand display names containing glob characters (like `:*`) to the
+    matching local displays. Duplicates are removed, order is preserved.
+    '''
+    displays = []
+    local = None
+
+    for pattern in patterns:
+        if any(char in pattern for char in '*?['):
+            if local is None:
+                local = list_local_displays()
+            matches = [display for display in local if fnmatch(display, pattern)]
+            if not matches:
+                log.warn('No displays found matching: {0}'.format(pattern))
+        else:
+            matches = [pattern]
+
+        displays += [display for display in matches if display not in displays]
+
+    return displays
+
+
+def run_on_display(func, args, config, display):
+    '''
+    Run a subcommand for a single display and capture its output. Any error
+    is logged and turned into a non zero exit status.
+    '''
+    args = copy.copy(args)
+    args.display = display
+    args.stdout = StringIO()
+
+    try:
+        status = func(args, config=config)
+    except Exception as err:
+        log.error('{0}: {1}'.format(display, err))
+        status = 1
+
+    return (display, status, args.stdout.getvalue())
+
+
+def run_on_displays(func, args, config, displays, jobs=8):
+    '''
+    Run a subcommand for each display on a bounded pool of worker threads.
+
+    Returns a list of (display, exit status, output) tuples in the order of
+    `displays`.
+    '''
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(max(1, min(jobs, len(displays))))
+
+    try:
+        return pool.map(lambda display: run_on_display(func, args, config, display), displays)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def print_results(results, stdout):
+    '''
+    Print the output of each display with the display name as prefix and
+    return the highest exit status
+    '''
+    for display, status, output in results:
+        for line in output.splitlines():
+            stdout.write(u'{0}: {1}\n'.format(display, line))
+
+    return max([status for display, status, output in results] or [0])
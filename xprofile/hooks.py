@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+'''
+Run the exec_post hooks of a profile concurrently, each with a timeout
+'''
+import os
+import time
+import logging
+import threading
+
+
+log = logging.getLogger(__name__)
+
+
+_pending = []
+_lock = threading.Lock()
+
+
+def parse_hooks(value):
+    '''
+    Split an exec_post value into a list of (argv, detach) tuples, one for
+    each non empty line. A line ending in `&` is a hook to detach.
+    '''
+    from shlex import split
+
+    hooks = []
+
+    for line in value.splitlines():
+        argv = split(line)
+
+        if not argv:
+            continue
+
+        detach = argv[-1] == '&'
+        if detach:
+            argv = argv[:-1]
+
+        if argv:
+            hooks.append((argv, detach))
+
+    return hooks
+
+
+class HookRun(object):
+    '''
+    A started hook. `status` is the exit status (None while running or when
+    killed after the timeout) and `duration` the seconds it ran. With a
+    `display` the hook runs with $DISPLAY set to it.
+    '''
+    def __init__(self, argv, detach=False, timeout=None, display=None):
+        self.argv = argv
+        self.detach = detach
+        self.timeout = timeout
+        self.display = display
+        self.status = None
+        self.duration = None
+        self.timed_out = False
+        self.process = None
+        self.thread = None
+
+    def get_env(self):
+        '''
+        Return the environment for the hook subprocess
+        '''
+        current_env = os.environ.copy()
+
+        if self.display:
+            current_env['DISPLAY'] = self.display
+
+        return current_env
+
+    def start(self):
+        from subprocess import Popen
+
+        log.debug('Calling exec_post: {0}'.format(' '.join(self.argv)))
+        self.started = time.time()
+
+        try:
+            if self.detach:
+                devnull = open(os.devnull, 'r+b')
+                try:
+                    self.process = Popen(self.argv, stdin=devnull, stdout=devnull,
+                                         stderr=devnull, close_fds=True,
+                                         preexec_fn=os.setsid, env=self.get_env())
+                finally:
+                    devnull.close()
+            else:
+                self.process = Popen(self.argv, env=self.get_env())
+        except OSError as err:
+            log.error('Cannot run exec_post {0}: {1}'.format(' '.join(self.argv), err))
+            self.status = 127
+            self.duration = 0.0
+            return self
+
+        # Detached hooks are only reaped, so they never keep xprofile alive
+        self.thread = threading.Thread(target=self._wait, name='exec_post')
+        self.thread.daemon = self.detach
+        self.thread.start()
+
+        return self
+
+    def _kill(self):
+        if self.process.poll() is None:
+            self.timed_out = True
+            self.process.kill()
+
+    def _wait(self):
+        from xprofile import timings
+
+        timer = None
+
+        # Popen.wait has no timeout on python 2
+        if self.timeout is not None and not self.detach:
+            timer = threading.Timer(self.timeout, self._kill)
+            timer.daemon = True
+            timer.start()
+
+        try:
+            self.process.wait()
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        self.duration = time.time() - self.started
+        self.status = None if self.timed_out else self.process.returncode
+
+        command = ' '.join(self.argv)
+
+        if self.detach:
+            log.debug('Detached exec_post {0} exited with {1} after {2:.2f}s'.format(
+                command, self.status, self.duration))
+        elif self.timed_out:
+            log.error('Killed exec_post {0} after {1}s'.format(command, self.timeout))
+        elif self.status:
+            log.warn('exec_post {0} exited with {1} after {2:.2f}s'.format(
+                command, self.status, self.duration))
+        else:
+            log.info('exec_post {0} finished after {1:.2f}s'.format(command, self.duration))
+
+        if not self.detach:
+            timings.record('exec_post', self.duration)
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return self.status
+
+
+def run_hooks(hooks, timeout=None, display=None):
+    '''
+    Start all hooks, given as (argv, detach) tuples, on the given display
+    without waiting for them. Hooks that are not detached are killed after
+    `timeout` seconds. Returns the list of started HookRun instances.
+    '''
+    runs = [HookRun(argv, detach, timeout, display).start() for argv, detach in hooks]
+
+    with _lock:
+        _pending[:] = [run for run in _pending if run.thread.is_alive()]
+        _pending.extend(run for run in runs if run.thread is not None and not run.detach)
+
+    return runs
+
+
+def wait():
+    '''
+    Wait for all hooks started by run_hooks that are not detached and
+    return them
+    '''
+    with _lock:
+        runs = list(_pending)
+        del _pending[:]
+
+    for run in runs:
+        run.wait()
+
+    return runs
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+'''
+Compute an extended layout for screens that match no profile, and cache
+it per edid hash
+'''
+import os
+import re
+import json
+import logging
+
+from xprofile import timings
+from xprofile.cache import atomic_write, read_file
+
+
+log = logging.getLogger(__name__)
+
+
+# Bump this whenever compute_layout places displays differently
+LAYOUT_VERSION = 2
+
+RE_DIGITS = re.compile(r'([0-9]+)')
+
+
+def _natural_key(name):
+    '''
+    Sort key putting DP-2 before DP-10
+    '''
+    return [int(part) if part.isdigit() else part for part in RE_DIGITS.split(name)]
+
+
+def compute_layout(screen):
+    '''
+    Return xrandr arguments placing all connected displays side by side,
+    top aligned, each at its best mode (see `Display.get_best_mode`).
+
+    Displays are ordered left to right by the hints the current state
+    gives: enabled displays keep their order by position, the others follow
+    in output name order. The primary display stays primary, otherwise the
+    leftmost one becomes primary. Displays without known modes are left out.
+    Outputs that are disconnected but still enabled, like after undocking,
+    are turned off.
+    '''
+    displays = []
+
+    for display in screen.displays:
+        if not display.connected:
+            continue
+
+        mode = display.get_best_mode()
+
+        if mode is None:
+            log.warn('No modes known for {0}, leaving it out of the layout'.format(display.name))
+            continue
+
+        if display.active:
+            hint = (0, display.geometry.x, display.geometry.y)
+        else:
+            hint = (1, 0, 0)
+
+        displays.append((hint + (_natural_key(display.name),), display, mode))
+
+    displays.sort(key=lambda item: item[0])
+
+    primary = [display for hint, display, mode in displays if display.primary and display.active]
+    primary = primary[0] if primary else (displays[0][1] if displays else None)
+
+    args = []
+    x = 0
+
+    for hint, display, mode in displays:
+        args += ['--output', display.name]
+
+        if display is primary:
+            args.append('--primary')
+
+        args += ['--mode', mode.dimension]
+
+        if mode.rate:
+            args += ['--rate', mode.rate]
+
+        args += ['--pos', '{0}x0'.format(x), '--rotate', 'normal']
+
+        x += int(mode.dimension.split('x')[0])
+
+    if args:
+        for display in screen.displays:
+            if display.active and not display.connected:
+                args += ['--output', display.name, '--off']
+
+    return args
+
+
+def layout_path(edid, cache_dir):
+    return os.path.join(cache_dir, 'layouts', 'layout-{0}.json'.format(edid))
+
+
+def get_layout(screen, edid, cache_dir=None):
+    '''
+    Return the layout for the screen, computed by compute_layout. When a
+    cache_dir is given it is stored there by edid hash, together with the
+    connected outputs and the disconnected ones still enabled, and reused
+    while those are the same.
+    '''
+    outputs = [display.name for display in screen.displays if display.connected]
+    ghosts = [display.name for display in screen.displays if display.active and not display.connected]
+    path = layout_path(edid, cache_dir) if cache_dir else None
+
+    with timings.phase('layout'):
+        payload = read_file(path) if path else None
+
+        if payload:
+            try:
+                cached = json.loads(payload.decode('utf-8'))
+            except ValueError:
+                cached = None
+
+            if cached and cached.get('version') == LAYOUT_VERSION and cached.get('outputs') == outputs \
+                    and cached.get('ghosts') == ghosts:
+                log.debug('Using cached layout for edid {0}'.format(edid))
+                return cached['args']
+
+        args = compute_layout(screen)
+
+    if path and args:
+        try:
+            atomic_write(path, json.dumps({
+                'version': LAYOUT_VERSION,
+                'outputs': outputs,
+                'ghosts': ghosts,
+                'args': args,
+            }).encode('utf-8'))
+        except (IOError, OSError) as err:
+            log.warn('Cannot write layout: {0}'.format(err))
+
+    return args
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+'''
+Serialize and coalesce activations of the same display across processes
+'''
+import os
+import re
+import time
+import errno
+import logging
+
+
+log = logging.getLogger(__name__)
+
+
+RE_UNSAFE = re.compile(r'[^A-Za-z0-9.-]')
+
+
+def get_lock_dir():
+    '''
+    Return the directory for lock files: $XDG_RUNTIME_DIR/xprofile or else
+    a private directory in /tmp. Raises OSError when the latter is not
+    owned by the current user.
+    '''
+    from xprofile.cache import user_runtime_dir
+
+    path = user_runtime_dir()
+
+    if path is None:
+        import tempfile
+        path = os.path.join(tempfile.gettempdir(), 'xprofile-{0}'.format(os.getuid()))
+
+    try:
+        os.makedirs(path, 0o700)
+    except OSError as err:
+        if err.errno != errno.EEXIST:
+            raise
+
+    if os.stat(path).st_uid != os.getuid():
+        raise OSError('Lock directory is not owned by the current user: {0}'.format(path))
+
+    return path
+
+
+class SingleFlight(object):
+    '''
+    Let one process at a time run an action, like activating a profile on
+    a display, and fold requests arriving meanwhile into that run.
+
+    Each request appends a byte to a requests file, so its size counts the
+    pending requests and its mtime is the time of the last one. Whoever
+    holds the lock runs the action once no request arrived for `debounce`
+    seconds, emptying the file first as that run serves all of them, and
+    runs it again when requests arrived while it was running; the others
+    return right away.
+    '''
+    def __init__(self, name, lock_dir):
+        path = os.path.join(lock_dir, RE_UNSAFE.sub('_', name))
+        self.lock_path = path + '.lock'
+        self.requests_path = path + '.requests'
+        self.fd = None
+
+    def request(self):
+        fd = os.open(self.requests_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, b'.')
+        finally:
+            os.close(fd)
+
+    def consume(self):
+        '''
+        Empty the requests file, only while holding the lock
+        '''
+        try:
+            fd = os.open(self.requests_path, os.O_WRONLY)
+        except OSError:
+            return
+
+        try:
+            os.ftruncate(fd, 0)
+        finally:
+            os.close(fd)
+
+    def get_generation(self):
+        try:
+            return os.stat(self.requests_path).st_size
+        except OSError:
+            return 0
+
+    def acquire(self, blocking=True):
+        import fcntl
+
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError) as err:
+            os.close(fd)
+            if err.errno in (errno.EAGAIN, errno.EACCES):
+                return False
+            raise
+
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def settle(self, debounce):
+        '''
+        Sleep until no request arrived for `debounce` seconds
+        '''
+        while debounce > 0:
+            try:
+                quiet = time.time() - os.stat(self.requests_path).st_mtime
+            except OSError:
+                return
+
+            if quiet >= debounce:
+                return
+
+            time.sleep(debounce - quiet)
+
+    def run(self, func, debounce=0.0):
+        '''
+        Request a run of func. Returns its result, or None when another
+        process is running it and takes over this request.
+        '''
+        self.request()
+
+        if not self.acquire(blocking=False):
+            log.info('An activation is already running, leaving this request to it')
+            return None
+
+        result = None
+
+        while True:
+            try:
+                while True:
+                    self.settle(debounce)
+                    self.consume()
+                    generation = self.get_generation()
+                    result = func()
+
+                    if self.get_generation() == generation:
+                        break
+
+                    log.info('More activations were requested meanwhile, running again')
+            finally:
+                self.release()
+
+            # A request may have arrived while releasing the lock; its
+            # process has given up, so run again unless another one took over
+            if self.get_generation() == generation or not self.acquire(blocking=False):
+                return result
+
+    def run_exclusive(self, func):
+        '''
+        Wait for the lock and run func once, without coalescing
+        '''
+        self.acquire(blocking=True)
+
+        try:
+            return func()
+        finally:
+            self.release()
@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import zlib
+import marshal
+import logging
+
+from xprofile.cache import atomic_write, read_file
+from xprofile.hooks import parse_hooks
+
+
+log = logging.getLogger(__name__)
+
+
+# Bump this whenever the layout of the compiled data changes
+CACHE_VERSION = 3
+
+# Prefix of a compiled profile database, see write_database
+DATABASE_MAGIC = b'xprofile-database\n'
+
+# The first bytes of a SQLite database, which is opened as a SqliteStore
+SQLITE_MAGIC = b'SQLite format 3\x00'
+
+# Options are exported in this order, followed by the others sorted by name
+EXPORT_ORDER = ['name', 'edid', 'edids', 'args']
+
+# Minimum overlap (Jaccard index) between the display fingerprints of the
+# current screen and of a profile for the profile to be selected
+MATCH_THRESHOLD = 0.5
+
+
+def _configparser():
+    try:
+        import ConfigParser as configparser
+    except ImportError:
+        import configparser
+    return configparser
+
+
+def rank_overlap(overlap, count, displays):
+    '''
+    Turn a dict of profile to the number of displays it shares with a
+    screen of `count` displays into a list of (score, profile) tuples, best
+    first. The score is the Jaccard index, `displays` maps each profile to
+    its number of displays.
+    '''
+    ranking = [(float(shared) / (count + displays[profile] - shared), profile)
+               for profile, shared in overlap.items()]
+
+    return sorted(ranking, key=lambda item: (-item[0], item[1]))
+
+
+class EdidIndex(object):
+    '''
+    Map the edid hash of each profile to the profile name.
+
+    When several profiles share an edid the first one wins, just like the
+    linear search through the config did. The others are collected in
+    `duplicates` so they can be reported.
+
+    Profiles can also list the fingerprints of their individual displays in
+    an `edids` option. These are kept in an inverted index from fingerprint
+    to profiles, so a screen that matches no edid exactly can still be
+    matched to the profile sharing most of its displays.
+    '''
+    def __init__(self, config=None):
+        self.profiles = {}
+        self.duplicates = {}
+        self.fingerprints = {}
+        self.displays = {}
+
+        if config is None:
+            return
+
+        for profile in config.sections():
+            if config.has_option(profile, 'edids'):
+                fingerprints = set(config.get(profile, 'edids', raw=True).split())
+                self.displays[profile] = len(fingerprints)
+
+                for fingerprint in fingerprints:
+                    self.fingerprints.setdefault(fingerprint, []).append(profile)
+
+            if not config.has_option(profile, 'edid'):
+                log.debug('Profile `{0}` has no edid'.format(profile))
+                continue
+
+            edid = config.get(profile, 'edid', raw=True)
+
+            if edid in self.profiles:
+                self.duplicates.setdefault(edid, [self.profiles[edid]]).append(profile)
+                continue
+
+            self.profiles[edid] = profile
+
+        self.report()
+
+    @classmethod
+    def from_dict(cls, profiles, duplicates, fingerprints=None, displays=None):
+        index = cls()
+        index.profiles = profiles
+        index.duplicates = duplicates
+        index.fingerprints = fingerprints or {}
+        index.displays = displays or {}
+        return index
+
+    def report(self):
+        for edid, profiles in self.duplicates.items():
+            log.warn('Profiles {0} have the same edid {1}, only `{2}` will be used'.format(
+                ', '.join(profiles), edid, profiles[0]))
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def __contains__(self, edid):
+        return edid in self.profiles
+
+    def get(self, edid, default=None):
+        return self.profiles.get(edid, default)
+
+    def rank(self, fingerprints):
+        '''
+        Rank the profiles sharing at least one display fingerprint with the
+        given ones by their overlap (the Jaccard index of both sets of
+        fingerprints). Returns a list of (score, profile) tuples, best first;
+        ties are ordered by profile name.
+        '''
+        current = set(fingerprints)
+        overlap = {}
+
+        for fingerprint in current:
+            for profile in self.fingerprints.get(fingerprint, ()):
+                overlap[profile] = overlap.get(profile, 0) + 1
+
+        return rank_overlap(overlap, len(current), self.displays)
+
+    def match(self, fingerprints, threshold=MATCH_THRESHOLD):
+        '''
+        Return the best ranked profile for the given display fingerprints if
+        its score reaches the threshold, else None
+        '''
+        ranking = self.rank(fingerprints)
+
+        if ranking and ranking[0][0] >= threshold:
+            return ranking[0][1]
+
+        return None
+
+
+class ProfileStore(object):
+    '''
+    The interface of the `config` object the subcommands are given: the part
+    of the ConfigParser interface they use (values are interpolated when the
+    profiles are stored, so `raw` has no effect) plus profile lookups.
+
+    Subclasses implement `sections`, `defaults` and `_options`, returning
+    the options of a section including those inherited from DEFAULT, and
+    usually `find_profile` and `match_profile` with an index.
+    '''
+    def sections(self):
+        raise NotImplementedError
+
+    def defaults(self):
+        raise NotImplementedError
+
+    def _options(self, section):
+        raise NotImplementedError
+
+    def has_section(self, section):
+        return section in self.sections()
+
+    def has_option(self, section, option):
+        return option in self._options(section)
+
+    def get(self, section, option, raw=False):
+        options = self._options(section)
+
+        if option not in options:
+            raise _configparser().NoOptionError(option, section)
+
+        return options[option]
+
+    def find_profile(self, edid):
+        '''
+        Return the name of the profile with the given edid or None
+        '''
+        return EdidIndex(self).get(edid)
+
+    def match_profile(self, fingerprints):
+        '''
+        Return the name of the profile best matching the given display
+        fingerprints or None
+        '''
+        return EdidIndex(self).match(fingerprints)
+
+    def get_args(self, profile):
+        '''
+        Return the xrandr arguments of a profile as a list
+        '''
+        from shlex import split
+
+        options = self._options(profile)
+        return split(options['args']) if 'args' in options else []
+
+    def get_hooks(self, profile):
+        '''
+        Return the exec_post hooks of a profile, or those of DEFAULT when it
+        has none of its own, as a list of (argv, detach) tuples
+        '''
+        options = self._options(profile)
+        return parse_hooks(options['exec_post']) if 'exec_post' in options else []
+
+    def own_options(self, section):
+        '''
+        Return the options of a section that are not inherited from DEFAULT
+        '''
+        defaults = self.defaults()
+
+        if section == 'DEFAULT':
+            return dict(defaults)
+
+        return dict((option, value) for option, value in self._options(section).items()
+                    if defaults.get(option) != value)
+
+    def export(self):
+        '''
+        Return the profiles in the format of ~/.xprofilerc
+        '''
+        blocks = []
+
+        for section in ['DEFAULT'] + self.sections():
+            options = self.own_options(section)
+
+            if section == 'DEFAULT' and not options:
+                continue
+
+            lines = ['[{0}]'.format(section)]
+            ordered = [option for option in EXPORT_ORDER if option in options]
+            ordered += sorted(option for option in options if option not in EXPORT_ORDER)
+
+            for option in ordered:
+                value = options[option].replace('%', '%%').replace('\n', '\n    ')
+                lines.append('{0} = {1}'.format(option, value))
+            blocks.append('\n'.join(lines))
+
+        return '\n\n'.join(blocks) + '\n'
+
+
+class CompiledConfig(ProfileStore):
+    '''
+    A read-only, pre-processed version of ~/.xprofilerc.
+
+    Besides the ProfileStore interface it holds the edid index and
+    pre-split xrandr arguments and exec_post hooks. All data is kept in
+    plain dicts and lists so it can be stored with marshal.
+    '''
+    def __init__(self, data):
+        self.data = data
+        self.edid_index = EdidIndex.from_dict(data['edids'], data['duplicates'],
+                                              data['fingerprints'], data['displays'])
+
+    @classmethod
+    def compile(cls, config, key=None):
+        '''
+        Compile a ConfigParser instance
+        '''
+        from shlex import split
+
+        InterpolationError = _configparser().InterpolationError
+
+        def items(section):
+            try:
+                return dict(config.items(section))
+            except InterpolationError:
+                return dict(config.items(section, raw=True))
+
+        sections = config.sections()
+        options = dict((section, items(section)) for section in sections)
+        defaults = dict(config.defaults())
+        index = EdidIndex(config)
+
+        data = {
+            'version': CACHE_VERSION,
+            'key': key,
+            'defaults': defaults,
+            'sections': sections,
+            'options': options,
+            'edids': index.profiles,
+            'duplicates': index.duplicates,
+            'fingerprints': index.fingerprints,
+            'displays': index.displays,
+            'argv': {},
+            'hooks': {},
+        }
+
+        for section, values in list(options.items()) + [('DEFAULT', defaults)]:
+            if 'args' in values:
+                data['argv'][section] = split(values['args'])
+
+            # Sections inherit exec_post from DEFAULT, only keep their own
+            own = section == 'DEFAULT' or values.get('exec_post') != defaults.get('exec_post')
+            if 'exec_post' in values and own:
+                data['hooks'][section] = parse_hooks(values['exec_post'])
+
+        return cls(data)
+
+    def dumps(self):
+        return marshal.dumps(self.data)
+
+    @classmethod
+    def loads(cls, payload):
+        return cls(marshal.loads(payload))
+
+    def sections(self):
+        return list(self.data['sections'])
+
+    def defaults(self):
+        return self.data['defaults']
+
+    def has_section(self, section):
+        return section in self.data['options']
+
+    def _options(self, section):
+        if section == 'DEFAULT':
+            return self.data['defaults']
+
+        if section not in self.data['options']:
+            raise _configparser().NoSectionError(section)
+
+        return self.data['options'][section]
+
+    def find_profile(self, edid):
+        return self.edid_index.get(edid)
+
+    def match_profile(self, fingerprints):
+        return self.edid_index.match(fingerprints)
+
+    def get_args(self, profile):
+        self._options(profile)
+        return list(self.data['argv'].get(profile, []))
+
+    def get_hooks(self, profile):
+        self._options(profile)
+        hooks = self.data['hooks'].get(profile)
+
+        # A profile's own exec_post overrides the one of DEFAULT
+        if hooks is None:
+            hooks = self.data['hooks'].get('DEFAULT', [])
+
+        return [tuple(hook) for hook in hooks]
+
+
+def _cache_key(path):
+    stat = os.stat(path)
+    return [path, stat.st_mtime, stat.st_size, stat.st_ino]
+
+
+def cache_path(path, cache_dir):
+    '''
+    Return the location of the compiled cache for the given rc file
+    '''
+    name = 'config-{0:08x}-py{1}{2}.marshal'.format(
+        zlib.crc32(path.encode()) & 0xffffffff, *sys.version_info[:2])
+    return os.path.join(cache_dir, name)
+
+
+def load_config(path, cache_dir=None):
+    '''
+    Load the profiles from the rc file at path, which may also be a
+    profile database or a SQLite profile store.
+
+    When a cache_dir is given the compiled config is stored there and reused
+    as long as the path, mtime, size and inode of the rc file are unchanged,
+    so ConfigParser is skipped entirely.
+    '''
+    key = _cache_key(path)
+
+    if cache_dir:
+        compiled_path = cache_path(path, cache_dir)
+        payload = read_file(compiled_path)
+
+        if payload:
+            try:
+                config = CompiledConfig.loads(payload)
+            except (ValueError, EOFError, TypeError, KeyError):
+                config = None
+
+            if config and config.data['version'] == CACHE_VERSION and config.data['key'] == key:
+                log.debug('Loaded compiled config from: {0}'.format(compiled_path))
+                config.edid_index.report()
+                return config
+
+    with open(path, 'rb') as file:
+        header = file.read(max(len(SQLITE_MAGIC), len(DATABASE_MAGIC)))
+
+    if header.startswith(SQLITE_MAGIC):
+        from xprofile.store import SqliteStore
+        log.debug('Opening profile store: {0}'.format(path))
+        return SqliteStore(path)
+
+    if header.startswith(DATABASE_MAGIC):
+        return load_database(path, read_file(path))
+
+    parser = _configparser().ConfigParser()
+    parser.read(path)
+    config = CompiledConfig.compile(parser, key)
+
+    if cache_dir:
+        try:
+            atomic_write(compiled_path, config.dumps())
+            log.debug('Wrote compiled config to: {0}'.format(compiled_path))
+        except (IOError, OSError) as err:
+            log.warn('Cannot write compiled config: {0}'.format(err))
+
+    return config
+
+
+def write_database(path, rc):
+    '''
+    Compile the profiles in the rc text and store them at path as a
+    profile database, which load_config reads like an rc file. Like the
+    compiled cache it is tied to the python version that wrote it.
+    '''
+    from io import StringIO
+
+    parser = _configparser().ConfigParser()
+
+    if hasattr(parser, 'read_string'):
+        parser.read_string(rc)
+    else:
+        parser.readfp(StringIO(rc))
+
+    atomic_write(os.path.abspath(path), DATABASE_MAGIC + CompiledConfig.compile(parser).dumps())
+
+
+def load_database(path, payload):
+    try:
+        config = CompiledConfig.loads(payload[len(DATABASE_MAGIC):])
+    except (ValueError, EOFError, TypeError, KeyError):
+        config = None
+
+    if config is None or config.data['version'] != CACHE_VERSION:
+        raise RuntimeError('Profile database {0} was written by another version of '
+                           'xprofile or python, generate it again'.format(path))
+
+    log.debug('Loaded profile database: {0}'.format(path))
+    config.edid_index.report()
+
+    return config
@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+'''
+Minimal ctypes bindings for libX11 and libXrandr
+
+Only the small subset of the RandR protocol needed by xprofile is wrapped
+here. The shared libraries are loaded on first use so importing this module
+is cheap and works on systems without X11 libraries installed.
+'''
+import ctypes
+import logging
+import binascii
+
+from ctypes.util import find_library
+
+
+log = logging.getLogger(__name__)
+
+
+RRScreenChangeNotify = 0
+RRNotify = 1
+
+RRNotify_CrtcChange = 0
+RRNotify_OutputChange = 1
+RRNotify_OutputProperty = 2
+
+RR_Connected = 0
+RR_Disconnected = 1
+RR_UnknownConnection = 2
+
+RR_Interlace = 0x10
+RR_DoubleScan = 0x20
+
+RR_Rotate_0 = 1
+RR_Rotate_90 = 2
+RR_Rotate_180 = 4
+RR_Rotate_270 = 8
+
+AnyPropertyType = 0
+
+# Same amount of EDID data `xrandr --verbose` requests (in 32 bit units)
+EDID_LENGTH = 100
+
+CONNECTION_STATUS = {
+    RR_Connected: 'connected',
+    RR_Disconnected: 'disconnected',
+    RR_UnknownConnection: 'unknown connection',
+}
+
+ROTATIONS = {
+    RR_Rotate_0: None,
+    RR_Rotate_90: 'left',
+    RR_Rotate_180: 'inverted',
+    RR_Rotate_270: 'right',
+}
+
+RRScreenChangeNotifyMask = 1 << 0
+RRCrtcChangeNotifyMask = 1 << 1
+RROutputChangeNotifyMask = 1 << 2
+RROutputPropertyNotifyMask = 1 << 3
+
+
+class XEvent(ctypes.Union):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('pad', ctypes.c_long * 24),
+    ]
+
+
+class XRRNotifyEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('serial', ctypes.c_ulong),
+        ('send_event', ctypes.c_int),
+        ('display', ctypes.c_void_p),
+        ('window', ctypes.c_ulong),
+        ('subtype', ctypes.c_int),
+    ]
+
+
+class XRRModeInfo(ctypes.Structure):
+    _fields_ = [
+        ('id', ctypes.c_ulong),
+        ('width', ctypes.c_uint),
+        ('height', ctypes.c_uint),
+        ('dotClock', ctypes.c_ulong),
+        ('hSyncStart', ctypes.c_uint),
+        ('hSyncEnd', ctypes.c_uint),
+        ('hTotal', ctypes.c_uint),
+        ('hSkew', ctypes.c_uint),
+        ('vSyncStart', ctypes.c_uint),
+        ('vSyncEnd', ctypes.c_uint),
+        ('vTotal', ctypes.c_uint),
+        ('name', ctypes.c_char_p),
+        ('nameLength', ctypes.c_uint),
+        ('modeFlags', ctypes.c_ulong),
+    ]
+
+
+class XRRScreenResources(ctypes.Structure):
+    _fields_ = [
+        ('timestamp', ctypes.c_ulong),
+        ('configTimestamp', ctypes.c_ulong),
+        ('ncrtc', ctypes.c_int),
+        ('crtcs', ctypes.POINTER(ctypes.c_ulong)),
+        ('noutput', ctypes.c_int),
+        ('outputs', ctypes.POINTER(ctypes.c_ulong)),
+        ('nmode', ctypes.c_int),
+        ('modes', ctypes.POINTER(XRRModeInfo)),
+    ]
+
+
+class XRROutputInfo(ctypes.Structure):
+    _fields_ = [
+        ('timestamp', ctypes.c_ulong),
+        ('crtc', ctypes.c_ulong),
+        ('name', ctypes.c_char_p),
+        ('nameLen', ctypes.c_int),
+        ('mm_width', ctypes.c_ulong),
+        ('mm_height', ctypes.c_ulong),
+        ('connection', ctypes.c_ushort),
+        ('subpixel_order', ctypes.c_ushort),
+        ('ncrtc', ctypes.c_int),
+        ('crtcs', ctypes.POINTER(ctypes.c_ulong)),
+        ('nclone', ctypes.c_int),
+        ('clones', ctypes.POINTER(ctypes.c_ulong)),
+        ('nmode', ctypes.c_int),
+        ('npreferred', ctypes.c_int),
+        ('modes', ctypes.POINTER(ctypes.c_ulong)),
+    ]
+
+
+class XRRCrtcInfo(ctypes.Structure):
+    _fields_ = [
+        ('timestamp', ctypes.c_ulong),
+        ('x', ctypes.c_int),
+        ('y', ctypes.c_int),
+        ('width', ctypes.c_uint),
+        ('height', ctypes.c_uint),
+        ('mode', ctypes.c_ulong),
+        ('rotation', ctypes.c_ushort),
+        ('noutput', ctypes.c_int),
+        ('outputs', ctypes.POINTER(ctypes.c_ulong)),
+        ('rotations', ctypes.c_ushort),
+        ('npossible', ctypes.c_int),
+        ('possible', ctypes.POINTER(ctypes.c_ulong)),
+    ]
+
+
+_libs = {}
+
+
+def _load(name):
+    '''
+    Load (and memoize) a shared library by its short name
+    '''
+    if name not in _libs:
+        path = find_library(name)
+        if not path:
+            raise RuntimeError('lib{0} not found'.format(name))
+        _libs[name] = ctypes.CDLL(path)
+    return _libs[name]
+
+
+def get_libraries():
+    '''
+    Return a tuple of (libX11, libXrandr) with function signatures set up
+    '''
+    xlib = _load('X11')
+    xrandr = _load('Xrandr')
+
+    if not getattr(xrandr, '_xprofile_prototypes', False):
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        xlib.XScreenCount.argtypes = [ctypes.c_void_p]
+        xlib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XConnectionNumber.argtypes = [ctypes.c_void_p]
+        xlib.XPending.argtypes = [ctypes.c_void_p]
+        xlib.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.POINTER(XEvent)]
+        xlib.XFlush.argtypes = [ctypes.c_void_p]
+        xlib.XFree.argtypes = [ctypes.c_void_p]
+
+        xrandr.XRRQueryExtension.argtypes = [ctypes.c_void_p,
+                                             ctypes.POINTER(ctypes.c_int),
+                                             ctypes.POINTER(ctypes.c_int)]
+        xrandr.XRRSelectInput.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                          ctypes.c_int]
+        xrandr.XRRUpdateConfiguration.argtypes = [ctypes.POINTER(XEvent)]
+
+        xlib.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        xlib.XInternAtom.restype = ctypes.c_ulong
+
+        xrandr.XRRGetScreenSizeRange.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                                 ctypes.POINTER(ctypes.c_int),
+                                                 ctypes.POINTER(ctypes.c_int),
+                                                 ctypes.POINTER(ctypes.c_int),
+                                                 ctypes.POINTER(ctypes.c_int)]
+        xrandr.XRRGetScreenResources.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        xrandr.XRRGetScreenResources.restype = ctypes.POINTER(XRRScreenResources)
+        xrandr.XRRGetScreenResourcesCurrent.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        xrandr.XRRGetScreenResourcesCurrent.restype = ctypes.POINTER(XRRScreenResources)
+        xrandr.XRRFreeScreenResources.argtypes = [ctypes.POINTER(XRRScreenResources)]
+        xrandr.XRRGetOutputInfo.argtypes = [ctypes.c_void_p,
+                                            ctypes.POINTER(XRRScreenResources),
+                                            ctypes.c_ulong]
+        xrandr.XRRGetOutputInfo.restype = ctypes.POINTER(XRROutputInfo)
+        xrandr.XRRFreeOutputInfo.argtypes = [ctypes.POINTER(XRROutputInfo)]
+        xrandr.XRRGetCrtcInfo.argtypes = [ctypes.c_void_p,
+                                          ctypes.POINTER(XRRScreenResources),
+                                          ctypes.c_ulong]
+        xrandr.XRRGetCrtcInfo.restype = ctypes.POINTER(XRRCrtcInfo)
+        xrandr.XRRFreeCrtcInfo.argtypes = [ctypes.POINTER(XRRCrtcInfo)]
+        xrandr.XRRGetOutputPrimary.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        xrandr.XRRGetOutputPrimary.restype = ctypes.c_ulong
+        xrandr.XRRGetOutputProperty.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong,
+            ctypes.c_long, ctypes.c_long, ctypes.c_int, ctypes.c_int,
+            ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.POINTER(ctypes.c_ubyte))]
+        xrandr._xprofile_prototypes = True
+
+    return xlib, xrandr
+
+
+def is_available():
+    '''
+    Check if libX11 and libXrandr can be loaded
+    '''
+    try:
+        get_libraries()
+    except (RuntimeError, OSError, AttributeError):
+        return False
+    return True
+
+
+def get_refresh(info):
+    '''
+    Return the vertical refresh rate of an XRRModeInfo in Hz, computed like
+    xrandr does, or None
+    '''
+    lines = info.vTotal * (2 if info.modeFlags & RR_DoubleScan else 1)
+
+    if info.modeFlags & RR_Interlace:
+        lines /= 2.0
+
+    if not info.hTotal or not lines:
+        return None
+
+    return round(float(info.dotClock) / (info.hTotal * lines), 2)
+
+
+class RandrConnection(object):
+    '''
+    A connection to an X server with the RandR extension, for the given X
+    screen or the default screen of the display
+    '''
+    def __init__(self, display=None, screen=None):
+        self.xlib, self.xrandr = get_libraries()
+        self.display = display
+
+        name = display.encode() if display else None
+        self.dpy = self.xlib.XOpenDisplay(name)
+
+        if not self.dpy:
+            raise RuntimeError('Cannot open display: {0}'.format(display))
+
+        event_base = ctypes.c_int()
+        error_base = ctypes.c_int()
+
+        if not self.xrandr.XRRQueryExtension(self.dpy, ctypes.byref(event_base),
+                                             ctypes.byref(error_base)):
+            self.close()
+            raise RuntimeError('RandR extension missing on display: {0}'.format(display))
+
+        self.event_base = event_base.value
+
+        try:
+            self.screen = self.xlib.XDefaultScreen(self.dpy) if screen is None else self.check_screen(screen)
+        except RuntimeError:
+            self.close()
+            raise
+
+        self.root = self.xlib.XRootWindow(self.dpy, self.screen)
+
+    def fileno(self):
+        return self.xlib.XConnectionNumber(self.dpy)
+
+    def close(self):
+        if self.dpy:
+            self.xlib.XCloseDisplay(self.dpy)
+            self.dpy = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def select_changes(self):
+        '''
+        Subscribe to screen and output change notifications on the root window
+        '''
+        self.xrandr.XRRSelectInput(self.dpy, self.root,
+                                   RRScreenChangeNotifyMask |
+                                   RROutputChangeNotifyMask)
+        self.xlib.XFlush(self.dpy)
+
+    def pending(self):
+        return self.xlib.XPending(self.dpy)
+
+    def read_events(self):
+        '''
+        Drain all queued events and return a list of the RandR events found
+        as strings: `screen`, `output`, `crtc` or `property`
+        '''
+        subtypes = {
+            RRNotify_CrtcChange: 'crtc',
+            RRNotify_OutputChange: 'output',
+            RRNotify_OutputProperty: 'property',
+        }
+        found = []
+        event = XEvent()
+
+        while self.xlib.XPending(self.dpy):
+            self.xlib.XNextEvent(self.dpy, ctypes.byref(event))
+
+            if event.type == self.event_base + RRScreenChangeNotify:
+                self.xrandr.XRRUpdateConfiguration(ctypes.byref(event))
+                found.append('screen')
+            elif event.type == self.event_base + RRNotify:
+                notify = ctypes.cast(ctypes.byref(event),
+                                     ctypes.POINTER(XRRNotifyEvent)).contents
+                found.append(subtypes.get(notify.subtype, 'unknown'))
+
+        return found
+
+    def get_edid(self, output):
+        '''
+        Read the raw EDID property of an output as bytes
+        '''
+        atom = self.xlib.XInternAtom(self.dpy, b'EDID', True)
+        if not atom:
+            return b''
+
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        nitems = ctypes.c_ulong()
+        bytes_after = ctypes.c_ulong()
+        prop = ctypes.POINTER(ctypes.c_ubyte)()
+
+        self.xrandr.XRRGetOutputProperty(self.dpy, output, atom, 0, EDID_LENGTH,
+                                         False, False, AnyPropertyType,
+                                         ctypes.byref(actual_type),
+                                         ctypes.byref(actual_format),
+                                         ctypes.byref(nitems),
+                                         ctypes.byref(bytes_after),
+                                         ctypes.byref(prop))
+        try:
+            if actual_format.value != 8 or not prop:
+                return b''
+            return ctypes.string_at(prop, nitems.value)
+        finally:
+            if prop:
+                self.xlib.XFree(prop)
+
+    def get_screen_count(self):
+        return self.xlib.XScreenCount(self.dpy)
+
+    def check_screen(self, number):
+        if not 0 <= number < self.get_screen_count():
+            raise RuntimeError('No screen {0} on display: {1}'.format(number, self.display))
+        return number
+
+    def get_screen_size(self, number, root):
+        '''
+        Return the minimum, current and maximum size of an X screen
+        '''
+        sizes = [ctypes.c_int() for _ in range(4)]
+
+        self.xrandr.XRRGetScreenSizeRange(self.dpy, root, *[ctypes.byref(size) for size in sizes])
+
+        return ('{0}x{1}'.format(sizes[0].value, sizes[1].value),
+                '{0}x{1}'.format(self.xlib.XDisplayWidth(self.dpy, number),
+                                 self.xlib.XDisplayHeight(self.dpy, number)),
+                '{0}x{1}'.format(sizes[2].value, sizes[3].value))
+
+    def get_timestamps(self):
+        '''
+        Return the time the screen configuration was last changed and the
+        time the server last detected a change of outputs, without probing
+        '''
+        res = self.xrandr.XRRGetScreenResourcesCurrent(self.dpy, self.root)
+
+        if not res:
+            raise RuntimeError('Cannot get screen resources for display: {0}'.format(self.display))
+
+        try:
+            return (res.contents.timestamp, res.contents.configTimestamp)
+        finally:
+            self.xrandr.XRRFreeScreenResources(res)
+
+    def get_screen(self, fields=('edid', 'modes'), probe=True, number=None):
+        '''
+        Query outputs, crtcs, modes and EDIDs and fill the same Screen and
+        Display structures the `xrandr --verbose` parser produces. Without
+        `probe` the server's cached state is returned. `number` selects
+        another X screen than the one of this connection.
+        '''
+        from xprofile.xrandr import Screen
+
+        if number is None:
+            number, root = self.screen, self.root
+        else:
+            root = self.xlib.XRootWindow(self.dpy, self.check_screen(number))
+
+        minimum, current, maximum = self.get_screen_size(number, root)
+        screen = Screen(number=number, minimum=minimum, current=current, maximum=maximum)
+
+        if probe:
+            res = self.xrandr.XRRGetScreenResources(self.dpy, root)
+        else:
+            res = self.xrandr.XRRGetScreenResourcesCurrent(self.dpy, root)
+
+        if not res:
+            raise RuntimeError('Cannot get screen resources for display: {0}'.format(self.display))
+
+        try:
+            resources = res.contents
+            primary = self.xrandr.XRRGetOutputPrimary(self.dpy, root)
+
+            modes = {}
+            for index in range(resources.nmode):
+                info = resources.modes[index]
+                modes[info.id] = (info.name[:info.nameLength].decode(),
+                                  info.dotClock / 1000000.0, get_refresh(info))
+
+            for index in range(resources.noutput):
+                output = resources.outputs[index]
+                screen.displays.append(self._get_display(res, output, primary, modes, fields))
+        finally:
+            self.xrandr.XRRFreeScreenResources(res)
+
+        return screen
+
+    def _get_display(self, res, output, primary, modes, fields):
+        from xprofile.xrandr import Display, Geometry, Mode, Rotation
+
+        info_p = self.xrandr.XRRGetOutputInfo(self.dpy, res, output)
+
+        try:
+            info = info_p.contents
+            display = Display(name=info.name[:info.nameLen].decode(),
+                              status=CONNECTION_STATUS.get(info.connection, 'unknown connection'),
+                              primary=output == primary)
+
+            current_mode = None
+            if info.crtc:
+                crtc_p = self.xrandr.XRRGetCrtcInfo(self.dpy, res, info.crtc)
+                try:
+                    crtc = crtc_p.contents
+                    if crtc.mode:
+                        current_mode = crtc.mode
+                        display.mode = '(0x{0:x})'.format(crtc.mode)
+                        display.rotation = Rotation.get(ROTATIONS.get(crtc.rotation & 0xf))
+                        display.geometry = Geometry(crtc.width, crtc.height, crtc.x, crtc.y)
+                finally:
+                    self.xrandr.XRRFreeCrtcInfo(crtc_p)
+
+            for index in range(info.nmode if 'modes' in fields else 0):
+                mode = info.modes[index]
+                modeid = '(0x{0:x})'.format(mode)
+                name, clock, refresh = modes.get(mode, (None, None, None))
+                display.modes[modeid] = Mode(modeid, name, mode == current_mode,
+                                             index < info.npreferred, clock, refresh)
+
+            if 'edid' in fields:
+                edid = binascii.hexlify(self.get_edid(output))
+                display.edid = [edid[i:i + 32] for i in range(0, len(edid), 32)]
+        finally:
+            self.xrandr.XRRFreeOutputInfo(info_p)
+
+        return display
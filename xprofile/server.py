@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+'''
+A resident xprofile answering the command lines that `xprofile.client`
+forwards over a UNIX socket. It keeps the compiled config and the last
+screen of each display in memory.
+'''
+import os
+import sys
+import json
+import errno
+import socket
+import logging
+
+from io import StringIO
+
+from xprofile import timings
+from xprofile.client import request
+
+
+log = logging.getLogger(__name__)
+
+
+class Server(object):
+    '''
+    Serve one request at a time: read a JSON line with the argv and working
+    directory of the client, run the subcommand with stdout, stderr and the
+    log redirected, and answer with a JSON object holding the status and
+    the output. Subcommands that cannot be served are answered with
+    `fallback` so the client runs them itself. The answer does not wait for
+    exec_post hooks; they log to the server once they finish.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.configs = {}
+        self.screens = {}
+        self.running = False
+        self.listener = None
+
+    def bind(self):
+        directory = os.path.dirname(self.path)
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+
+        if os.path.exists(self.path):
+            if request(self.path, None) is not None:
+                raise RuntimeError('An xprofile server is already listening on {0}'.format(self.path))
+            os.remove(self.path)
+
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(16)
+        self.listener.settimeout(1)
+
+        log.info('Listening on {0}'.format(self.path))
+
+    def get_config(self, args):
+        '''
+        Return the compiled config for args, loading it again when the rc
+        file changed
+        '''
+        from xprofile.__main__ import _get_mtime, _load_config
+
+        if args.no_cache:
+            return _load_config(args)
+
+        mtime = _get_mtime(args.config)
+        cached = self.configs.get(args.config)
+
+        if cached is None or cached[0] != mtime:
+            self.configs[args.config] = (mtime, _load_config(args))
+
+        return self.configs[args.config][1]
+
+    def run_command(self, argv, cwd):
+        '''
+        Run a command line like `xprofile` does and return its status
+        '''
+        from xprofile.__main__ import _dispatch, parse_commandline_arguments
+
+        args, parser = parse_commandline_arguments(argv)
+
+        if not getattr(args, 'serve', False):
+            return None
+
+        logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+        args.config = os.path.abspath(os.path.join(cwd, os.path.expanduser(args.config)))
+        args.probe = args.probe or args.default_probe
+        args.screens = None if args.no_cache else self.screens
+
+        # Other paths on the command line are relative to the client too
+        previous = os.getcwd()
+        os.chdir(cwd)
+
+        # exec_post hooks are reaped by their own threads, waiting for them
+        # here would hold up every other client
+        try:
+            return _dispatch(args, parser, self.get_config(args))
+        finally:
+            os.chdir(previous)
+            timings.write(command=args.subcommand, display=args.display, server=True)
+
+    def handle(self, data):
+        message = json.loads(data.decode('utf-8'))
+
+        # Sent by bind() to check whether a server is running
+        if message.get('argv') is None:
+            return {'fallback': True}
+
+        stdout, stderr = StringIO(), StringIO()
+        handler = logging.StreamHandler(stderr)
+        handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+
+        # The output of the command goes to the client only
+        root = logging.getLogger()
+        level, handlers = root.level, root.handlers
+        root.handlers = [handler]
+        streams = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = stdout, stderr
+
+        try:
+            status = self.run_command(message['argv'], message.get('cwd') or '/')
+        except SystemExit as err:
+            # Raised by argparse for --help and invalid arguments
+            status = err.code if isinstance(err.code, int) else 0 if err.code is None else 1
+            if not isinstance(err.code, (int, type(None))):
+                stderr.write(u'{0}\n'.format(err.code))
+        except Exception as err:
+            log.error('Failed to run {0}: {1}'.format(' '.join(message['argv']), err))
+            status = 1
+        finally:
+            sys.stdout, sys.stderr = streams
+            root.handlers = handlers
+            root.setLevel(level)
+
+        if status is None:
+            return {'fallback': True}
+
+        return {'status': status, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+    def serve(self, connection):
+        from xprofile.client import GREETING
+
+        # Only once greeted the client sends its command, a client that gave
+        # up waiting before does not run it twice
+        connection.sendall(GREETING)
+        chunks = []
+
+        while True:
+            chunk = connection.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+        if not chunks:
+            return
+
+        try:
+            response = self.handle(b''.join(chunks))
+        except ValueError as err:
+            log.warn('Ignoring malformed request: {0}'.format(err))
+            return
+
+        connection.sendall(json.dumps(response).encode('utf-8'))
+
+    def run(self):
+        '''
+        Accept connections until `stop()` is called
+        '''
+        if self.listener is None:
+            self.bind()
+
+        self.running = True
+
+        try:
+            while self.running:
+                try:
+                    connection, _ = self.listener.accept()
+                except socket.timeout:
+                    continue
+                except socket.error as err:
+                    if err.errno == errno.EINTR:
+                        continue
+                    raise
+
+                try:
+                    connection.settimeout(10)
+                    self.serve(connection)
+                except socket.error as err:
+                    log.warn('Lost connection to client: {0}'.format(err))
+                finally:
+                    connection.close()
+        finally:
+            self.close()
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
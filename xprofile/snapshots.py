@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+'''
+Cache the last queried screen of each X display in $XDG_RUNTIME_DIR
+'''
+import os
+import re
+import sys
+import logging
+
+from xprofile import timings
+from xprofile.cache import atomic_write, read_file
+
+
+log = logging.getLogger(__name__)
+
+
+# Bump this whenever the layout of a snapshot or the screen model changes
+SNAPSHOT_VERSION = 3
+
+RE_UNSAFE = re.compile(r'[^A-Za-z0-9.]')
+
+
+def snapshot_path(display, runtime_dir):
+    '''
+    Return the location of the snapshot for the given display
+    '''
+    name = 'screen-{0}-py{1}{2}.pickle'.format(
+        RE_UNSAFE.sub(lambda match: '%{0:02x}'.format(ord(match.group())), display),
+        *sys.version_info[:2])
+    return os.path.join(runtime_dir, name)
+
+
+def load_snapshot(path, display):
+    '''
+    Return the snapshot stored at path or None if it is missing or unusable
+    '''
+    import pickle
+
+    payload = read_file(path)
+
+    if not payload:
+        return None
+
+    try:
+        snapshot = pickle.loads(payload)
+    except Exception as err:
+        log.debug('Ignoring unreadable screen snapshot {0}: {1}'.format(path, err))
+        return None
+
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION \
+            or snapshot.get('display') != display:
+        return None
+
+    return snapshot
+
+
+def save_snapshot(path, snapshot):
+    import pickle
+
+    try:
+        atomic_write(path, pickle.dumps(snapshot, 2))
+        log.debug('Wrote screen snapshot to: {0}'.format(path))
+    except (IOError, OSError) as err:
+        log.warn('Cannot write screen snapshot: {0}'.format(err))
+
+
+def get_screen(xrandr, fields, probe=True, runtime_dir=None, memory=None):
+    '''
+    Query the screen through an Xrandr instance and return it together with
+    its edid hash.
+
+    When a runtime_dir is given the result is stored there, per display
+    and X screen, and reused by queries of the server's cached state as
+    long as the RandR timestamps of the screen are unchanged. A resident
+    process can pass a dict as memory to keep the snapshots in as well.
+
+    A probe always queries the screen: the timestamps only change once the
+    server noticed a change, which is what probing is for. Its result
+    refreshes the snapshot. Without libXrandr the timestamps cannot be read
+    and the screen is always queried.
+    '''
+    display = xrandr.display or os.environ.get('DISPLAY')
+
+    # Each X screen of a display has its own outputs and timestamps
+    if display and xrandr.screen is not None:
+        display = '{0}#{1}'.format(display, xrandr.screen)
+
+    timestamps = xrandr.get_timestamps() if (runtime_dir or memory is not None) and display else None
+
+    if timestamps is None:
+        screen = xrandr.get_screen(fields, probe=probe)
+
+        with timings.phase('edid'):
+            return (screen, screen.get_edid())
+
+    path = snapshot_path(display, runtime_dir) if runtime_dir else None
+    snapshot = None
+
+    if not probe:
+        with timings.phase('snapshot'):
+            snapshot = memory.get(display) if memory is not None else None
+            if snapshot is None and path:
+                snapshot = load_snapshot(path, display)
+
+    if snapshot and snapshot['timestamps'] == timestamps \
+            and set(fields) <= set(snapshot['fields']):
+        log.debug('Screen of {0} unchanged since {1}, using snapshot'.format(display, timestamps))
+        return (snapshot['screen'], snapshot['edid'])
+
+    screen = xrandr.get_screen(fields, probe=probe)
+
+    with timings.phase('edid'):
+        edid = screen.get_edid()
+
+    # Probing can make the server notice changed outputs. Only store the
+    # snapshot when nothing changed while querying the screen.
+    if xrandr.get_timestamps() == timestamps:
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'display': display,
+            'timestamps': timestamps,
+            'fields': list(fields),
+            'probe': probe,
+            'screen': screen,
+            'edid': edid,
+        }
+
+        if memory is not None:
+            memory[display] = snapshot
+        if path:
+            save_snapshot(path, snapshot)
+
+    return (screen, edid)
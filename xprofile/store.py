@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+'''
+Keep profiles in a SQLite database instead of ~/.xprofilerc
+'''
+import json
+import logging
+import threading
+
+from xprofile.profiles import MATCH_THRESHOLD, ProfileStore, _configparser, rank_overlap
+
+
+log = logging.getLogger(__name__)
+
+
+# Bump this whenever the schema changes
+SCHEMA_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS defaults (
+    option TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    edid TEXT,
+    displays INTEGER NOT NULL DEFAULT 0,
+    options TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS profiles_edid ON profiles (edid, position);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    fingerprint TEXT NOT NULL,
+    profile TEXT NOT NULL REFERENCES profiles (name) ON DELETE CASCADE,
+    PRIMARY KEY (fingerprint, profile)
+);
+CREATE INDEX IF NOT EXISTS fingerprints_profile ON fingerprints (profile);
+'''
+
+
+class SqliteStore(ProfileStore):
+    '''
+    Profiles in a SQLite database with indexed edids and display
+    fingerprints, so a lookup does not read all profiles.
+
+    The database is in WAL mode: readers don't block each other or a
+    writer, and writers wait up to `timeout` seconds for one another. Each
+    thread uses its own connection. Profiles keep only their own options;
+    those of DEFAULT are merged in when they are read, like ConfigParser
+    does.
+    '''
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+
+        connection = self.connection
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+
+        if version == 0:
+            with connection:
+                connection.executescript(SCHEMA)
+                connection.execute('PRAGMA user_version = {0:d}'.format(SCHEMA_VERSION))
+        elif version != SCHEMA_VERSION:
+            raise RuntimeError('Profile store {0} has schema version {1}, expected {2}'.format(
+                path, version, SCHEMA_VERSION))
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+
+        if connection is None:
+            import sqlite3
+
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA foreign_keys = ON')
+            self.local.connection = connection
+
+        return connection
+
+    def query(self, sql, *params):
+        return self.connection.execute(sql, params).fetchall()
+
+    def sections(self):
+        return [row[0] for row in self.query('SELECT name FROM profiles ORDER BY position')]
+
+    def defaults(self):
+        return dict(self.query('SELECT option, value FROM defaults'))
+
+    def has_section(self, section):
+        return bool(self.query('SELECT 1 FROM profiles WHERE name = ?', section))
+
+    def _options(self, section):
+        defaults = self.defaults()
+
+        if section == 'DEFAULT':
+            return defaults
+
+        rows = self.query('SELECT options FROM profiles WHERE name = ?', section)
+
+        if not rows:
+            raise _configparser().NoSectionError(section)
+
+        defaults.update(json.loads(rows[0][0]))
+        return defaults
+
+    def find_profile(self, edid):
+        rows = self.query('SELECT name FROM profiles WHERE edid = ? ORDER BY position LIMIT 1', edid)
+        return rows[0][0] if rows else None
+
+    def rank(self, fingerprints):
+        '''
+        Rank the profiles sharing at least one display fingerprint with the
+        given ones, like EdidIndex.rank
+        '''
+        current = set(fingerprints)
+
+        if not current:
+            return []
+
+        rows = self.query(
+            'SELECT p.name, count(*), p.displays FROM fingerprints f '
+            'JOIN profiles p ON p.name = f.profile '
+            'WHERE f.fingerprint IN ({0}) GROUP BY p.name'.format(', '.join('?' * len(current))),
+            *sorted(current))
+
+        return rank_overlap(dict((name, shared) for name, shared, displays in rows),
+                            len(current), dict((name, displays) for name, shared, displays in rows))
+
+    def match_profile(self, fingerprints, threshold=MATCH_THRESHOLD):
+        ranking = self.rank(fingerprints)
+
+        if ranking and ranking[0][0] >= threshold:
+            return ranking[0][1]
+
+        return None
+
+    def get_duplicates(self, edids=None):
+        '''
+        Return a dict of each edid shared by several profiles to their
+        names, checking only the given edids if any
+        '''
+        if edids is None:
+            rows = self.query('SELECT edid, name FROM profiles WHERE edid IN '
+                              '(SELECT edid FROM profiles GROUP BY edid HAVING count(*) > 1) '
+                              'ORDER BY position')
+        else:
+            rows = []
+            for edid in set(edids):
+                names = self.query('SELECT edid, name FROM profiles WHERE edid = ? ORDER BY position', edid)
+                rows += names if len(names) > 1 else []
+
+        duplicates = {}
+        for edid, name in rows:
+            duplicates.setdefault(edid, []).append(name)
+        return duplicates
+
+    def put(self, defaults, sections):
+        '''
+        Store the given DEFAULT options and sections, a list of (name, own
+        options) tuples, in one transaction. Existing profiles are replaced
+        in place, new ones added after all others.
+        '''
+        connection = self.connection
+
+        with connection:
+            # Take the write lock right away, so concurrent writers queue up
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany('INSERT OR REPLACE INTO defaults (option, value) VALUES (?, ?)',
+                                   sorted(defaults.items()))
+
+            position = connection.execute('SELECT coalesce(max(position), -1) FROM profiles').fetchone()[0]
+
+            for name, options in sections:
+                row = connection.execute('SELECT position FROM profiles WHERE name = ?', (name,)).fetchone()
+                if row is None:
+                    position += 1
+
+                fingerprints = set(options.get('edids', '').split())
+
+                connection.execute('DELETE FROM profiles WHERE name = ?', (name,))
+                connection.execute(
+                    'INSERT INTO profiles (name, position, edid, displays, options) VALUES (?, ?, ?, ?, ?)',
+                    (name, position if row is None else row[0], options.get('edid'),
+                     len(fingerprints), json.dumps(options, sort_keys=True)))
+                connection.executemany('INSERT INTO fingerprints (fingerprint, profile) VALUES (?, ?)',
+                                       [(fingerprint, name) for fingerprint in sorted(fingerprints)])
+
+        edids = [options['edid'] for name, options in sections if 'edid' in options]
+
+        for edid, names in self.get_duplicates(edids).items():
+            log.warn('Profiles {0} have the same edid {1}, only `{2}` will be used'.format(
+                ', '.join(names), edid, names[0]))
+
+    def remove(self, name):
+        with self.connection:
+            self.connection.execute('DELETE FROM profiles WHERE name = ?', (name,))
+
+    def import_config(self, config):
+        '''
+        Store all profiles of a ProfileStore, like the config compiled from
+        an rc file
+        '''
+        self.put(config.defaults(), [(section, config.own_options(section))
+                                     for section in config.sections()])
+
+    def close(self):
+        connection = getattr(self.local, 'connection', None)
+
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
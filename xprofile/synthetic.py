@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+'''
+Generate realistic `xrandr --verbose` output for any number of outputs and
+modes, with valid EDID blocks and the usual property noise.
+
+    $ python -m xprofile.synthetic --outputs 8 --connected 3 --modes 40
+'''
+import sys
+import struct
+
+from argparse import ArgumentParser
+from hashlib import md5
+
+
+# Resolutions the generated modes cycle through, each at several refresh rates
+RESOLUTIONS = [
+    (1920, 1080), (1680, 1050), (1600, 900), (1440, 900), (1366, 768), (1280, 1024),
+    (1280, 800), (1280, 720), (1024, 768), (800, 600), (720, 400), (640, 480),
+]
+REFRESH_RATES = [60.00, 59.94, 50.00, 75.00, 30.00, 24.00]
+
+# Detailed timing descriptor for 1920x1080 at 60Hz
+DTD_1080P = bytearray.fromhex('023a801871382d40582c4500fd1e1100001e')
+
+FIRST_MODE_ID = 0x40
+ROTATIONS = '(normal left inverted right x axis y axis)'
+
+
+def make_edid(index, seed=0):
+    '''
+    Return a valid 128 byte EDID (version 1.3) for a monitor. The product
+    code is the index and the serial number is derived from index and seed,
+    so every monitor is different but the output is reproducible.
+    '''
+    serial = struct.unpack('<I', md5('{0}-{1}'.format(seed, index).encode()).digest()[:4])[0]
+
+    def descriptor(tag, text):
+        return bytearray([0, 0, 0, tag, 0]) + (text[:12] + '\n').ljust(13).encode()
+
+    edid = bytearray.fromhex('00ffffffffffff00')
+    edid += struct.pack('>H', (ord('X') - 64) << 10 | (ord('P') - 64) << 5 | (ord('F') - 64))
+    edid += struct.pack('<HI', index & 0xffff, serial)
+    edid += bytearray([1 + index % 52, 25, 1, 3, 0x80, 52, 29, 0x78, 0x0a])
+    edid += bytearray.fromhex('ee91a3544c99260f5054')
+    edid += bytearray(3) + bytearray([1, 1] * 8)
+    edid += DTD_1080P
+    edid += descriptor(0xfc, 'XPF {0}'.format(index))
+    edid += descriptor(0xff, '{0:08X}'.format(serial))
+    edid += bytearray([0, 0, 0, 0x10]) + bytearray(14)
+    edid += bytearray([0])
+    edid.append(-sum(edid) & 0xff)
+
+    return bytes(edid)
+
+
+def get_modes(count):
+    '''
+    Return a list of (id, width, height, refresh) tuples
+    '''
+    modes = []
+
+    for index in range(count):
+        width, height = RESOLUTIONS[index % len(RESOLUTIONS)]
+        refresh = REFRESH_RATES[index // len(RESOLUTIONS) % len(REFRESH_RATES)]
+        modes.append((FIRST_MODE_ID + index, width, height, refresh))
+
+    return modes
+
+
+def generate(outputs=4, connected=None, active=None, modes=20, seed=0, properties=True):
+    '''
+    Return `xrandr --verbose` output as bytes.
+
+    The first `connected` outputs (all by default) have a monitor attached,
+    of which the first `active` (all connected ones by default) are enabled,
+    side by side at 1920x1080; the first one is primary. Every connected
+    output supports the same `modes` modes. With `properties` each output
+    gets the usual properties next to its EDID.
+    '''
+    connected = outputs if connected is None else min(connected, outputs)
+    active = connected if active is None else min(active, connected)
+    mode_list = get_modes(max(1, modes))
+    current = mode_list[0]
+
+    lines = ['Screen 0: minimum 8 x 8, current {0} x {1}, maximum 32767 x 32767'.format(
+        max(1, active) * current[1], current[2])]
+
+    for index in range(outputs):
+        name = 'DP-{0}'.format(index)
+
+        if index < active:
+            lines.append('{0} connected {1}{2}x{3}+{4}+0 (0x{5:x}) normal {6} 527mm x 296mm'.format(
+                name, 'primary ' if index == 0 else '', current[1], current[2],
+                index * current[1], current[0], ROTATIONS))
+        elif index < connected:
+            lines.append('{0} connected {1}'.format(name, ROTATIONS))
+        else:
+            lines.append('{0} disconnected {1}'.format(name, ROTATIONS))
+
+        lines.append('\tIdentifier: 0x{0:x}'.format(0x41 + index))
+        lines.append('\tTimestamp:  {0}'.format(10586061 + index))
+        lines.append('\tSubpixel:   {0}'.format('unknown' if index < connected else 'no subpixels'))
+        if index < active:
+            lines.append('\tGamma:      1.0:1.0:1.0')
+            lines.append('\tBrightness: 1.0')
+        lines.append('\tClones:    ')
+        if index < active:
+            lines.append('\tCRTC:       {0}'.format(index))
+        lines.append('\tCRTCs:      0 1 2 3')
+        lines.append('\tTransform:  1.000000 0.000000 0.000000')
+        lines.append('\t            0.000000 1.000000 0.000000')
+        lines.append('\t            0.000000 0.000000 1.000000')
+        lines.append('\t           filter: ')
+
+        if index < connected:
+            lines.append('\tEDID: ')
+            edid = make_edid(index, seed)
+            for offset in range(0, len(edid), 16):
+                lines.append('\t\t' + ''.join('{0:02x}'.format(byte) for byte in bytearray(edid[offset:offset + 16])))
+
+        if properties:
+            lines.append('\tBroadcast RGB: Automatic ')
+            lines.append('\t\tsupported: Automatic, Full, Limited 16:235')
+            lines.append('\taudio: auto ')
+            lines.append('\t\tsupported: force-dvi, off, auto, on')
+            lines.append('\tmax bpc: 12 ')
+            lines.append('\t\trange: (6, 12)')
+            lines.append('\tlink-status: Good ')
+            lines.append('\t\tsupported: Good, Bad')
+            lines.append('\tnon-desktop: 0 ')
+            lines.append('\t\trange: (0, 1)')
+
+        if index >= connected:
+            continue
+
+        for position, (modeid, width, height, refresh) in enumerate(mode_list):
+            htotal, vtotal = width + 280, height + 45
+            flags = ''
+            if index < active and position == 0:
+                flags += ' *current'
+            if position == 0:
+                flags += ' +preferred'
+
+            lines.append('  {0}x{1} (0x{2:x}) {3:.3f}MHz +HSync +VSync{4}'.format(
+                width, height, modeid, htotal * vtotal * refresh / 1e6, flags))
+            lines.append('        h: width  {0:4} start {1:4} end {2:4} total {3:4} skew    0 clock {4:6.2f}KHz'.format(
+                width, width + 88, width + 132, htotal, vtotal * refresh / 1e3))
+            lines.append('        v: height {0:4} start {1:4} end {2:4} total {3:4}           clock {4:6.2f}Hz'.format(
+                height, height + 4, height + 9, vtotal, refresh))
+
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='Print synthetic `xrandr --verbose` output')
+    parser.add_argument('--outputs', default=4, type=int, help='number of outputs')
+    parser.add_argument('--connected', default=None, type=int, help='number of connected outputs (default: all)')
+    parser.add_argument('--active', default=None, type=int, help='number of enabled outputs (default: all connected)')
+    parser.add_argument('--modes', default=20, type=int, help='number of modes per connected output')
+    parser.add_argument('--seed', default=0, type=int, help='seed for the EDID serial numbers')
+    parser.add_argument('--no-properties', action='store_true', help='leave out output properties')
+    args = parser.parse_args(argv)
+
+    output = generate(args.outputs, args.connected, args.active, args.modes, args.seed,
+                      not args.no_properties)
+
+    getattr(sys.stdout, 'buffer', sys.stdout).write(output)
+
+    return 0
+
+
+if '__main__' == __name__:
+    sys.exit(main())
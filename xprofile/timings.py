@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+'''
+Record how long the phases of an invocation take (startup, probing the
+displays, parsing, hashing EDIDs, looking up the profile, applying it and
+running exec_post) and write them as one JSON line.
+'''
+import os
+import sys
+import time
+import logging
+
+
+log = logging.getLogger(__name__)
+
+
+# Enables timings like --timings; `1` or `-` writes to stderr, `0` disables
+# them and anything else is the path of a file to append to
+ENVIRONMENT_VARIABLE = 'XPROFILE_TIMINGS'
+
+clock = getattr(time, 'monotonic', time.time)
+
+_state = {'output': None, 'started': None}
+_records = []
+
+
+class _Phase(object):
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        # list.append is atomic, so phases can be recorded from threads
+        _records.append((self.name, clock() - self.start))
+
+
+class _NoPhase(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def get_process_age():
+    '''
+    Return the seconds since this process was started, with the resolution
+    of the kernel clock tick, or None when /proc is not available
+    '''
+    try:
+        with open('/proc/self/stat') as file:
+            fields = file.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as file:
+            uptime = float(file.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / float(os.sysconf('SC_CLK_TCK')))
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def get_output():
+    '''
+    Return the output configured in the environment or None
+    '''
+    output = os.environ.get(ENVIRONMENT_VARIABLE)
+
+    if output in (None, '', '0'):
+        return None
+
+    return '-' if output == '1' else output
+
+
+def enable(output, started=None):
+    '''
+    Start recording phases. `output` is `-` for stderr or the path of a file
+    to append to, `started` the `clock()` at which main was entered; the
+    time before it is recorded as the startup phase.
+    '''
+    _state['output'] = output
+    _state['started'] = clock() if started is None else started
+    del _records[:]
+
+    age = get_process_age()
+    if age is not None:
+        record('startup', max(0.0, age - (clock() - _state['started'])))
+
+
+def disable():
+    _state['output'] = None
+    del _records[:]
+
+
+def is_enabled():
+    return _state['output'] is not None
+
+
+def record(name, seconds):
+    _records.append((name, seconds))
+
+
+def phase(name):
+    '''
+    Return a context manager adding the time spent in it to the phase
+    `name`. It does nothing when timings are not enabled.
+    '''
+    if _state['output'] is None:
+        return _NO_PHASE
+    return _Phase(name)
+
+
+def get_phases():
+    '''
+    Return a dict of phase name to the total seconds spent in it
+    '''
+    phases = {}
+    for name, seconds in list(_records):
+        phases[name] = phases.get(name, 0.0) + seconds
+    return phases
+
+
+def write(**fields):
+    '''
+    Write the phases recorded so far together with the given fields as a
+    JSON line and start recording anew
+    '''
+    if not is_enabled():
+        return
+
+    import json
+
+    phases = get_phases()
+    data = {
+        'time': time.time(),
+        'pid': os.getpid(),
+        'argv': sys.argv[1:],
+        'total': phases.get('startup', 0.0) + clock() - _state['started'],
+        'phases': dict((name, round(seconds, 6)) for name, seconds in phases.items()),
+    }
+    data.update(fields)
+
+    line = json.dumps(data, sort_keys=True) + '\n'
+
+    del _records[:]
+    _state['started'] = clock()
+
+    if _state['output'] == '-':
+        sys.stderr.write(line)
+        return
+
+    try:
+        with open(_state['output'], 'a') as file:
+            file.write(line)
+    except (IOError, OSError) as err:
+        log.warn('Cannot write timings: {0}'.format(err))
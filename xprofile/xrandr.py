@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 import os
+import time
+import signal
 import logging
+import threading
 
+from collections import namedtuple
+from itertools import chain
 from re import compile
-from hashlib import md5
 from subprocess import Popen, PIPE
-from distutils.spawn import find_executable
+
+from xprofile import timings
 
 
 log = logging.getLogger(__name__)
@@ -14,13 +19,204 @@ log = logging.getLogger(__name__)
 RE_EDID = compile(r'^\s*([a-f0-9]{32})$')
 RE_XRANDR_DISPLAY = compile(r'^(?P<name>[^\s]+) (?P<status>disconnected|connected|unknown connection) ?(?P<primary>primary)? ?(?P<geometry>(?P<width>[0-9]+)x(?P<height>[0-9]+)\+(?P<x>[0-9]+)\+(?P<y>[0-9]+))? ?(?P<mode>\([0-9a-fx]+\))? ?(?P<rotation>normal|left|inverted|right)?.*$')
 RE_XRANDR_SCREEN = compile(r'^Screen (?P<screen>[0-9]+): minimum (?P<minimum>[0-9]+ x [0-9]+), current (?P<current>[0-9]+ x [0-9]+), maximum (?P<maximum>[0-9]+ x [0-9]+)')
-RE_DISPLAY_MODE = compile(r'^\s+(?P<dimension>[0-9x]+) (?P<modeid>\([0-9a-fx]+\)) [0-9\.]+MHz [-+]HSync [-+]VSync ?(?P<current>\*current)? ?(?P<preferred>\+preferred)?\s*$')
+RE_DISPLAY_MODE = compile(r'^\s+(?P<dimension>[0-9x]+) (?P<modeid>\([0-9a-fx]+\)) (?P<clock>[0-9\.]+)MHz [-+]HSync [-+]VSync ?(?P<current>\*current)? ?(?P<preferred>\+preferred)?\s*$')
+
+
+# Options xrandr accepts after --output that can be compared with the
+# current state of a display, and whether they take a value
+OUTPUT_OPTIONS = {
+    '--off': 'off',
+    '--primary': 'primary',
+    '--mode': 'mode',
+    '--pos': 'pos',
+    '--rotate': 'rotate',
+    '--rate': 'rate',
+}
+OUTPUT_FLAGS = ('--off', '--primary')
+
+
+def parse_xrandr_options(args):
+    '''
+    Group xrandr arguments per --output into a list of (name, settings, args)
+    tuples. `settings` maps `off`, `primary`, `mode`, `pos`, `rotate` and
+    `rate` to their values.
+
+    Returns None when the arguments contain options that cannot be compared
+    with the current state of a screen (like --auto or --right-of).
+    '''
+    outputs = []
+    args = iter(args)
+
+    for arg in args:
+        if arg == '--output':
+            name = next(args, None)
+            if name is None:
+                return None
+            outputs.append((name, {}, ['--output', name]))
+            continue
+
+        if not outputs or arg not in OUTPUT_OPTIONS:
+            return None
+
+        name, settings, output_args = outputs[-1]
+
+        if arg in OUTPUT_FLAGS:
+            settings[OUTPUT_OPTIONS[arg]] = True
+            output_args.append(arg)
+            continue
+
+        value = next(args, None)
+        if value is None:
+            return None
+
+        settings[OUTPUT_OPTIONS[arg]] = value
+        output_args += [arg, value]
+
+    return outputs
+
+
+class _View(object):
+    '''
+    Read only, dict compatible access to the attributes listed in `KEYS`,
+    for callers written against the former dict based model
+    '''
+    __slots__ = ()
+    KEYS = ()
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def keys(self):
+        return list(self.KEYS)
+
+    def get(self, key, default=None):
+        return self[key] if key in self.KEYS else default
+
+
+class _Record(object):
+    '''
+    Mixin for named tuples that also allows looking up fields by name
+    '''
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        return tuple.__getitem__(self, key)
+
+
+class Rotation(str):
+    '''
+    The rotation of a display. There is exactly one instance per rotation
+    (`Rotation.NORMAL`, `LEFT`, `INVERTED` and `RIGHT`) so rotations can be
+    compared by identity; they compare equal to their xrandr name too.
+    '''
+    __slots__ = ()
+    members = {}
+
+    def __reduce__(self):
+        return (Rotation.get, (str(self),))
+
+    @classmethod
+    def get(cls, name):
+        '''
+        Return the rotation with the given xrandr name, normal for None
+        '''
+        try:
+            return cls.members[name or 'normal']
+        except KeyError:
+            raise ValueError('Unknown rotation: {0}'.format(name))
+
+
+for _name in ('normal', 'left', 'inverted', 'right'):
+    Rotation.members[_name] = Rotation(_name)
+    setattr(Rotation, _name.upper(), Rotation.members[_name])
+
+
+class Geometry(_Record, namedtuple('Geometry', 'width height x y')):
+    '''
+    Size and position of an active display in pixels
+    '''
+    __slots__ = ()
+
+    @property
+    def dimension(self):
+        return '{0}x{1}'.format(self.width, self.height)
+
+    @property
+    def offset(self):
+        return '{0}x{1}'.format(self.x, self.y)
+
+
+class Mode(_Record, namedtuple('Mode', 'id dimension current preferred clock refresh')):
+    '''
+    A mode supported by a display, `id` is formatted like `(0x4b)`. `clock`
+    is the pixel clock in MHz and `refresh` the vertical refresh rate in Hz,
+    both None when unknown.
+    '''
+    __slots__ = ()
 
+    @property
+    def area(self):
+        width, _, height = self.dimension.partition('x')
+        return int(width) * int(height) if width.isdigit() and height.isdigit() else 0
 
-class Screen(dict):
-    def __init__(self, *args, **kwargs):
-        self['displays'] = []
-        super(Screen, self).__init__(*args, **kwargs)
+    @property
+    def rate(self):
+        '''
+        The refresh rate formatted like xrandr's --rate option, or None
+        '''
+        return None if self.refresh is None else '{0:.2f}'.format(self.refresh)
+
+# Defaults for current, preferred, clock and refresh, set on the generated
+# __new__ so creating a mode costs no extra call
+Mode.__new__.__defaults__ = (False, False, None, None)
+
+
+class Screen(_View):
+    '''
+    The displays of one X screen. `number` is the X screen number and
+    `minimum`, `current` and `maximum` its sizes formatted like `320x200`,
+    all None when unknown.
+    '''
+    __slots__ = ('displays', 'number', 'minimum', 'current', 'maximum')
+    KEYS = ('displays', 'number', 'minimum', 'current', 'maximum')
+
+    def __init__(self, displays=None, number=None, minimum=None, current=None, maximum=None):
+        self.displays = [] if displays is None else displays
+        self.number = number
+        self.minimum = minimum
+        self.current = current
+        self.maximum = maximum
+
+    def __eq__(self, other):
+        return self is other or (isinstance(other, Screen) and self.number == other.number and
+                                 self.displays == other.displays)
+
+    def __hash__(self):
+        return hash(tuple(self.displays))
+
+    def __repr__(self):
+        if self.number is None:
+            return 'Screen({0!r})'.format(self.displays)
+        return 'Screen({0!r}, number={1!r})'.format(self.displays, self.number)
 
     def get_xrandr_options(self):
         '''
@@ -28,7 +224,7 @@ class Screen(dict):
         option list.
         '''
         line = []
-        for display in self['displays']:
+        for display in self.displays:
             line += display.get_xrandr_options()
         return line
 
@@ -36,121 +232,653 @@ class Screen(dict):
         '''
         Get a md5 hash of all EDID of all currently connected displays
         '''
+        from hashlib import md5
+
         md5sum = md5()
 
-        for display in self['displays']:
-            for edid in display['edid']:
+        for display in self.displays:
+            for edid in display.edid:
                 md5sum.update(edid)
 
         return md5sum.hexdigest()
 
+    def get_fingerprints(self):
+        '''
+        Get the fingerprints of all connected displays with an EDID, sorted
+        so they do not depend on the order of the outputs
+        '''
+        return sorted(fingerprint for fingerprint in
+                      (display.get_fingerprint() for display in self.displays) if fingerprint)
+
+    def get_changes(self, args):
+        '''
+        Compare xrandr arguments with the current state of the displays.
+
+        Returns a tuple of the arguments for only those outputs that would
+        change, and a description of each change. Returns None when the
+        arguments cannot be compared, in which case all of them should be
+        passed to xrandr.
+        '''
+        targets = parse_xrandr_options(args)
+        if targets is None:
+            return None
+
+        current = dict((display.name, display) for display in self.displays)
+        changed_args, changes = [], []
+
+        for name, wanted, output_args in targets:
+            if name not in current:
+                return None
+
+            have = current[name].get_settings()
+            diff = []
+
+            if wanted.get('off'):
+                if not have['off']:
+                    diff.append('off')
+            elif have['off'] and set(wanted) & set(['primary', 'mode', 'pos', 'rotate']):
+                diff.append('on')
+            else:
+                if wanted.get('primary') and not have['primary']:
+                    diff.append('primary')
+
+                for key in ('mode', 'pos', 'rotate', 'rate'):
+                    if key in wanted and wanted[key] != have.get(key):
+                        diff.append('{0} {1} -> {2}'.format(key, have.get(key), wanted[key]))
+
+            if diff:
+                changed_args += output_args
+                changes.append('{0}: {1}'.format(name, ', '.join(diff)))
+
+        return (changed_args, changes)
+
+
+class Display(_View):
+    '''
+    The state of one output. `edid` is a list of the hex encoded lines of
+    its EDID and `modes` maps mode ids to `Mode` records. Equality covers
+    all state; the hash leaves out the modes.
+    '''
+    __slots__ = ('name', 'status', 'primary', 'mode', 'rotation', 'geometry', 'edid', 'modes')
+    KEYS = ('name', 'status', 'connected', 'primary', 'mode', 'rotation', 'geometry',
+            'active', 'edid', 'modes')
+
+    def __init__(self, name=None, status=None, primary=False, mode=None,
+                 rotation=Rotation.NORMAL, geometry=None, edid=None, modes=None):
+        self.name = name
+        self.status = status
+        self.primary = primary
+        self.mode = mode
+        self.rotation = rotation
+        self.geometry = geometry
+        self.edid = [] if edid is None else edid
+        self.modes = {} if modes is None else modes
+
+    @property
+    def connected(self):
+        return self.status == 'connected'
+
+    @property
+    def active(self):
+        return self.geometry is not None
+
+    def __getitem__(self, key):
+        # The dict based model used None for the normal rotation
+        if key == 'rotation':
+            return None if self.rotation is Rotation.NORMAL else self.rotation
+        return _View.__getitem__(self, key)
+
+    def __eq__(self, other):
+        return self is other or (isinstance(other, Display) and
+                                 self.name == other.name and
+                                 self.status == other.status and
+                                 self.primary == other.primary and
+                                 self.mode == other.mode and
+                                 self.rotation is other.rotation and
+                                 self.geometry == other.geometry and
+                                 self.edid == other.edid and
+                                 self.modes == other.modes)
+
+    def __hash__(self):
+        return hash((self.name, self.status, self.primary, self.mode, self.rotation,
+                     self.geometry, tuple(self.edid)))
+
+    def __repr__(self):
+        return 'Display({0!r}, {1!r}, geometry={2!r})'.format(self.name, self.status, self.geometry)
+
+    def get_fingerprint(self):
+        '''
+        Get a md5 hash of the EDID of this display, None when it has none
+        '''
+        if not self.edid:
+            return None
+
+        from hashlib import md5
 
-class Display(dict):
-    def __init__(self, *args, **kwargs):
-        self['edid'] = []
-        self['modes'] = {}
-        self['geometry'] = None
-        super(Display, self).__init__(*args, **kwargs)
+        return md5(b''.join(self.edid)).hexdigest()
 
     def get_xrandr_options(self):
-        if not self['connected']:
+        if not self.connected:
             return []
 
-        line = ['--output', self['name']]
+        line = ['--output', self.name]
 
-        if not self['active']:
+        if not self.active:
             line += ['--off']
 
             return line
 
-        if self['primary']:
+        if self.primary:
             line += ['--primary']
 
-        if self['mode'] in self['modes']:
-            mode = self['modes'][self['mode']]['dimension']
+        if self.mode in self.modes:
+            mode = self.modes[self.mode].dimension
         else:
             # TODO: is this fallback needed?
-            mode = self['geometry']['dimension']
+            mode = self.geometry.dimension
 
         line += [
             '--mode', mode,
-            '--pos',  self['geometry']['offset']
+            '--pos',  self.geometry.offset
         ]
 
-        if self['rotation']:
-            line += ['--rotate', self['rotation']]
+        if self.rotation is not Rotation.NORMAL:
+            line += ['--rotate', self.rotation]
 
         return line
 
+    def get_modes_by_dimension(self):
+        '''
+        Return a dict of each dimension to its modes, highest refresh rate
+        first
+        '''
+        index = {}
+
+        for mode in self.modes.values():
+            index.setdefault(mode.dimension, []).append(mode)
+
+        for modes in index.values():
+            modes.sort(key=lambda mode: (-(mode.refresh or 0.0), mode.id))
+
+        return index
+
+    def get_best_mode(self):
+        '''
+        Return the mode with the preferred dimension, or the largest one
+        when no mode is preferred, and the highest refresh rate. Returns
+        None when the modes are unknown.
+        '''
+        index = self.get_modes_by_dimension()
+
+        if not index:
+            return None
+
+        preferred = [mode for mode in self.modes.values() if mode.preferred]
+
+        if preferred:
+            dimension = min(preferred, key=lambda mode: mode.id).dimension
+        else:
+            dimension = max(index, key=lambda dimension: (index[dimension][0].area, dimension))
+
+        return index[dimension][0]
+
+    def get_settings(self):
+        '''
+        Return the current state of this display in the same form as the
+        settings returned by `parse_xrandr_options`
+        '''
+        # A disconnected output can still be enabled, until it is turned off
+        settings = {'off': not self.active, 'primary': False}
+
+        for name, options, args in parse_xrandr_options(self.get_xrandr_options()):
+            settings.update(options)
+            settings['off'] = options.get('off', False)
+
+        if not settings['off']:
+            settings.setdefault('rotate', 'normal')
+
+            if self.mode in self.modes and self.modes[self.mode].rate:
+                settings['rate'] = self.modes[self.mode].rate
+
+        return settings
+
+
+BACKENDS = ('xrandr', 'native', 'auto')
+FIELDS = ('edid', 'modes')
+
+_executables = {}
+
+
+class XrandrTimeout(RuntimeError):
+    '''
+    Raised when xrandr did not finish within the deadline on any attempt
+    '''
+
+
+def find_xrandr():
+    '''
+    Find the xrandr binary on $PATH. The lookup is only done once.
+    '''
+    if 'xrandr' not in _executables:
+        try:
+            from shutil import which
+        except ImportError:
+            from distutils.spawn import find_executable as which
+
+        _executables['xrandr'] = which('xrandr')
+
+    return _executables['xrandr']
+
+
+def _size(size):
+    return size.replace(' x ', 'x')
+
+
+def parse_screen(lines, fields=FIELDS):
+    '''
+    Parse the output of `xrandr --verbose` and return its first screen, an
+    empty screen when there is none (see `parse_screens`).
+    '''
+    screens = parse_screens(lines, fields)
+
+    return screens[0] if screens else Screen()
+
+
+def parse_screens(lines, fields=FIELDS):
+    '''
+    Parse the output of one or more `xrandr --verbose` calls in a single
+    pass and return a list with a Screen for every `Screen N:` header.
+    Outputs before the first header end up in a screen without number.
+
+    `lines` is an iterable of bytes. Lines are classified by their prefix so
+    only output headers (and mode lines, when requested) are matched against
+    a regex. Property blocks are skipped, except for the EDID block when
+    `edid` is one of the requested `fields`.
+    '''
+    want_edid = 'edid' in fields
+    want_modes = 'modes' in fields
+
+    screens = []
+    screen = None
+    display = None
+    # The fields of the last mode line, until its v: line gives the refresh
+    pending = None
+    in_edid = False
+
+    for line in lines:
+        if line.startswith(b'\t'):
+            if line.startswith(b'\t\t'):
+                if in_edid:
+                    edid = line.strip()
+                    if len(edid) == 32:
+                        display.edid.append(edid)
+            else:
+                in_edid = want_edid and display is not None and line.startswith(b'\tEDID:')
+            continue
+
+        in_edid = False
+
+        if line.startswith(b' '):
+            # Mode lines are indented by two spaces, their h: and v: timing
+            # lines (and the modes of non verbose output) by more
+            if want_modes and display is not None:
+                if not line.startswith(b'   '):
+                    if pending:
+                        display.modes[pending[0]] = Mode(*pending)
+                    parts = RE_DISPLAY_MODE.match(line.decode())
+                    if parts:
+                        modeid, dimension, current, preferred, clock = parts.group(
+                            'modeid', 'dimension', 'current', 'preferred', 'clock')
+                        pending = (modeid, dimension, current != None, preferred != None, float(clock))
+                    else:
+                        pending = None
+                elif pending and line[8:10] == b'v:':
+                    # xrandr indents timing lines by eight spaces, the v:
+                    # line ends with the refresh rate like `60.00Hz`
+                    line = line.rstrip()
+                    display.modes[pending[0]] = Mode(*pending + (float(line[line.rfind(b' ') + 1:-2]),))
+                    pending = None
+            continue
+
+        if pending:
+            display.modes[pending[0]] = Mode(*pending)
+            pending = None
+
+        if line.startswith(b'Screen '):
+            parts = RE_XRANDR_SCREEN.match(line.decode())
+            if parts:
+                display = None
+                screen = Screen(number=int(parts.group('screen')),
+                                minimum=_size(parts.group('minimum')),
+                                current=_size(parts.group('current')),
+                                maximum=_size(parts.group('maximum')))
+                screens.append(screen)
+            continue
+
+        parts = RE_XRANDR_DISPLAY.match(line.decode().rstrip())
+        if parts:
+            if screen is None:
+                screen = Screen()
+                screens.append(screen)
+
+            geometry = None
+            if parts.group('geometry'):
+                geometry = Geometry(int(parts.group('width')), int(parts.group('height')),
+                                    int(parts.group('x')), int(parts.group('y')))
+
+            display = Display(name=parts.group('name'),
+                              status=parts.group('status'),
+                              primary=parts.group('primary') == 'primary',
+                              mode=parts.group('mode'),
+                              rotation=Rotation.get(parts.group('rotation')),
+                              geometry=geometry)
+            screen.displays.append(display)
+
+    if pending:
+        display.modes[pending[0]] = Mode(*pending)
+
+    return screens
+
+
+def kill_process_group(process):
+    '''
+    Kill a process started in its own session together with everything it
+    started, like the xrandr a wrapper script runs without exec, so nothing
+    keeps its pipes open
+    '''
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        # The whole group already exited
+        pass
+
 
 class Xrandr(object):
-    def __init__(self, xrandr_bin=find_executable('xrandr'), display=None):
-        self.xrandr_bin = xrandr_bin
+    def __init__(self, xrandr_bin=None, display=None, backend='xrandr',
+                 timeout=None, retries=0, backoff=0.5, screen=None):
+        '''
+        When a `timeout` (in seconds) is given, an xrandr call running longer
+        is killed and retried up to `retries` times, waiting `backoff`
+        seconds before the first retry and doubling that for every next one.
+
+        `screen` is the number of the X screen to query and configure, by
+        default the default screen of the display.
+        '''
+        if backend not in BACKENDS:
+            raise ValueError('Unknown backend: {0}'.format(backend))
+
+        self._xrandr_bin = xrandr_bin
         self.display = display
+        self.screen = screen
+        self.backend = backend
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    @property
+    def xrandr_bin(self):
+        '''
+        The xrandr binary given to the constructor or else the one on $PATH
+        '''
+        return self._xrandr_bin or find_xrandr()
 
-    def get_screen(self):
-        screen  = Screen()
+    def get_screen(self, fields=FIELDS, probe=True):
+        '''
+        Query the current screen using the configured backend.
 
-        for line in self.call_xrandr(['--verbose']):
-            parts = RE_XRANDR_DISPLAY.match(line)
-            if parts:
-                display = Display()
-                display['name'] = parts.group('name')
-                display['status'] = parts.group('status')
-                display['connected'] = parts.group('status') == 'connected'
-                display['primary'] = parts.group('primary') == 'primary'
-                display['mode'] = parts.group('mode')
-
-                if parts.group('rotation') == 'normal':
-                    display['rotation'] = None
-                else:
-                    display['rotation'] = parts.group('rotation')
-
-                if parts.group('geometry'):
-                    display['geometry'] = {
-                        'dimension': '%sx%s' % (parts.group('width'), parts.group('height')),
-                        'offset':    '%sx%s' % (parts.group('x'), parts.group('y'))
-                    }
-
-                display['active'] = isinstance(display['geometry'], dict)
-                screen['displays'].append(display)
-                continue
-
-            parts = RE_EDID.match(line)
-            if parts:
-                edid = line.strip().encode()
-                screen['displays'][-1]['edid'].append(edid)
-                continue
+        `fields` selects which optional display data is collected: `edid`
+        and/or `modes`. Skipping what is not needed makes the query cheaper.
 
-            parts = RE_DISPLAY_MODE.match(line)
-            if parts:
-                screen['displays'][-1]['modes'][parts.group('modeid')] = {
-                    'id': parts.group('modeid'),
-                    'dimension': parts.group('dimension'),
-                    'current': parts.group('current') != None,
-                    'preferred': parts.group('preferred') != None,
-                }
-                continue
+        When `probe` is False the X server returns its cached state instead
+        of re-probing every connector (and re-reading EDIDs over DDC).
 
-        return screen
+        The `native` backend talks to the X server through libXrandr. The
+        `auto` backend tries the native backend first and falls back to
+        parsing the output of `xrandr --verbose` when it is not available.
+        '''
+        if self.backend == 'native':
+            return self.get_screen_native(fields, probe)
+
+        if self.backend == 'auto':
+            try:
+                return self.get_screen_native(fields, probe)
+            except (RuntimeError, OSError) as err:
+                log.debug('Native RandR backend failed, falling back to xrandr: {0}'.format(err))
+
+        return self.get_screen_xrandr(fields, probe)
+
+    def get_screen_count(self):
+        '''
+        Return the number of X screens of the display. Without libX11 the
+        count cannot be read and 1 is returned.
+        '''
+        from xprofile import randr
+
+        if self.backend == 'xrandr' and not randr.is_available():
+            return 1
+
+        try:
+            with randr.RandrConnection(self.display) as connection:
+                return connection.get_screen_count()
+        except (RuntimeError, OSError) as err:
+            if self.backend == 'native':
+                raise
+            log.debug('Cannot count X screens, assuming one: {0}'.format(err))
+            return 1
+
+    def get_screens(self, fields=FIELDS, probe=True, jobs=8):
+        '''
+        Query every X screen of the display and return a list of screens,
+        ordered by number.
+
+        The native backend queries all screens over one connection, the
+        xrandr backend runs `xrandr --screen N` for all of them at once on up
+        to `jobs` threads.
+        '''
+        from copy import copy
+
+        count = self.get_screen_count()
+
+        if count == 1:
+            return [self.get_screen(fields, probe)]
+
+        if self.backend != 'xrandr':
+            try:
+                return self.get_screens_native(count, fields, probe)
+            except (RuntimeError, OSError) as err:
+                if self.backend == 'native':
+                    raise
+                log.debug('Native RandR backend failed, falling back to xrandr: {0}'.format(err))
+
+        def query(number):
+            xrandr = copy(self)
+            xrandr.backend, xrandr.screen = 'xrandr', number
+            return xrandr.get_screen_xrandr(fields, probe)
+
+        from multiprocessing.pool import ThreadPool
+
+        pool = ThreadPool(max(1, min(jobs, count)))
+
+        try:
+            return pool.map(query, range(count))
+        finally:
+            pool.close()
+            pool.join()
+
+    def get_timestamps(self):
+        '''
+        Return the RandR (timestamp, config timestamp) of the screen through
+        libXrandr without probing displays, or None when it is unavailable.
+        Both change whenever the configuration or the outputs change.
+        '''
+        from xprofile import randr
+
+        if not randr.is_available():
+            return None
+
+        try:
+            with randr.RandrConnection(self.display, self.screen) as connection:
+                return connection.get_timestamps()
+        except RuntimeError as err:
+            log.debug('Cannot get RandR timestamps: {0}'.format(err))
+            return None
+
+    def get_screen_native(self, fields=FIELDS, probe=True):
+        '''
+        Query the current screen directly from the X server through libXrandr
+        '''
+        from xprofile.randr import RandrConnection
+
+        with timings.phase('probe' if probe else 'query'):
+            with RandrConnection(self.display, self.screen) as connection:
+                return connection.get_screen(fields, probe)
+
+    def get_screens_native(self, count, fields=FIELDS, probe=True):
+        '''
+        Query the given number of X screens over a single connection
+        '''
+        from xprofile.randr import RandrConnection
+
+        with timings.phase('probe' if probe else 'query'):
+            with RandrConnection(self.display) as connection:
+                return [connection.get_screen(fields, probe, number) for number in range(count)]
+
+    def get_screen_xrandr(self, fields=FIELDS, probe=True):
+        '''
+        Query the current screen by parsing the output of `xrandr --verbose`
+        '''
+        args = ['--verbose'] if probe else ['--current', '--verbose']
+
+        def parse(stdout):
+            # xrandr gathers the screen resources before it writes the
+            # first line, the rest is parsed while it is being written
+            with timings.phase('probe' if probe else 'query'):
+                first = stdout.readline()
+
+            with timings.phase('parse'):
+                screens = parse_screens(chain([first], stdout), fields)
+
+            return screens[0] if screens else Screen()
+
+        return self.stream_xrandr(args, parse)
+
+    def apply(self, args):
+        '''
+        Pass xrandr arguments (like those of a profile) to xrandr
+        '''
+        log.debug('Calling xrandr: {0}'.format(' '.join(args)))
+
+        with timings.phase('apply'):
+            self.call_xrandr(args)
 
     def call_xrandr(self, args=[]):
         '''
-        Make a call to the xrandr binary in a subprocess
+        Make a call to the xrandr binary in a subprocess and return its
+        output as a list of lines
+        '''
+        return self.run_xrandr(args).decode().split('\n')
+
+    def get_backoff(self, attempt):
+        '''
+        Seconds to wait before retrying after the given failed attempt
+        '''
+        return self.backoff * 2 ** (attempt - 1)
+
+    def get_deadline_policy(self):
+        '''
+        Describe the timeout and retry policy, for error messages
+        '''
+        return '{0} attempt(s) of {1}s each, backoff {2}s doubling per retry'.format(
+            self.retries + 1, self.timeout, self.backoff)
+
+    def get_command(self, args):
+        '''
+        Return the xrandr command line for the given arguments
+        '''
+        if self.screen is None:
+            return [self.xrandr_bin] + args
+
+        return [self.xrandr_bin, '--screen', str(self.screen)] + args
+
+    def get_env(self):
+        '''
+        Return the environment for the xrandr subprocess
         '''
         current_env = os.environ.copy()
 
         if self.display:
             current_env['DISPLAY'] = self.display
 
-        process = Popen([self.xrandr_bin] + args, env=current_env,
-                        stdout=PIPE, stderr=PIPE)
-        stdout, stderr = process.communicate()
-        status = process.wait()
+        return current_env
+
+    def run_xrandr(self, args=[]):
+        '''
+        Make a call to the xrandr binary in a subprocess and return its
+        output as bytes
+        '''
+        return self.stream_xrandr(args, lambda stdout: stdout.read())
+
+    def stream_xrandr(self, args, consume):
+        '''
+        Make a call to the xrandr binary in a subprocess and return what
+        `consume` returns for its stdout, a file it can read while xrandr is
+        still writing.
+
+        xrandr is killed when it runs longer than the timeout, the result of
+        that attempt is dropped and the call retried.
+        '''
+        attempts = self.retries + 1
+
+        for attempt in range(1, attempts + 1):
+            process = Popen(self.get_command(args), env=self.get_env(),
+                            stdout=PIPE, stderr=PIPE, preexec_fn=os.setsid)
+            killed = []
+            timer = None
+
+            if self.timeout is not None:
+                def kill(process=process, killed=killed):
+                    killed.append(True)
+                    kill_process_group(process)
+
+                timer = threading.Timer(self.timeout, kill)
+                timer.daemon = True
+                timer.start()
+
+            try:
+                result = consume(process.stdout)
+                # xrandr only writes a line or two to stderr, reading it
+                # after stdout cannot block it
+                process.stdout.read()
+                stderr = process.stderr.read()
+                status = process.wait()
+            except Exception:
+                kill_process_group(process)
+                status = process.wait()
+                # Output cut short by the timeout may not parse
+                if not killed:
+                    raise
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                process.stdout.close()
+                process.stderr.close()
+
+            if not killed or status == 0:
+                break
+
+            log.warn('xrandr did not finish within {0}s (attempt {1} of {2})'.format(
+                self.timeout, attempt, attempts))
+
+            if attempt == attempts:
+                message = 'xrandr timed out: {0}'.format(self.get_deadline_policy())
+                log.error(message)
+                raise XrandrTimeout(message)
+
+            time.sleep(self.get_backoff(attempt))
 
         if status != 0:
-            message = 'xrandr error: {0}'.format(stderr)
+            message = 'xrandr error: {0}'.format(stderr.decode('utf-8', 'replace').strip())
             log.error(message)
             raise RuntimeError(message)
 
-        return stdout.decode().split('\n')
+        return result